@@ -7,6 +7,10 @@ from . import optics
 from . import graphics
 from . import lifetime
 from . import naff
+from . import ensemble
+from . import response
+from . import correction
+from . import diskcache
 
 import os as _os
 with open(_os.path.join(__path__[0], 'VERSION'), 'r') as _f:
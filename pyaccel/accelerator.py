@@ -1,4 +1,5 @@
 
+import bisect as _bisect
 import numpy as _np
 import trackcpp as _trackcpp
 import pyaccel.lattice as _lattice
@@ -11,6 +12,126 @@ class AcceleratorException(Exception):
     pass
 
 
+def _polynom_item(polynom, i):
+    return polynom[i] if len(polynom) > i else 0.0
+
+
+def _set_polynom_item(polynom, i, value):
+    polynom[i] = value
+
+
+# element attributes kept in the attribute table, with trackcpp accessors
+_table_getters = {
+    'length'     : lambda e: e.length,
+    'angle'      : lambda e: e.angle,
+    'angle_in'   : lambda e: e.angle_in,
+    'angle_out'  : lambda e: e.angle_out,
+    'K'          : lambda e: _polynom_item(e.polynom_b, 1),
+    'S'          : lambda e: _polynom_item(e.polynom_b, 2),
+    'Ks'         : lambda e: _polynom_item(e.polynom_a, 1),
+    'hkick'      : lambda e: e.hkick,
+    'vkick'      : lambda e: e.vkick,
+    'hmin'       : lambda e: e.hmin,
+    'hmax'       : lambda e: e.hmax,
+    'vmin'       : lambda e: e.vmin,
+    'vmax'       : lambda e: e.vmax,
+    'nr_steps'   : lambda e: e.nr_steps,
+    'pass_method': lambda e: e.pass_method,
+}
+_table_setters = {
+    'length'     : lambda e, v: setattr(e, 'length', float(v)),
+    'angle'      : lambda e, v: setattr(e, 'angle', float(v)),
+    'angle_in'   : lambda e, v: setattr(e, 'angle_in', float(v)),
+    'angle_out'  : lambda e, v: setattr(e, 'angle_out', float(v)),
+    'K'          : lambda e, v: _set_polynom_item(e.polynom_b, 1, float(v)),
+    'S'          : lambda e, v: _set_polynom_item(e.polynom_b, 2, float(v)),
+    'Ks'         : lambda e, v: _set_polynom_item(e.polynom_a, 1, float(v)),
+    'hkick'      : lambda e, v: setattr(e, 'hkick', float(v)),
+    'vkick'      : lambda e, v: setattr(e, 'vkick', float(v)),
+    'hmin'       : lambda e, v: setattr(e, 'hmin', float(v)),
+    'hmax'       : lambda e, v: setattr(e, 'hmax', float(v)),
+    'vmin'       : lambda e, v: setattr(e, 'vmin', float(v)),
+    'vmax'       : lambda e, v: setattr(e, 'vmax', float(v)),
+    'nr_steps'   : lambda e, v: setattr(e, 'nr_steps', int(v)),
+    'pass_method': lambda e, v: setattr(e, 'pass_method', int(v)),
+}
+_table_int_attributes = ('nr_steps', 'pass_method')
+# element attributes which can change without affecting the table
+_table_independent_attributes = ('t_in', 't_out', 'r_in', 'r_out')
+
+
+class _AttributeTable(object):
+    """Struct-of-arrays copy of element attributes of a lattice.
+
+    Numeric attributes are stored as numpy arrays and family names as integer
+    codes into the sorted array 'fam_names'. The table is valid for the
+    lattice version it was built from.
+    """
+
+    def __init__(self, lattice, version):
+        self.version = version
+        nr_elements = len(lattice)
+        self.data = {}
+        for name in _table_getters:
+            dtype = int if name in _table_int_attributes else float
+            self.data[name] = _np.zeros(nr_elements, dtype=dtype)
+        names = []
+        getters = list(_table_getters.items())
+        for i in range(nr_elements):
+            e = lattice[i]
+            for name, getter in getters:
+                self.data[name][i] = getter(e)
+            names.append(e.fam_name)
+        self.fam_names, self.fam_codes = _np.unique(
+            _np.array(names, dtype=str), return_inverse=True)
+
+    def get(self, attribute_name):
+        if attribute_name == 'fam_name':
+            return self.fam_names[self.fam_codes]
+        return self.data[attribute_name]
+
+
+class _ElementIndex(object):
+    """Map from family names and pass method indices to element indices.
+
+    The map is built once and then updated as elements are appended,
+    replaced or deleted. Lists of indices are kept sorted.
+    """
+
+    keys = ('fam_name', 'pass_method')
+
+    def __init__(self, lattice):
+        self.maps = dict((key, {}) for key in self.keys)
+        for i in range(len(lattice)):
+            self.add(i, lattice[i])
+
+    def add(self, index, element):
+        for key in self.keys:
+            indices = self.maps[key].setdefault(getattr(element, key), [])
+            if not indices or indices[-1] < index:
+                indices.append(index)
+            else:
+                _bisect.insort(indices, index)
+
+    def remove(self, index, element):
+        for key in self.keys:
+            value = getattr(element, key)
+            indices = self.maps[key][value]
+            indices.remove(index)
+            if not indices:
+                del self.maps[key][value]
+
+    def shift(self, index):
+        # element at index was deleted: following elements move back by one
+        for key in self.keys:
+            for indices in self.maps[key].values():
+                start = _bisect.bisect_right(indices, index)
+                indices[start:] = [i-1 for i in indices[start:]]
+
+    def find(self, key, value):
+        return list(self.maps[key].get(value, []))
+
+
 @_interactive
 class Accelerator(object):
 
@@ -63,6 +184,16 @@ class Accelerator(object):
         else:
             self._brho, self._velocity, self._beta, self._gamma, self._accelerator.energy = _mp.beam_optics.beam_rigidity(energy = self.energy)
 
+        self._lattice_version = 0 # incremented whenever the lattice changes
+        self._cache = {} if kwargs.get('cache_on', False) else None
+        self._table = None
+        self._index = None
+        self._fixed_points = {} # last closed orbits, see warm_start
+        self._warm_start = True
+        self._warm_start_statistics = {'warm': 0, 'cold': 0, 'retries': 0}
+        self._fast_tracker = None # see tracking.fast_ring_pass
+        self._fingerprint = None # (cache state, digest), see fingerprint
+
         self.__isfrozen = True
 
     def __setattr__(self, key, value):
@@ -72,7 +203,15 @@ class Accelerator(object):
 
     def __delitem__(self, index):
         if isinstance(index,(int,_np.int_)):
-            self._accelerator.lattice.erase(self._accelerator.lattice.begin() + int(index));
+            index = self._element_position(index)
+        element_index = self._index
+        self._lattice_changed()
+        if isinstance(index,(int,_np.int_)):
+            if element_index is not None:
+                element_index.remove(index, self._accelerator.lattice[index])
+                element_index.shift(index)
+                self._index = element_index
+            self._accelerator.lattice.erase(self._accelerator.lattice.begin() + index);
         elif isinstance(index, (list,tuple)):
             for i in index:
                 self._accelerator.lattice.erase(self._accelerator.lattice.begin() + i);
@@ -82,9 +221,20 @@ class Accelerator(object):
             for i in iterator:
                 self._accelerator.lattice.erase(self._accelerator.lattice.begin() + i);
 
+    def _element_position(self, index):
+        # position of an element index, negative indices count from the end
+        position = int(index)
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('index out of range')
+        return position
+
     def __getitem__(self, index):
         if isinstance(index,(int, _np.int_)):
-            return _elements.Element(element=self._accelerator.lattice[int(index)])
+            e = _elements.Element(element=self._accelerator.lattice[int(index)])
+            e._owner = self
+            return e
         elif isinstance(index, (list,tuple,_np.ndarray)) and all(isinstance(x, (int, _np.int_)) for x in index):
             lattice = _trackcpp.CppElementVector()
             for i in index:
@@ -100,11 +250,22 @@ class Accelerator(object):
                 cavity_on=self._accelerator.cavity_on,
                 radiation_on=self._accelerator.radiation_on,
                 vchamber_on=self._accelerator.vchamber_on)
+        if len(a) == len(self):
+            a._fixed_points = dict(self._fixed_points)
+            a._warm_start = self._warm_start
         return a
 
     def __setitem__(self, index, value):
         if isinstance(index, (int, _np.int_)):
-            self._accelerator.lattice[int(index)] = value._e
+            index = self._element_position(index)
+        element_index = self._index
+        self._lattice_changed()
+        if isinstance(index, (int, _np.int_)):
+            if element_index is not None:
+                element_index.remove(index, self._accelerator.lattice[index])
+                element_index.add(index, value._e)
+                self._index = element_index
+            self._accelerator.lattice[index] = value._e
         elif isinstance(index, (list, tuple)):
             if isinstance(value, (list, tuple, _np.ndarray,Accelerator)):
                 for i in range(len(value)):
@@ -186,16 +347,20 @@ class Accelerator(object):
         if not isinstance(other,Accelerator): return NotImplemented
         return self._accelerator.isequal(other._accelerator)
 
-    # to make the class objects pickalable:
+    # to make the class objects pickalable: the state is a binary lattice
+    # (see lattice.write_binary_file); flat file strings of older pickles
+    # are still accepted
     def __getstate__(self):
-        stri = _trackcpp.String()
-        _trackcpp.write_flat_file_wrapper(stri,self._accelerator,False)
-        return stri.data
+        return _lattice._accelerator_to_bytes(self)
     def __setstate__(self,stridata):
-        stri = _trackcpp.String(stridata)
-        acc = Accelerator()
-        _trackcpp.read_flat_file_wrapper(stri,acc._accelerator,False)
-        self._accelerator = acc._accelerator
+        if isinstance(stridata, bytes):
+            acc = _lattice._accelerator_from_bytes(stridata)
+        else:
+            stri = _trackcpp.String(stridata)
+            acc = Accelerator()
+            _trackcpp.read_flat_file_wrapper(stri,acc._accelerator,False)
+        # __init__ is not called when unpickling: also sets beam parameters
+        self.__init__(accelerator=acc._accelerator)
 
     def pop(self, index):
         elem = self[index]
@@ -205,7 +370,128 @@ class Accelerator(object):
     def append(self, value):
         if not isinstance(value, _elements.Element):
             raise TypeError('value must be Element')
+        element_index = self._index
+        self._lattice_changed()
         self._accelerator.lattice.append(value._e)
+        if element_index is not None:
+            element_index.add(len(self)-1, value._e)
+            self._index = element_index
+
+    def get_attributes(self, attribute_name, indices=None):
+        """Return a numpy array with values of an element attribute.
+
+        Values are read from a table of element attributes which is built once
+        and reused until the lattice is modified. Valid attribute names are
+        those in Accelerator.table_attributes.
+
+        Keyword arguments:
+        attribute_name -- name of the attribute
+        indices -- indices of the elements (default: None, all elements)
+        """
+        if attribute_name not in self.table_attributes:
+            raise AcceleratorException(
+                "'" + attribute_name + "' is not a table attribute")
+        values = self._get_table().get(attribute_name)
+        if indices is None:
+            return values.copy()
+        return values[indices]
+
+    def set_attributes(self, attribute_name, indices, values):
+        """Set an element attribute for many elements at once.
+
+        Keyword arguments:
+        attribute_name -- name of the attribute, one of the numeric attributes
+                          in Accelerator.table_attributes
+        indices -- indices of the elements (None for all elements)
+        values  -- a value for all elements or a sequence with one value for
+                   each index
+        """
+        if attribute_name not in _table_setters:
+            raise AcceleratorException(
+                "'" + attribute_name + "' is not a numeric table attribute")
+        if indices is None:
+            indices = _np.arange(len(self))
+        indices = _np.array(indices, dtype=int, ndmin=1)
+        values = _np.array(values, dtype=float, ndmin=1)
+        if len(values) == 1:
+            values = _np.repeat(values, len(indices))
+        if values.shape != indices.shape:
+            raise AcceleratorException('values and indices have different sizes')
+
+        table = self._table
+        table_valid = table is not None and table.version == self._lattice_version
+
+        setter = _table_setters[attribute_name]
+        lattice = self._accelerator.lattice
+        for i, v in zip(indices.tolist(), values.tolist()):
+            setter(lattice[i], v)
+        self._lattice_changed(attribute_name)
+
+        # keeps the table in sync instead of rebuilding it
+        if table_valid:
+            table.data[attribute_name][indices] = values
+            table.version = self._lattice_version
+
+    def _get_table(self):
+        if self._table is None or self._table.version != self._lattice_version:
+            self._table = _AttributeTable(self._accelerator.lattice,
+                                          self._lattice_version)
+        return self._table
+
+    def _find_indices(self, attribute_name, value):
+        # indices of elements with a given fam_name or pass_method index
+        if self._index is None:
+            self._index = _ElementIndex(self._accelerator.lattice)
+        return self._index.find(attribute_name, value)
+
+    def _find_dict(self, attribute_name):
+        if self._index is None:
+            self._index = _ElementIndex(self._accelerator.lattice)
+        return dict((key, list(indices)) for key, indices in
+            self._index.maps[attribute_name].items())
+
+    def clear_cache(self):
+        """Discard all results stored in the result cache"""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _lattice_changed(self, attribute=None):
+        # called whenever the lattice or one of its elements is modified
+        table_valid = (self._table is not None and
+                       self._table.version == self._lattice_version)
+        self._lattice_version += 1
+        if self._cache:
+            self._cache.clear()
+        if table_valid and attribute in _table_independent_attributes:
+            self._table.version = self._lattice_version
+        if attribute is None or attribute in _ElementIndex.keys:
+            self._index = None
+
+    def _fixed_point_key(self, kind):
+        # closed orbits are reused only for the same kind of search and flags
+        return (kind, len(self),
+                self._accelerator.harmonic_number,
+                self._accelerator.cavity_on,
+                self._accelerator.radiation_on,
+                self._accelerator.vchamber_on)
+
+    def _get_fixed_point(self, kind):
+        if not self._warm_start:
+            return None
+        return self._fixed_points.get(self._fixed_point_key(kind))
+
+    def _set_fixed_point(self, kind, fixed_point):
+        if self._warm_start:
+            self._fixed_points[self._fixed_point_key(kind)] = fixed_point
+
+    def _cache_state(self):
+        # lattice fingerprint and flags which results in the cache depend on
+        return (self._lattice_version,
+                self._accelerator.energy,
+                self._accelerator.harmonic_number,
+                self._accelerator.cavity_on,
+                self._accelerator.radiation_on,
+                self._accelerator.vchamber_on)
 
     def extend(self,value):
         if not isinstance(value,Accelerator):
@@ -217,7 +503,12 @@ class Accelerator(object):
     @property
     def length(self):
         """Lattice length in m"""
-        return _lattice.length(self._accelerator.lattice)
+        return _lattice.length(self)
+
+    @property
+    def table_attributes(self):
+        """Names of element attributes available in get_attributes"""
+        return tuple(sorted(_table_getters)) + ('fam_name',)
 
     @property
     def energy(self):
@@ -306,3 +597,65 @@ class Accelerator(object):
     @vchamber_on.setter
     def vchamber_on(self, value):
         self._accelerator.vchamber_on = value
+
+    @property
+    def cache_on(self):
+        """Result cache state (True/False).
+
+        When on, closed orbits, transfer matrices, Twiss parameters and
+        momentum compaction factors computed for the accelerator are memoized.
+        Results are kept for each combination of energy, harmonic number and
+        cavity, radiation and vacuum chamber flags, and are discarded whenever
+        the lattice or one of its elements is modified through pyaccel.
+        """
+        return self._cache is not None
+
+    @cache_on.setter
+    def cache_on(self, value):
+        if not value:
+            self._cache = None
+        elif self._cache is None:
+            self._cache = {}
+
+    @property
+    def fingerprint(self):
+        """SHA-1 hex digest of all element fields and accelerator parameters.
+
+        Accelerators with the same fingerprint have identical lattices,
+        energy, harmonic number and flags, so results computed for one of
+        them hold for the other. The digest does not depend on the platform
+        and is computed from the binary lattice arrays (see
+        lattice.write_binary_file) only once for each lattice version.
+        """
+        state = self._cache_state()
+        if self._fingerprint is None or self._fingerprint[0] != state:
+            arrays = _lattice._accelerator_to_arrays(self)
+            self._fingerprint = (state, _lattice._fingerprint(arrays))
+        return self._fingerprint[1]
+
+    @property
+    def warm_start(self):
+        """Warm start of closed orbit searches (True/False).
+
+        When on, searches for the closed orbit without a fixed point guess
+        (find_orbit4, find_orbit6, find_m66, calc_twiss and the functions which
+        use them) start from the last fixed point found for the same kind of
+        search, harmonic number, number of elements and cavity, radiation and
+        vacuum chamber flags. A search which fails from the stored fixed point
+        is retried from the zero orbit.
+        """
+        return self._warm_start
+
+    @warm_start.setter
+    def warm_start(self, value):
+        self._warm_start = bool(value)
+        if not value:
+            self._fixed_points.clear()
+
+    @property
+    def warm_start_statistics(self):
+        """Dictionary with the number of closed orbit searches started from a
+        stored fixed point ('warm') or from the zero orbit ('cold'), and of
+        warm searches which failed and were retried ('retries'). trackcpp
+        does not report the number of Newton iterations of each search."""
+        return dict(self._warm_start_statistics)
@@ -0,0 +1,149 @@
+import numpy as _numpy
+import pyaccel.lattice as _lattice
+import pyaccel.tracking as _tracking
+import pyaccel.response as _response
+from pyaccel.utils import interactive as _interactive
+
+
+class CorrectionException(Exception):
+    pass
+
+
+@_interactive
+def select_elements(accelerator, selection):
+    """Return indices of the elements of a selection.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    selection   -- one of:
+        list of indices: returned unchanged
+        str: family name of the elements
+        (attribute, value) tuple: attribute is 'fam_name' or 'pass_method'
+            and value a name or a list of names
+
+    Returns sorted list of indices.
+    """
+    if isinstance(selection, str):
+        return _lattice.find_indices(accelerator, 'fam_name', selection)
+    if (isinstance(selection, tuple) and len(selection) == 2 and
+            selection[0] in ('fam_name', 'pass_method')):
+        attribute, values = selection
+        if isinstance(values, str):
+            values = [values]
+        indices = set()
+        for value in values:
+            indices.update(_lattice.find_indices(accelerator, attribute, value))
+        return sorted(indices)
+    return [int(i) for i in selection]
+
+
+@_interactive
+def calc_correction_matrix(response_matrix, nr_singular_values=None,
+                           singular_value_cutoff=1e-3):
+    """Return the truncated SVD pseudo-inverse of a response matrix.
+
+    Keyword arguments:
+    response_matrix       -- numpy array, see response.calc_orbit_response
+    nr_singular_values    -- maximum number of singular values kept
+                             (default: None, all)
+    singular_value_cutoff -- singular values smaller than cutoff times the
+                             largest one are discarded (default: 1e-3)
+
+    Returns (matrix, nr_kept), the correction matrix with the transposed
+    shape of response_matrix and the number of singular values kept.
+    """
+    u, s, vt = _numpy.linalg.svd(response_matrix, full_matrices=False)
+    if len(s) == 0 or s[0] == 0:
+        raise CorrectionException('response matrix is null')
+    keep = s > singular_value_cutoff*s[0]
+    if nr_singular_values is not None:
+        keep[nr_singular_values:] = False
+    matrix = _numpy.dot(vt[keep].T/s[keep], u[:, keep].T)
+    return matrix, int(_numpy.sum(keep))
+
+
+@_interactive
+def correct_orbit(accelerator, hcms, vcms, bpms='bpm', target=None,
+                  nr_iterations=10, nr_singular_values=None,
+                  singular_value_cutoff=1e-3, max_kick=None, tolerance=1e-9,
+                  response_matrix=None, method='analytic', workers=None):
+    """Correct the 4D closed orbit at the BPMs with the correctors.
+
+    The kicks of all correctors are updated at each iteration with the
+    truncated SVD pseudo-inverse of the orbit response matrix. The closed
+    orbit of each iteration starts from the orbit of the previous one.
+
+    Keyword arguments:
+    accelerator -- Accelerator object, its hkick and vkick are modified
+    hcms        -- horizontal correctors, see select_elements
+    vcms        -- vertical correctors, see select_elements
+    bpms        -- BPMs, see select_elements (default: 'bpm')
+    target      -- desired orbit at the BPMs, array with the horizontal
+                   followed by the vertical positions (default: None, zero)
+    nr_iterations -- maximum number of iterations (default: 10)
+    nr_singular_values, singular_value_cutoff -- see calc_correction_matrix
+    max_kick    -- kicks are clipped to +/-max_kick [rad] (default: None)
+    tolerance   -- iterations stop when the rms orbit changes less than
+                   tolerance [m] (default: 1e-9)
+    response_matrix -- response matrix of the correctors (default: None,
+                       calculated with response.calc_orbit_response, which
+                       is cached if the accelerator has cache_on)
+    method      -- method of calc_orbit_response (default: 'analytic')
+    workers     -- number of worker processes of calc_orbit_response
+                   (default: None)
+
+    Returns (hkicks, vkicks, rms), the kicks of the correctors and a list
+    with the (rms_x, rms_y) orbit deviations before correction and after
+    each iteration.
+
+    Raises TrackingException if the closed orbit is not found.
+    """
+    bpms = select_elements(accelerator, bpms)
+    hcms = select_elements(accelerator, hcms)
+    vcms = select_elements(accelerator, vcms)
+    if not bpms or not (hcms or vcms):
+        raise CorrectionException('no BPMs or no correctors selected')
+    nr_bpms, nr_hcms = len(bpms), len(hcms)
+    if target is None:
+        target = _numpy.zeros(2*nr_bpms)
+    target = _numpy.asarray(target, dtype=float)
+    if target.shape != (2*nr_bpms,):
+        raise CorrectionException('target must have 2*len(bpms) values')
+
+    if response_matrix is None:
+        response_matrix = _response.calc_orbit_response(
+            accelerator, bpms, hcms, vcms, method=method, workers=workers)
+    if response_matrix.shape != (2*nr_bpms, nr_hcms + len(vcms)):
+        raise CorrectionException('response matrix has incompatible shape')
+    matrix, _ = calc_correction_matrix(response_matrix, nr_singular_values,
+                                       singular_value_cutoff)
+
+    kicks = _numpy.concatenate((accelerator.get_attributes('hkick', hcms),
+                                accelerator.get_attributes('vkick', vcms)))
+    orbit = _tracking.find_orbit4(accelerator, indices='open')
+    deviation = _bpm_orbit(orbit, bpms) - target
+    rms = [_rms(deviation, nr_bpms)]
+    for _ in range(nr_iterations):
+        kicks -= _numpy.dot(matrix, deviation)
+        if max_kick is not None:
+            _numpy.clip(kicks, -max_kick, max_kick, out=kicks)
+        accelerator.set_attributes('hkick', hcms, kicks[:nr_hcms])
+        accelerator.set_attributes('vkick', vcms, kicks[nr_hcms:])
+        orbit = _tracking.find_orbit4(accelerator, indices='open',
+                                      fixed_point_guess=orbit[:, 0])
+        deviation = _bpm_orbit(orbit, bpms) - target
+        rms.append(_rms(deviation, nr_bpms))
+        if max(abs(a - b) for a, b in zip(rms[-1], rms[-2])) < tolerance:
+            break
+
+    return kicks[:nr_hcms], kicks[nr_hcms:], rms
+
+
+def _bpm_orbit(orbit, bpms):
+    return _numpy.concatenate((orbit[0, bpms], orbit[2, bpms]))
+
+
+def _rms(deviation, nr_bpms):
+    rms_x = _numpy.sqrt(_numpy.mean(deviation[:nr_bpms]**2))
+    rms_y = _numpy.sqrt(_numpy.mean(deviation[nr_bpms:]**2))
+    return float(rms_x), float(rms_y)
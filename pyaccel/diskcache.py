@@ -0,0 +1,173 @@
+import os as _os
+import time as _time
+import pickle as _pickle
+import hashlib as _hashlib
+import tempfile as _tempfile
+import pyaccel.utils as _utils
+from pyaccel.utils import interactive as _interactive
+
+
+_EXTENSION = '.pickle'
+_TEMPORARY_EXTENSION = '.tmp'
+_PICKLE_PROTOCOL = 4
+_TEMPORARY_MAX_AGE = 3600.0 # [s], older temporary files are from dead writers
+
+
+class DiskCacheException(Exception):
+    pass
+
+
+class DiskCache(object):
+
+    def __init__(self, directory, max_size=2**30):
+        """Directory store of results of cached functions.
+
+        Each result is a pickle file named after the SHA-1 digest of its key.
+        Files are written to temporary files and renamed, so that several
+        processes may share the directory: readers see either complete files
+        or no file. Reading a file updates its modification time and, when
+        the files exceed max_size, the least recently used ones are removed.
+        The total size is kept up to date with the writes of this object and
+        the directory is scanned only when it exceeds max_size, so files of
+        other processes are counted at the next scan.
+
+        Keyword arguments:
+        directory -- directory of the files, created if it does not exist
+        max_size  -- maximum total size of the files [bytes] (default: 1 GiB)
+        """
+        if max_size <= 0:
+            raise DiskCacheException('max_size must be positive')
+        self.directory = _os.path.abspath(directory)
+        self.max_size = max_size
+        _os.makedirs(self.directory, exist_ok=True)
+        self._size = None # estimated total size, None before the first scan
+
+    def __contains__(self, key):
+        return _os.path.exists(self._filename(key))
+
+    def get(self, key):
+        """Return (found, value) of a key"""
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                value = _pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except (EOFError, _pickle.UnpicklingError, AttributeError,
+                ImportError, IndexError):
+            # unreadable file, e.g. from an incompatible pyaccel version
+            self._remove(filename)
+            return False, None
+        try:
+            _os.utime(filename)
+        except FileNotFoundError: # evicted by another process
+            pass
+        return True, value
+
+    def put(self, key, value):
+        """Store value of a key and evict least recently used files.
+
+        Returns True if the value was stored and False if it cannot be
+        pickled.
+        """
+        try:
+            data = _pickle.dumps(value, protocol=_PICKLE_PROTOCOL)
+        except (_pickle.PicklingError, TypeError, AttributeError):
+            return False
+        fd, temporary = _tempfile.mkstemp(suffix=_TEMPORARY_EXTENSION,
+                                          dir=self.directory)
+        try:
+            with _os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            _os.replace(temporary, self._filename(key))
+        except BaseException:
+            self._remove(temporary)
+            raise
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += len(data)
+        if self._size > self.max_size:
+            self.evict()
+        return True
+
+    def size(self):
+        """Return total size of the stored files [bytes]"""
+        return sum(st.st_size for _, st in self._entries())
+
+    def evict(self, max_size=None):
+        """Remove least recently used files until their total size is not
+        larger than max_size (default: None, the max_size of the cache).
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        size = sum(st.st_size for _, st in entries)
+        for filename, st in entries:
+            if size <= max_size:
+                break
+            self._remove(filename)
+            size -= st.st_size
+        self._size = size
+
+    def clear(self):
+        """Remove all stored files"""
+        self.evict(max_size=0)
+
+    def _filename(self, key):
+        digest = _hashlib.sha1(
+            _pickle.dumps(key, protocol=_PICKLE_PROTOCOL)).hexdigest()
+        return _os.path.join(self.directory, digest + _EXTENSION)
+
+    def _entries(self):
+        # (filename, stat) of stored files; stale temporary files are removed
+        entries = []
+        now = _time.time()
+        for name in _os.listdir(self.directory):
+            filename = _os.path.join(self.directory, name)
+            try:
+                st = _os.stat(filename)
+            except FileNotFoundError:
+                continue
+            if name.endswith(_EXTENSION):
+                entries.append((filename, st))
+            elif (name.endswith(_TEMPORARY_EXTENSION) and
+                    now - st.st_mtime > _TEMPORARY_MAX_AGE):
+                self._remove(filename)
+        return entries
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            _os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+@_interactive
+def set_disk_cache(directory, max_size=2**30):
+    """Store results of the functions decorated with cached(disk=True) in a
+    directory: calc_twiss, get_mcf, get_equilibrium_parameters,
+    calc_lifetimes, momentum_aperture and the response matrices.
+
+    Results are keyed by the lattice fingerprint (see Accelerator.fingerprint),
+    the function name and its arguments, so they are reused by other
+    accelerators with the same lattice and by other processes sharing the
+    directory. The disk cache is used whether or not Accelerator.cache_on is
+    set.
+
+    Keyword arguments:
+    directory -- directory of the cache, None disables the disk cache
+    max_size  -- maximum total size of the files [bytes] (default: 1 GiB)
+
+    Returns the DiskCache object or None.
+    """
+    _utils._disk_cache = None if directory is None else \
+        DiskCache(directory, max_size)
+    return _utils._disk_cache
+
+
+@_interactive
+def get_disk_cache():
+    """Return DiskCache object set by set_disk_cache or None"""
+    return _utils._disk_cache
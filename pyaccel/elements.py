@@ -223,10 +223,27 @@ class Kicktable(object):
         return self._kicktable.y_nrpts
 
 
+class _CoordArray(_numpy.ndarray):
+    # numpy view of t_in, t_out, r_in or r_out data of an element which
+    # reports in-place changes to the element
+
+    _on_change = None
+
+    def __array_finalize__(self, obj):
+        # views of the array, as e.r_in[0], report changes as well
+        self._on_change = getattr(obj, '_on_change', None)
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        if self._on_change is not None:
+            self._on_change()
+
+
 class Element(object):
 
     _t_valid_types = (list, _numpy.ndarray)
     _r_valid_types = (_numpy.ndarray, )
+    _owner = None  # Accelerator whose lattice contains the element
 
     def __init__(self, **kwargs):
         if 'element' in kwargs:
@@ -261,6 +278,16 @@ class Element(object):
                     return False
         return True
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if not name.startswith('_'):
+            self._changed(name)
+
+    def _changed(self, attribute):
+        # lets the accelerator owning the element know it has been modified
+        if self._owner is not None:
+            self._owner._lattice_changed(attribute)
+
 
     @property
     def fam_name(self):
@@ -497,6 +524,7 @@ class Element(object):
     @property
     def polynom_a(self):
         p = _Polynom(self._e.polynom_a)
+        p._on_change = lambda: self._changed('polynom_a')
         return p
 
     @polynom_a.setter
@@ -506,6 +534,7 @@ class Element(object):
     @property
     def polynom_b(self):
         p = _Polynom(self._e.polynom_b)
+        p._on_change = lambda: self._changed('polynom_b')
         return p
 
     @polynom_b.setter
@@ -514,7 +543,7 @@ class Element(object):
 
     @property
     def t_in(self):
-        return self._get_coord_vector(self._e.t_in)
+        return self._get_coord_vector(self._e.t_in, 't_in')
 
     @t_in.setter
     def t_in(self, value):
@@ -524,7 +553,7 @@ class Element(object):
 
     @property
     def t_out(self):
-        return self._get_coord_vector(self._e.t_out)
+        return self._get_coord_vector(self._e.t_out, 't_out')
 
     @t_out.setter
     def t_out(self, value):
@@ -534,7 +563,7 @@ class Element(object):
 
     @property
     def r_in(self):
-        return self._get_coord_matrix(self._e.r_in)
+        return self._get_coord_matrix(self._e.r_in, 'r_in')
 
     @r_in.setter
     def r_in(self, value):
@@ -544,7 +573,7 @@ class Element(object):
 
     @property
     def r_out(self):
-        return self._get_coord_matrix(self._e.r_out)
+        return self._get_coord_matrix(self._e.r_out, 'r_out')
 
     @r_out.setter
     def r_out(self, value):
@@ -555,16 +584,12 @@ class Element(object):
     def _set_c_array_from_vector(self, array, size, values):
         if not (size == len(values)):
             raise ValueError("array and vector must have same size")
-        for i in range(size):
-            _trackcpp.c_array_set(array, i, values[i])
+        self._get_coord_vector(array)[:] = values
 
     def _set_c_array_from_matrix(self, array, shape, values):
         if not (shape == values.shape):
             raise ValueError("array and matrix must have same shape")
-        rows, cols = shape
-        for i in range(rows):
-            for j in range(cols):
-                _trackcpp.c_array_set(array, i*cols + j, values[i, j])
+        self._get_coord_matrix(array)[:] = values
 
     def _check_type(self, value, types):
         r = False
@@ -581,15 +606,22 @@ class Element(object):
         if not value.shape == shape:
             raise ValueError("shape must be " + str(shape))
 
-    def _get_coord_vector(self, pointer):
+    def _get_coord_vector(self, pointer, attribute=None):
         address = int(pointer)
         c_array = _coord_vector.from_address(address)
-        return _numpy.ctypeslib.as_array(c_array)
+        return self._coord_view(_numpy.ctypeslib.as_array(c_array), attribute)
 
-    def _get_coord_matrix(self, pointer):
+    def _get_coord_matrix(self, pointer, attribute=None):
         address = int(pointer)
         c_array = _coord_matrix.from_address(address)
-        return _numpy.ctypeslib.as_array(c_array)
+        return self._coord_view(_numpy.ctypeslib.as_array(c_array), attribute)
+
+    def _coord_view(self, array, attribute):
+        if attribute is None:
+            return array
+        view = array.view(_CoordArray)
+        view._on_change = lambda: self._changed(attribute)
+        return view
 
     def __repr__(self):
         return 'fam_name: ' + self.fam_name
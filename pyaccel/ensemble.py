@@ -0,0 +1,264 @@
+import os as _os
+import numpy as _numpy
+import pyaccel.optics as _optics
+import pyaccel.tracking as _tracking
+from pyaccel.utils import interactive as _interactive
+
+
+class EnsembleException(Exception):
+    pass
+
+
+class EnsembleResults(object):
+
+    def __init__(self, seeds, observables, directory=None, shapes=None):
+        """Observables of a set of random machines, one row for each seed.
+
+        Arrays of observables with known shapes are allocated at creation,
+        the others when their first value arrives, and are filled with NaN
+        for seeds whose evaluation failed. If a directory is given the arrays
+        are .npy files in it, written as results arrive.
+
+        Keyword arguments:
+        seeds -- list of seeds of the machines
+        observables -- names of the observables
+        directory -- directory where arrays are stored (default: None, arrays
+                     are kept in memory)
+        shapes -- dict with the shapes of the values of observables, known
+                  before evaluation (default: None)
+        """
+        self.seeds = _numpy.array(seeds, dtype=int)
+        self.observables = tuple(observables)
+        self.directory = directory
+        self.data = {}
+        self.failed = self._new_array('failed', (len(self.seeds),), bool)
+        self.failed[:] = False
+        if directory is not None:
+            seeds_array = self._new_array('seeds', self.seeds.shape, int)
+            seeds_array[:] = self.seeds
+        for name, shape in (shapes or {}).items():
+            self._allocate(name, shape)
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __getitem__(self, name):
+        if name not in self.data:
+            raise KeyError(name)
+        return self.data[name]
+
+    def store(self, index, name, value):
+        """Store value of an observable for the machine with seed seeds[index]"""
+        if value is None:
+            self.failed[index] = True
+            return
+        value = _numpy.asarray(value, dtype=float)
+        if name not in self.data:
+            self._allocate(name, value.shape)
+        array = self.data[name]
+        if array.shape[1:] != value.shape:
+            raise EnsembleException(
+                "shape of observable '" + name + "' changed between seeds")
+        array[index] = value
+
+    def flush(self):
+        if self.directory is None:
+            return
+        for array in [self.failed] + list(self.data.values()):
+            array.flush()
+
+    def _allocate(self, name, shape):
+        # NaN filled array of an observable
+        array = self._new_array(name, (len(self.seeds),) + tuple(shape), float)
+        array[:] = _numpy.nan
+        self.data[name] = array
+
+    def _new_array(self, name, shape, dtype):
+        if self.directory is None:
+            return _numpy.zeros(shape, dtype=dtype)
+        filename = _os.path.join(self.directory, name + '.npy')
+        return _numpy.lib.format.open_memmap(filename, mode='w+',
+                                             dtype=dtype, shape=shape)
+
+
+@_interactive
+def apply_errors(accelerator, errors, seed, cutoff=None):
+    """Apply random errors to an accelerator.
+
+    Values are drawn from a normal distribution with a generator initialised
+    with 'seed', in the order of the error specifications, so that the same
+    seed always yields the same machine.
+
+    Keyword arguments:
+    accelerator -- Accelerator object, modified in place
+    errors -- list of (function, indices, sigma) tuples, where function is one
+              of the lattice.add_error_* or lattice.set_error_* functions,
+              indices is its indices argument and sigma the rms error
+    seed   -- seed of the random number generator
+    cutoff -- errors are truncated at cutoff*sigma (default: None, no
+              truncation)
+    """
+    random = _numpy.random.RandomState(seed)
+    for function, indices, sigma in errors:
+        values = sigma*_truncated_normal(random, len(indices), cutoff)
+        function(accelerator, indices, values)
+
+
+@_interactive
+def run_ensemble(accelerator, errors, seeds, observables=('tunes',),
+                 cutoff=None, directory=None, workers=None):
+    """Evaluate observables for random error realisations of a lattice.
+
+    Each machine is a copy of 'accelerator' with errors applied by
+    apply_errors with one of the seeds, so reruns with the same seeds yield
+    the same results. Machines are built and evaluated in worker processes
+    and results are stored as they arrive.
+
+    Keyword arguments:
+    accelerator -- base Accelerator object
+    errors -- error specification, see apply_errors
+    seeds  -- list of seeds, one for each machine
+    observables -- list of observables to evaluate. Items may be names of
+                   predefined observables ('tunes', 'closed_orbit',
+                   'beta_beat') or (name, function) tuples, where function
+                   takes an accelerator and returns an array with the same
+                   shape for all machines. Functions must be defined at module
+                   level to be sent to the workers. (default: ('tunes',))
+    cutoff -- errors are truncated at cutoff*sigma (default: None)
+    directory -- if not None, results are stored in .npy files in this
+                 directory (default: None)
+    workers -- number of worker processes (default: None, evaluation in the
+               calling process)
+
+    Returns EnsembleResults.
+
+    Evaluations which raise TrackingException, OpticsException or ValueError
+    leave NaN in the arrays of the machine and set its 'failed' flag.
+    """
+    functions = _process_observables(accelerator, observables)
+    names = [name for name, _ in functions]
+    if directory is not None and not _os.path.isdir(directory):
+        _os.makedirs(directory)
+    results = EnsembleResults(seeds, names, directory,
+                              _observable_shapes(accelerator, names))
+
+    tasks = [(_evaluate_machine, (seed, errors, functions, cutoff))
+             for seed in seeds]
+    for index, values in enumerate(_imap(tasks, workers, accelerator)):
+        for name, value in zip(names, values):
+            results.store(index, name, value)
+    for name in names:
+        if name not in results.data: # failed for all seeds, shape unknown
+            results._allocate(name, ())
+    results.flush()
+    return results
+
+
+@_interactive
+def load_ensemble(directory):
+    """Load results stored by run_ensemble in a directory"""
+    seeds = _numpy.load(_os.path.join(directory, 'seeds.npy'))
+    results = EnsembleResults(seeds, (), directory=None)
+    results.directory = directory
+    results.failed = _numpy.load(_os.path.join(directory, 'failed.npy'))
+    names = []
+    for filename in sorted(_os.listdir(directory)):
+        name, ext = _os.path.splitext(filename)
+        if ext == '.npy' and name not in ('seeds', 'failed'):
+            results.data[name] = _numpy.load(_os.path.join(directory, filename))
+            names.append(name)
+    results.observables = tuple(names)
+    return results
+
+
+def _truncated_normal(random, size, cutoff):
+    values = random.standard_normal(size)
+    if cutoff is not None:
+        outside = _numpy.abs(values) > cutoff
+        while _numpy.any(outside):
+            values[outside] = random.standard_normal(_numpy.sum(outside))
+            outside = _numpy.abs(values) > cutoff
+    return values
+
+
+def _evaluate_machine(accelerator, seed, errors, functions, cutoff):
+    machine = accelerator[:]
+    # closed orbit searches start cold, as in worker processes
+    machine._fixed_points.clear()
+    apply_errors(machine, errors, seed, cutoff)
+    values = []
+    for name, function in functions:
+        try:
+            values.append(function(machine))
+        except (_tracking.TrackingException, _optics.OpticsException,
+                ValueError): # unstable machines have no tunes
+            values.append(None)
+    return values
+
+
+def _imap(tasks, workers, accelerator):
+    # same as tracking._parallel_map, but yields results as they arrive
+    if isinstance(workers, _tracking.WorkerPool):
+        if workers.serves(accelerator) and len(tasks) > 1:
+            for values in workers._pool.imap(_tracking._call_worker, tasks):
+                yield values
+            return
+        workers = workers.workers
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        for function, args in tasks:
+            yield function(accelerator, *args)
+        return
+    workers = min(workers, len(tasks))
+    with _tracking.WorkerPool(accelerator, workers) as pool:
+        for values in pool._pool.imap(_tracking._call_worker, tasks):
+            yield values
+
+
+def _process_observables(accelerator, observables):
+    functions = []
+    for observable in observables:
+        if isinstance(observable, str):
+            if observable == 'tunes':
+                function = _tunes
+            elif observable == 'closed_orbit':
+                function = _closed_orbit
+            elif observable == 'beta_beat':
+                twiss, *_ = _optics.calc_twiss(accelerator)
+                function = _BetaBeat(twiss.betax, twiss.betay)
+            else:
+                raise EnsembleException(
+                    "unknown observable '" + observable + "'")
+            functions.append((observable, function))
+        else:
+            name, function = observable
+            functions.append((name, function))
+    return functions
+
+
+def _observable_shapes(accelerator, names):
+    # shapes of the values of predefined observables
+    shapes = {'tunes': (2,),
+              'closed_orbit': (4, len(accelerator)),
+              'beta_beat': (2, len(accelerator))}
+    return dict((name, shapes[name]) for name in names if name in shapes)
+
+
+def _tunes(accelerator):
+    tune_x, tune_y, *_ = _optics.get_frac_tunes(accelerator)
+    return (tune_x, tune_y)
+
+
+def _closed_orbit(accelerator):
+    return _tracking.find_orbit4(accelerator, indices='open')
+
+
+class _BetaBeat(object):
+    # relative beta function deviations from the nominal lattice
+
+    def __init__(self, betax, betay):
+        self.betax = betax
+        self.betay = betay
+
+    def __call__(self, accelerator):
+        twiss, *_ = _optics.calc_twiss(accelerator)
+        return (twiss.betax/self.betax - 1, twiss.betay/self.betay - 1)
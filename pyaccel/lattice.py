@@ -1,4 +1,7 @@
 
+import ctypes as _ctypes
+import hashlib as _hashlib
+import io as _io
 import math as _math
 import numpy as _numpy
 import mathphys as _mp
@@ -7,6 +10,9 @@ import pyaccel as _pyaccel
 from pyaccel.utils import interactive as _interactive
 
 
+_NUM_COORDS = 6
+
+
 class LatticeError(Exception):
     pass
 
@@ -53,6 +59,9 @@ def shift(lattice, start):
 
 @_interactive
 def length(lattice):
+    table_length = _table_attribute(lattice, 'length')
+    if table_length is not None:
+        return _math.fsum(table_length)
     length = [e.length for e in lattice]
     return sum(length)
 
@@ -67,7 +76,11 @@ def find_spos(lattice, indices='open'):
         at the end of the last element, or a list or tuple to select some
         indices or even an integer (default: 'open')
     """
-    length = [0] + [e.length for e in lattice]
+    table_length = _table_attribute(lattice, 'length')
+    if table_length is not None:
+        length = _numpy.concatenate(([0.0], table_length))
+    else:
+        length = [0] + [e.length for e in lattice]
     pos = _numpy.cumsum(length)
 
     if isinstance(indices, str):
@@ -110,7 +123,20 @@ def find_indices(lattice, attribute_name, value, comparison=None):
       >> mi_idx = find_indices(lattice,'fam_name',value='mi',comparison=fun2)
     """
 
-    if comparison is None: comparison = _is_equal
+    if comparison is None:
+        if (attribute_name in ('fam_name', 'pass_method') and
+                isinstance(lattice, _pyaccel.accelerator.Accelerator) and
+                isinstance(value, str)):
+            if attribute_name == 'pass_method':
+                if value not in _pyaccel.elements.pass_methods:
+                    return []
+                value = _pyaccel.elements.pass_methods.index(value)
+            return lattice._find_indices(attribute_name, value)
+        values = _table_attribute(lattice, attribute_name)
+        if (values is not None and _numpy.isscalar(value) and
+                isinstance(value, str) == (values.dtype.kind == 'U')):
+            return _numpy.flatnonzero(values == value).tolist()
+        comparison = _is_equal
     indices = []
     for i in range(len(lattice)):
         attrib = getattr(lattice[i], attribute_name)
@@ -144,6 +170,9 @@ def get_attribute(lattice, attribute_name, indices=None, m=None, n=None):
             tdata = getattr(lattice[idx], attribute_name)
             data.append(tdata[m])
     else:
+        values = _table_attribute(lattice, attribute_name, pass_method_names=False)
+        if values is not None:
+            return values[list(indices)].tolist()
         # Check whether we have an Accelerator object
         if (hasattr(lattice, '_accelerator') and
                 hasattr(lattice._accelerator, 'lattice') and
@@ -159,6 +188,13 @@ def get_attribute(lattice, attribute_name, indices=None, m=None, n=None):
 @_interactive
 def set_attribute(lattice, attribute_name, indices, values):
     """Set elements data."""
+    if (_table_attribute(lattice, attribute_name) is not None and
+            attribute_name not in ('fam_name', 'pass_method') and
+            (isinstance(values, _numpy.ndarray) or
+                (_numpy.isscalar(values) and not isinstance(values, str)))):
+        lattice.set_attributes(attribute_name, indices, values)
+        return
+
     try:
         indices[0]
     except:
@@ -182,7 +218,25 @@ def find_dict(lattice, attribute_name):
     """Return a dict which correlates values of 'attribute_name' and a list of
     indices corresponding to matching elements
     """
+    if (attribute_name in ('fam_name', 'pass_method') and
+            isinstance(lattice, _pyaccel.accelerator.Accelerator)):
+        latt_dict = lattice._find_dict(attribute_name)
+        if attribute_name == 'pass_method':
+            pass_methods = _pyaccel.elements.pass_methods
+            latt_dict = dict((pass_methods[key], indices) for
+                key, indices in latt_dict.items())
+        return latt_dict
+
     latt_dict = {}
+    values = _table_attribute(lattice, attribute_name)
+    if values is not None:
+        keys, first, codes = _numpy.unique(
+            values, return_index=True, return_inverse=True)
+        order = _numpy.argsort(codes, kind='mergesort')
+        groups = _numpy.split(order, _numpy.cumsum(_numpy.bincount(codes))[:-1])
+        for k in _numpy.argsort(first):
+            latt_dict[keys[k].item()] = groups[k].tolist()
+        return latt_dict
     for i in range(len(lattice)):
         if hasattr(lattice[i], attribute_name):
             att_value = getattr(lattice[i], attribute_name)
@@ -201,7 +255,7 @@ def set_knob(lattice, fam_name, attribute_name, value):
     else:
         idx = []
         for famname in fam_name:
-            idx.append(find_indices(lattice, 'fam_name', fam_name))
+            idx.extend(find_indices(lattice, 'fam_name', famname))
     for i in idx:
         setattr(lattice[i], attribute_name, value)
 
@@ -214,10 +268,10 @@ def add_knob(lattice, fam_name, attribute_name, value):
     else:
         idx = []
         for famname in fam_name:
-            idx.append(find_indices(lattice, 'fam_name', fam_name))
+            idx.extend(find_indices(lattice, 'fam_name', famname))
     for i in idx:
         original_value = getattr(lattice[i], attribute_name)
-        new_value = original_values + value
+        new_value = original_value + value
         setattr(lattice[i], attribute_name, new_value)
 
 
@@ -251,6 +305,157 @@ def write_flat_file_to_string(accelerator):
     return s.data
 
 
+@_interactive
+def read_binary_file(filename):
+    """Read an accelerator from a binary lattice file written by
+    write_binary_file."""
+    with open(filename, 'rb') as f:
+        return _accelerator_from_bytes(f.read())
+
+
+@_interactive
+def write_binary_file(accelerator, filename):
+    """Write an accelerator to a binary lattice file.
+
+    The file is a numpy .npz archive with one array for each element field,
+    indexed by element, and the accelerator parameters. Family names, pass
+    methods and kicktable file names are stored as codes into arrays of
+    distinct values, and polynoms as one flat array with the length of each
+    polynom. Values are stored in binary, so reading the file gives back the
+    same lattice as writing and reading a flat file.
+    """
+    with open(filename, 'wb') as f:
+        f.write(_accelerator_to_bytes(accelerator))
+
+
+# fields of trackcpp elements stored in binary lattice files
+_BINARY_FLOAT_FIELDS = (
+    'length', 'hkick', 'vkick', 'angle', 'angle_in', 'angle_out', 'gap',
+    'fint_in', 'fint_out', 'thin_KL', 'thin_SL', 'frequency', 'voltage',
+    'phase_lag', 'hmin', 'hmax', 'vmin', 'vmax')
+_BINARY_FORMAT_VERSION = 1
+
+
+def _accelerator_to_bytes(accelerator):
+    buffer = _io.BytesIO()
+    _numpy.savez(buffer, **_accelerator_to_arrays(accelerator))
+    return buffer.getvalue()
+
+
+def _accelerator_from_bytes(data):
+    with _numpy.load(_io.BytesIO(data)) as arrays:
+        return _accelerator_from_arrays(arrays)
+
+
+def _accelerator_to_arrays(accelerator):
+    elements = accelerator._accelerator.lattice
+    nr_elements = len(elements)
+    arrays = {}
+    for name in _BINARY_FLOAT_FIELDS:
+        arrays[name] = _numpy.zeros(nr_elements)
+    nr_steps = _numpy.zeros(nr_elements, dtype=int)
+    fam_names, pass_methods, kicktables = [], [], []
+    polynoms = {'polynom_a': [], 'polynom_b': []}
+    for i in range(nr_elements):
+        e = elements[i]
+        for name in _BINARY_FLOAT_FIELDS:
+            arrays[name][i] = getattr(e, name)
+        nr_steps[i] = e.nr_steps
+        fam_names.append(e.fam_name)
+        pass_methods.append(_pyaccel.elements.pass_methods[e.pass_method])
+        kicktables.append('' if e.kicktable is None else e.kicktable.filename)
+        for name in polynoms:
+            polynoms[name].append(list(getattr(e, name)))
+    arrays['nr_steps'] = nr_steps
+    for name, values in (('fam_name', fam_names),
+                         ('pass_method', pass_methods),
+                         ('kicktable', kicktables)):
+        arrays[name + '_values'], arrays[name + '_codes'] = _numpy.unique(
+            _numpy.array(values, dtype=str), return_inverse=True)
+    for name, values in polynoms.items():
+        arrays[name + '_lengths'] = _numpy.array([len(p) for p in values],
+                                                 dtype=int)
+        arrays[name] = _numpy.array([v for p in values for v in p],
+                                    dtype=float)
+    for name in _COORD_SHAPES:
+        arrays[name] = _get_coords(accelerator, range(nr_elements), name)
+
+    arrays['format_version'] = _numpy.array(_BINARY_FORMAT_VERSION)
+    arrays['energy'] = _numpy.array(accelerator.energy)
+    arrays['harmonic_number'] = _numpy.array(accelerator.harmonic_number)
+    arrays['cavity_on'] = _numpy.array(accelerator.cavity_on)
+    arrays['radiation_on'] = _numpy.array(accelerator.radiation_on)
+    arrays['vchamber_on'] = _numpy.array(accelerator.vchamber_on)
+    return arrays
+
+
+def _fingerprint(arrays):
+    # digest of binary lattice arrays with platform independent byte layouts
+    sha = _hashlib.sha1()
+    for name in sorted(arrays):
+        value = _numpy.asarray(arrays[name])
+        if value.dtype.kind == 'U':
+            data = '\0'.join(value.ravel().tolist()).encode('utf-8')
+        elif value.dtype.kind == 'b':
+            data = value.astype('|u1').tobytes()
+        elif value.dtype.kind in 'iu':
+            data = value.astype('<i8').tobytes()
+        else:
+            data = value.astype('<f8').tobytes()
+        sha.update((name + str(value.shape)).encode('utf-8'))
+        sha.update(data)
+    return sha.hexdigest()
+
+
+def _accelerator_from_arrays(arrays):
+    if int(arrays['format_version']) > _BINARY_FORMAT_VERSION:
+        raise LatticeError('unsupported binary lattice format version')
+    fam_names = arrays['fam_name_values'][arrays['fam_name_codes']]
+    pass_methods = [_pyaccel.elements.pass_methods.index(str(name))
+                    for name in arrays['pass_method_values']]
+    kicktables = [str(name) for name in arrays['kicktable_values']]
+    polynoms = {}
+    for name in ('polynom_a', 'polynom_b'):
+        bounds = _numpy.cumsum(
+            _numpy.concatenate(([0], arrays[name + '_lengths'])))
+        values = arrays[name].tolist()
+        polynoms[name] = [values[bounds[i]:bounds[i+1]]
+                          for i in range(len(bounds)-1)]
+    fields = [(name, arrays[name].tolist()) for name in _BINARY_FLOAT_FIELDS]
+    nr_steps = arrays['nr_steps'].tolist()
+    pass_method_codes = arrays['pass_method_codes'].tolist()
+    kicktable_codes = arrays['kicktable_codes'].tolist()
+    loaded_kicktables = {}
+
+    lattice = _trackcpp.CppElementVector()
+    for i in range(len(fam_names)):
+        e = _trackcpp.Element(str(fam_names[i]), 0.0)
+        for name, values in fields:
+            setattr(e, name, values[i])
+        e.nr_steps = nr_steps[i]
+        e.pass_method = pass_methods[pass_method_codes[i]]
+        for name, values in polynoms.items():
+            getattr(e, name)[:] = values[i]
+        filename = kicktables[kicktable_codes[i]]
+        if filename:
+            if filename not in loaded_kicktables:
+                loaded_kicktables[filename] = _pyaccel.elements.Kicktable(
+                    filename=filename)._kicktable
+            e.kicktable = loaded_kicktables[filename]
+        lattice.append(e)
+
+    accelerator = _pyaccel.accelerator.Accelerator(
+        lattice=lattice,
+        energy=float(arrays['energy']),
+        harmonic_number=int(arrays['harmonic_number']),
+        cavity_on=bool(arrays['cavity_on']),
+        radiation_on=bool(arrays['radiation_on']),
+        vchamber_on=bool(arrays['vchamber_on']))
+    for name in _COORD_SHAPES:
+        _set_coords(accelerator, range(len(accelerator)), name, arrays[name])
+    return accelerator
+
+
 @_interactive
 def refine_lattice(accelerator,
                    max_length=None,
@@ -276,6 +481,7 @@ def refine_lattice(accelerator,
                 indices.extend(find_indices(acc, 'pass_method', pass_method))
         if fam_names is None and pass_methods is None:
             indices = list(range(len(acc)))
+    indices = set(indices)
 
     new_acc = _pyaccel.accelerator.Accelerator(
         energy = acc.energy,
@@ -348,19 +554,13 @@ def get_error_misalignment_x(lattice, indices):
 
     ''' processes arguments '''
     indices, *_ = _process_args_errors(indices, 0.0)
+    segs, owner, first, last = _process_segments(indices)
 
-    ''' loops over elements and gets error from T_IN '''
-    values = []
-    for i in range(len(indices)):
-        segs = indices[i]
-        #it is possible to also have yaw errors,so:
-        misx = -(lattice[segs[ 0]].t_in[0] - lattice[segs[-1]].t_out[0])/2
-        values.extend(len(segs)*[misx])
-
-    if len(values) == 1:
-        return values[0]
-    else:
-        return values
+    ''' gets errors from T_IN and T_OUT of all elements at once '''
+    #it is possible to also have yaw errors,so:
+    misx = -(_get_coords(lattice, first, 't_in')[:,0] -
+             _get_coords(lattice, last, 't_out')[:,0])/2
+    return _error_values(misx[owner])
 
 
 @_interactive
@@ -382,16 +582,15 @@ def set_error_misalignment_x(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, first, last = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)
 
-    ''' loops over elements and sets its T1 and T2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        #it is possible to also have yaw errors, so:
-        yaw = (lattice[segs[0]].t_in[0] + lattice[segs[-1]].t_out[0])/2
-        for j in range(len(segs)):
-            idx = segs[j]
-            lattice[idx].t_in[0]  = yaw - values[i]
-            lattice[idx].t_out[0] = yaw + values[i]
+    ''' sets T1 and T2 fields of all segments at once '''
+    #it is possible to also have yaw errors, so:
+    yaw = (_get_coords(lattice, first, 't_in')[:,0] +
+           _get_coords(lattice, last, 't_out')[:,0])/2
+    _set_coords_column(lattice, segs, 't_in', 0, (yaw - values)[owner])
+    _set_coords_column(lattice, segs, 't_out', 0, (yaw + values)[owner])
 
 
 @_interactive
@@ -413,14 +612,14 @@ def add_error_misalignment_x(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, *_ = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)
 
-    ''' loops over elements and sets its T1 and T2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        for j in range(len(indices[i])):
-            idx = segs[j]
-            lattice[idx].t_in[0]  += -values[i]
-            lattice[idx].t_out[0] += +values[i]
+    ''' adds to T1 and T2 fields of all segments at once '''
+    delta = _numpy.zeros((len(segs), _NUM_COORDS))
+    delta[:,0] = values[owner]
+    _add_coords(lattice, segs, 't_in', -delta)
+    _add_coords(lattice, segs, 't_out', delta)
 
 
 @_interactive
@@ -443,18 +642,13 @@ def get_error_misalignment_y(lattice, indices):
 
     ''' processes arguments '''
     indices, *_ = _process_args_errors(indices, 0.0)
+    segs, owner, first, last = _process_segments(indices)
 
-    ''' loops over elements and gets error from T_IN '''
-    values = []
-    for i in range(len(indices)):
-        segs = indices[i]
-        #it is possible to also have pitch errors,so:
-        misy = -(lattice[segs[0]].t_in[2]- lattice[segs[-1]].t_out[2])/2
-        values.extend(len(segs)*[misy])
-    if len(values) == 1:
-        return values[0]
-    else:
-        return values
+    ''' gets errors from T_IN and T_OUT of all elements at once '''
+    #it is possible to also have pitch errors,so:
+    misy = -(_get_coords(lattice, first, 't_in')[:,2] -
+             _get_coords(lattice, last, 't_out')[:,2])/2
+    return _error_values(misy[owner])
 
 
 @_interactive
@@ -476,16 +670,15 @@ def set_error_misalignment_y(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, first, last = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)
 
-    ''' loops over elements and sets its T1 and T2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        #it is possible to also have yaw errors, so:
-        pitch = (lattice[segs[0]].t_in[2] + lattice[segs[-1]].t_out[2])/2
-        for j in range(len(segs)):
-            idx = segs[j]
-            lattice[idx].t_in[2]  = pitch - values[i]
-            lattice[idx].t_out[2] = pitch + values[i]
+    ''' sets T1 and T2 fields of all segments at once '''
+    #it is possible to also have pitch errors, so:
+    pitch = (_get_coords(lattice, first, 't_in')[:,2] +
+             _get_coords(lattice, last, 't_out')[:,2])/2
+    _set_coords_column(lattice, segs, 't_in', 2, (pitch - values)[owner])
+    _set_coords_column(lattice, segs, 't_out', 2, (pitch + values)[owner])
 
 
 @_interactive
@@ -507,14 +700,14 @@ def add_error_misalignment_y(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, *_ = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)
 
-    ''' loops over elements and sets its T1 and T2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        for j in range(len(segs)):
-            idx = segs[j]
-            lattice[idx].t_in[2]  += -values[i]
-            lattice[idx].t_out[2] +=  values[i]
+    ''' adds to T1 and T2 fields of all segments at once '''
+    delta = _numpy.zeros((len(segs), _NUM_COORDS))
+    delta[:,2] = values[owner]
+    _add_coords(lattice, segs, 't_in', -delta)
+    _add_coords(lattice, segs, 't_out', delta)
 
     return lattice
 
@@ -539,19 +732,11 @@ def get_error_rotation_roll(lattice, indices):
 
     ''' processes arguments '''
     indices, *_ = _process_args_errors(indices, 0.0)
+    segs, *_ = _process_segments(indices)
 
-    ''' loops over elements and gets error from R_IN '''
-    values = []
-    for i in range(len(indices)):
-        segs = indices[i]
-        for j in range(len(segs)):
-            idx = segs[j]
-            angle = _math.asin(lattice[idx].r_in[0,2])
-            values.append(angle)
-    if len(values) == 1:
-        return values[0]
-    else:
-        return values
+    ''' gets errors from R_IN of all segments at once '''
+    angles = _numpy.arcsin(_get_coords(lattice, segs, 'r_in')[:,0,2])
+    return _error_values(angles)
 
 
 @_interactive
@@ -573,25 +758,17 @@ def set_error_rotation_roll(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, *_ = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)[owner]
 
-    ''' loops over elements and sets its R1 and R2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        c, s = _math.cos(values[i]), _math.sin(values[i])
-        rot = _numpy.diag([c,c,c,c,1.0,1.0])
-        rot[0,2], rot[1,3], rot[2,0], rot[3,1] = s, s, -s, -s
-
-        for j in range(len(segs)):
-            idx = segs[j]
-            if lattice[idx].angle != 0 and lattice[idx].length != 0:
-                rho    = lattice[idx].length / lattice[idx].angle
-                orig_s = lattice[idx].polynom_a[0] * rho
-                orig_c = lattice[idx].polynom_b[0] * rho + 1.0  # look at bndpolysymplectic4pass
-                lattice[idx].polynom_a[0] = (orig_s * c + orig_c * s) / rho     # sin(teta)/rho
-                lattice[idx].polynom_b[0] = ((orig_c*c - orig_s*s) - 1.0) / rho # (cos(teta)-1)/rho
-            else:
-                lattice[idx].r_in  = rot
-                lattice[idx].r_out = rot.T
+    ''' rotates the field of dipoles and sets R1 and R2 of other elements '''
+    is_dipole = _is_dipole(lattice, segs)
+    for k in _numpy.flatnonzero(is_dipole):
+        _add_dipole_roll(lattice[segs[k]], values[k])
+    magnets = segs[~is_dipole]
+    rot = _roll_matrices(values[~is_dipole])
+    _set_coords(lattice, magnets, 'r_in', rot)
+    _set_coords(lattice, magnets, 'r_out', rot.transpose((0,2,1)))
 
 
 @_interactive
@@ -613,25 +790,19 @@ def add_error_rotation_roll(lattice, indices, values):
 
     ''' processes arguments '''
     indices, values = _process_args_errors(indices, values)
+    segs, owner, *_ = _process_segments(indices)
+    values = _numpy.array(values, dtype=float)[owner]
 
-    ''' loops over elements and sets its R1 and R2 fields '''
-    for i in range(len(indices)):
-        segs = indices[i]
-        c, s = _math.cos(values[i]), _math.sin(values[i])
-        rot = _numpy.diag([c,c,c,c,1.0,1.0])
-        rot[0,2], rot[1,3], rot[2,0], rot[3,1] = s, s, -s, -s
-
-        for j in range(len(segs)):
-            idx = segs[j]
-            if lattice[idx].angle != 0 and lattice[idx].length != 0:
-                rho    = lattice[idx].length / lattice[idx].angle
-                orig_s = lattice[idx].polynom_a[0] * rho
-                orig_c = lattice[idx].polynom_b[0] * rho + 1.0  # look at bndpolysymplectic4pass
-                lattice[idx].polynom_a[0] = (orig_s * c + orig_c * s) / rho     # sin(teta)/rho
-                lattice[idx].polynom_b[0] = ((orig_c*c - orig_s*s) - 1.0) / rho # (cos(teta)-1)/rho
-            else:
-                lattice[idx].r_in  = _numpy.dot(rot, lattice[idx].r_in)
-                lattice[idx].r_out = _numpy.dot(lattice[idx].r_out, rot.T)
+    ''' rotates the field of dipoles and R1 and R2 of other elements '''
+    is_dipole = _is_dipole(lattice, segs)
+    for k in _numpy.flatnonzero(is_dipole):
+        _add_dipole_roll(lattice[segs[k]], values[k])
+    magnets = segs[~is_dipole]
+    rot = _roll_matrices(values[~is_dipole])
+    r_in = _get_coords(lattice, magnets, 'r_in')
+    r_out = _get_coords(lattice, magnets, 'r_out')
+    _set_coords(lattice, magnets, 'r_in', _numpy.einsum('nij,njk->nik', rot, r_in))
+    _set_coords(lattice, magnets, 'r_out', _numpy.einsum('nij,nkj->nik', r_out, rot))
 
 
 @_interactive
@@ -654,16 +825,11 @@ def get_error_rotation_pitch(lattice, indices):
 
     ''' processes arguments '''
     indices, *_ = _process_args_errors(indices, 0.0)
+    segs, owner, first, last = _process_segments(indices)
 
-    ''' loops over elements and gets error from T_IN '''
-    values = []
-    for i in range(len(indices)):
-        segs = indices[i]
-        ang = lattice[segs[0]].t_in[3]
-        values.extend(len(segs)*[-ang])
-
-    if len(values) == 1: return values[0]
-    else: return values
+    ''' gets errors from T_IN of all elements at once '''
+    angles = -_get_coords(lattice, first, 't_in')[:,3]
+    return _error_values(angles[owner])
 
 
 @_interactive
@@ -685,25 +851,28 @@ def set_error_rotation_pitch(lattice, indices, values):
 
     #processes arguments
     indices, values = _process_args_errors(indices, values)
-
-    #set new values to first T1 and last T2
-    for i in range(len(indices)):
-        segs = indices[i]
-        angy = -values[i]
-        L    = sum([lattice[ii].length for ii in segs])
-        #It is possible that there is a misalignment error, so:
-        misy = (lattice[segs[0]].t_in[2] - lattice[segs[-1]].t_out[2])/2
-
-        # correction of the path length
-        old_angx = lattice[segs[0]].t_in[1]
-        path = -(L/2)*(angy*angy + old_angx*old_angx)
-
-        #Apply the errors only to the entrance of the first and exit of the last segment:
-        lattice[segs[ 0]].t_in[2]  = -(L/2)*angy+misy
-        lattice[segs[-1]].t_out[2] = -(L/2)*angy-misy
-        lattice[segs[ 0]].t_in[3]  =  angy
-        lattice[segs[-1]].t_out[3] = -angy
-        lattice[segs[-1]].t_out[5] =  path
+    segs, owner, first, last = _process_segments(indices)
+    angy = -_numpy.array(values, dtype=float)
+    L = _numpy.bincount(owner, weights=_attribute_array(lattice, 'length', segs),
+                        minlength=len(first))
+
+    t_in = _get_coords(lattice, first, 't_in')
+    t_out = _get_coords(lattice, last, 't_out')
+    #It is possible that there is a misalignment error, so:
+    misy = (t_in[:,2] - t_out[:,2])/2
+
+    # correction of the path length
+    old_angx = t_in[:,1]
+    path = -(L/2)*(angy*angy + old_angx*old_angx)
+
+    #Apply the errors only to the entrance of the first and exit of the last segment:
+    t_in[:,2]  = -(L/2)*angy+misy
+    t_out[:,2] = -(L/2)*angy-misy
+    t_in[:,3]  =  angy
+    t_out[:,3] = -angy
+    t_out[:,5] =  path
+    _set_coords(lattice, first, 't_in', t_in)
+    _set_coords(lattice, last, 't_out', t_out)
 
 @_interactive
 def add_error_rotation_pitch(lattice, indices, values):
@@ -724,20 +893,22 @@ def add_error_rotation_pitch(lattice, indices, values):
 
     #processes arguments
     indices, values = _process_args_errors(indices, values)
+    segs, owner, first, last = _process_segments(indices)
+    angy = -_numpy.array(values, dtype=float)
+    L = _numpy.bincount(owner, weights=_attribute_array(lattice, 'length', segs),
+                        minlength=len(first))
 
-    #set new values to first T1 and last T2. Uses small angle approximation
-    for i in range(len(indices)):
-        segs = indices[i]
-        angy  = -values[i]
-        L    = sum([lattice[ii].length for ii in segs])
+    # correction of the path length. Uses small angle approximation
+    old_angy = _get_coords(lattice, first, 't_in')[:,3]
+    path = -(L/2)*((angy+old_angy)*(angy+old_angy) - old_angy*old_angy)
 
-        # correction of the path length
-        old_angy = lattice[segs[0]].t_in[3]
-        path = -(L/2)*((angy+old_angy)*(angy+old_angy) - old_angy*old_angy)
-
-        #Apply the errors only to the entrance of the first and exit of the last segment:
-        lattice[segs[ 0]].t_in  += _numpy.array([0,0,-(L/2)*angy, angy,0,0])
-        lattice[segs[-1]].t_out += _numpy.array([0,0,-(L/2)*angy,-angy,0,path])
+    #Apply the errors only to the entrance of the first and exit of the last segment:
+    delta_in = _numpy.zeros((len(first), _NUM_COORDS))
+    delta_out = _numpy.zeros((len(last), _NUM_COORDS))
+    delta_in[:,2], delta_in[:,3] = -(L/2)*angy, angy
+    delta_out[:,2], delta_out[:,3], delta_out[:,5] = -(L/2)*angy, -angy, path
+    _add_coords(lattice, first, 't_in', delta_in)
+    _add_coords(lattice, last, 't_out', delta_out)
 
 
 @_interactive
@@ -760,16 +931,11 @@ def get_error_rotation_yaw(lattice, indices):
 
     ''' processes arguments '''
     indices, *_ = _process_args_errors(indices, 0.0)
+    segs, owner, first, last = _process_segments(indices)
 
-    ''' loops over elements and gets error from T_IN '''
-    values = []
-    for i in range(len(indices)):
-        segs = indices[i]
-        ang = lattice[segs[0]].t_in[1]
-        values.extend(len(segs)*[-ang])
-
-    if len(values) == 1: return values[0]
-    else: return values
+    ''' gets errors from T_IN of all elements at once '''
+    angles = -_get_coords(lattice, first, 't_in')[:,1]
+    return _error_values(angles[owner])
 
 
 @_interactive
@@ -788,27 +954,31 @@ def set_error_rotation_yaw(lattice, indices, values):
       values : may be a float or a (list, tuple, 1D numpy.ndarray) of floats
         with the same length as indices. Unit [rad]
     """
+
     #processes arguments
     indices, values = _process_args_errors(indices, values)
-
-    #set new values to first T1 and last T2
-    for i in range(len(indices)):
-        segs = indices[i]
-        angx = -values[i]
-        L    = sum([lattice[ii].length for ii in segs])
-        #It is possible that there is a misalignment error, so:
-        misx = (lattice[segs[0]].t_in[0] - lattice[segs[-1]].t_out[0])/2
-
-        # correction of the path length
-        old_angy = lattice[segs[0]].t_in[3]
-        path = -(L/2)*(angx*angx + old_angy*old_angy)
-
-        #Apply the errors only to the entrance of the first and exit of the last segment:
-        lattice[segs[ 0]].t_in[0]  = -(L/2)*angx+misx
-        lattice[segs[-1]].t_out[0] = -(L/2)*angx-misx
-        lattice[segs[ 0]].t_in[1]  =  angx
-        lattice[segs[-1]].t_out[1] = -angx
-        lattice[segs[-1]].t_out[5] =  path
+    segs, owner, first, last = _process_segments(indices)
+    angx = -_numpy.array(values, dtype=float)
+    L = _numpy.bincount(owner, weights=_attribute_array(lattice, 'length', segs),
+                        minlength=len(first))
+
+    t_in = _get_coords(lattice, first, 't_in')
+    t_out = _get_coords(lattice, last, 't_out')
+    #It is possible that there is a misalignment error, so:
+    misx = (t_in[:,0] - t_out[:,0])/2
+
+    # correction of the path length
+    old_angy = t_in[:,3]
+    path = -(L/2)*(angx*angx + old_angy*old_angy)
+
+    #Apply the errors only to the entrance of the first and exit of the last segment:
+    t_in[:,0]  = -(L/2)*angx+misx
+    t_out[:,0] = -(L/2)*angx-misx
+    t_in[:,1]  =  angx
+    t_out[:,1] = -angx
+    t_out[:,5] =  path
+    _set_coords(lattice, first, 't_in', t_in)
+    _set_coords(lattice, last, 't_out', t_out)
 
 
 @_interactive
@@ -830,20 +1000,22 @@ def add_error_rotation_yaw(lattice, indices, values):
 
     #processes arguments
     indices, values = _process_args_errors(indices, values)
+    segs, owner, first, last = _process_segments(indices)
+    angx = -_numpy.array(values, dtype=float)
+    L = _numpy.bincount(owner, weights=_attribute_array(lattice, 'length', segs),
+                        minlength=len(first))
 
-    #set new values to first T1 and last T2. Uses small angle approximation
-    for i in range(len(indices)):
-        segs = indices[i]
-        angx  = -values[i]
-        L    = sum([lattice[ii].length for ii in segs])
-
-        # correction of the path length
-        old_angx = lattice[segs[0]].t_in[1]
-        path = -(L/2)*((angx+old_angx)*(angx+old_angx) - old_angx*old_angx)
+    # correction of the path length. Uses small angle approximation
+    old_angx = _get_coords(lattice, first, 't_in')[:,1]
+    path = -(L/2)*((angx+old_angx)*(angx+old_angx) - old_angx*old_angx)
 
-        #Apply the errors only to the entrance of the first and exit of the last segment:
-        lattice[segs[ 0]].t_in  += _numpy.array([-(L/2)*angx, angx,0,0,0,0])
-        lattice[segs[-1]].t_out += _numpy.array([-(L/2)*angx,-angx,0,0,0,path])
+    #Apply the errors only to the entrance of the first and exit of the last segment:
+    delta_in = _numpy.zeros((len(first), _NUM_COORDS))
+    delta_out = _numpy.zeros((len(last), _NUM_COORDS))
+    delta_in[:,0], delta_in[:,1] = -(L/2)*angx, angx
+    delta_out[:,0], delta_out[:,1], delta_out[:,5] = -(L/2)*angx, -angx, path
+    _add_coords(lattice, first, 't_in', delta_in)
+    _add_coords(lattice, last, 't_out', delta_out)
 
 
 @_interactive
@@ -958,7 +1130,7 @@ def add_error_multipoles(lattice, indices, r0, main_monom, Bn_norm=None, An_norm
                 Pol = Pol_norm
             else:
                 Pol = _numpy.array(Pol_norm)
-            monoms = abs(n-1) - np.arange(Pol.shape[0])
+            monoms = abs(n-1) - _numpy.arange(Pol.shape[0])
             r0_i = r0**monoms
             newPol = KP*r0_i*Pol
             oldPol = getattr(elem,polynom)
@@ -1023,6 +1195,153 @@ def _process_args_errors(indices, values):
     return indices, values
 
 
+def _process_segments(indices):
+    # flattened indices of the segments, index of the element of each segment
+    # and indices of the first and last segments of each element
+    nr_segs = [len(segs) for segs in indices]
+    segs = _numpy.array([i for element in indices for i in element], dtype=int)
+    owner = _numpy.repeat(_numpy.arange(len(indices)), nr_segs)
+    first = [int(element[0]) for element in indices]
+    last = [int(element[-1]) for element in indices]
+    return segs, owner, first, last
+
+
+def _error_values(values):
+    values = _numpy.asarray(values).tolist()
+    if len(values) == 1:
+        return values[0]
+    else:
+        return values
+
+
+def _attribute_array(lattice, attribute_name, indices):
+    if len(indices) == 0:
+        return _numpy.zeros(0)
+    return _numpy.array(get_attribute(lattice, attribute_name, list(indices)),
+                        dtype=float)
+
+
+def _is_dipole(lattice, indices):
+    angle = _attribute_array(lattice, 'angle', indices)
+    length = _attribute_array(lattice, 'length', indices)
+    return (angle != 0) & (length != 0)
+
+
+def _add_dipole_roll(element, angle):
+    # dipoles are rotated through their field, not through R1 and R2
+    c, s = _math.cos(angle), _math.sin(angle)
+    rho    = element.length / element.angle
+    orig_s = element.polynom_a[0] * rho
+    orig_c = element.polynom_b[0] * rho + 1.0  # look at bndpolysymplectic4pass
+    element.polynom_a[0] = (orig_s * c + orig_c * s) / rho     # sin(teta)/rho
+    element.polynom_b[0] = ((orig_c*c - orig_s*s) - 1.0) / rho # (cos(teta)-1)/rho
+
+
+def _roll_matrices(angles):
+    c, s = _numpy.cos(angles), _numpy.sin(angles)
+    rot = _numpy.zeros((len(angles), _NUM_COORDS, _NUM_COORDS))
+    rot[:,0,0] = rot[:,1,1] = rot[:,2,2] = rot[:,3,3] = c
+    rot[:,4,4] = rot[:,5,5] = 1.0
+    rot[:,0,2] = rot[:,1,3] = s
+    rot[:,2,0] = rot[:,3,1] = -s
+    return rot
+
+
+# ------------------------------------------------------------------------------
+# Bulk access to t_in, t_out, r_in and r_out of lattice elements.
+#
+# trackcpp stores the elements of an accelerator in a std::vector, so these
+# fields of all elements lie in memory with a constant stride and can be
+# mapped to a single numpy view. Lattices which cannot be mapped (lists of
+# Element objects, for instance) are handled element by element.
+# ------------------------------------------------------------------------------
+
+_COORD_SHAPES = {
+    't_in'  : (_NUM_COORDS,),
+    't_out' : (_NUM_COORDS,),
+    'r_in'  : (_NUM_COORDS, _NUM_COORDS),
+    'r_out' : (_NUM_COORDS, _NUM_COORDS),
+}
+
+
+def _coord_block(lattice, attribute):
+    """Return a numpy view of t_in, t_out, r_in or r_out of all elements of an
+    Accelerator, indexed by element, or None if it cannot be mapped.
+
+    The view is only valid until the lattice is resized.
+    """
+    if not isinstance(lattice, _pyaccel.accelerator.Accelerator) or len(lattice) == 0:
+        return None
+    elements = lattice._accelerator.lattice
+    nr_elements = len(elements)
+    shape = _COORD_SHAPES[attribute]
+    nbytes = _numpy.dtype(float).itemsize*int(_numpy.prod(shape))
+    try:
+        address = int(getattr(elements[0], attribute))
+        stride = nbytes
+        if nr_elements > 1:
+            stride = int(getattr(elements[1], attribute)) - address
+            last = int(getattr(elements[nr_elements-1], attribute))
+            if stride < nbytes or last != address + (nr_elements-1)*stride:
+                return None
+    except (AttributeError, TypeError):
+        return None
+    size = (nr_elements-1)*stride + nbytes
+    c_buffer = (_ctypes.c_char*size).from_address(address)
+    strides = (stride,) + _numpy.zeros(shape).strides
+    return _numpy.ndarray((nr_elements,) + shape, dtype=float,
+                          buffer=c_buffer, strides=strides)
+
+
+def _get_coords(lattice, indices, attribute):
+    """Return an array with copies of an attribute of the selected elements"""
+    block = _coord_block(lattice, attribute)
+    if block is not None:
+        return block[list(indices)]
+    values = [getattr(lattice[int(i)], attribute) for i in indices]
+    return _numpy.array(values, dtype=float).reshape(
+        (len(values),) + _COORD_SHAPES[attribute])
+
+
+def _set_coords(lattice, indices, attribute, values):
+    block = _coord_block(lattice, attribute)
+    if block is not None:
+        block[list(indices)] = values
+        lattice._lattice_changed(attribute)
+        return
+    for i, value in zip(indices, values):
+        setattr(lattice[int(i)], attribute, _numpy.array(value))
+
+
+def _set_coords_column(lattice, indices, attribute, column, values):
+    coords = _get_coords(lattice, indices, attribute)
+    coords[:,column] = values
+    _set_coords(lattice, indices, attribute, coords)
+
+
+def _add_coords(lattice, indices, attribute, delta):
+    # repeated indices accumulate, as in sequential additions
+    block = _coord_block(lattice, attribute)
+    if block is not None:
+        _numpy.add.at(block, list(indices), delta)
+        lattice._lattice_changed(attribute)
+        return
+    for i, d in zip(indices, delta):
+        element = lattice[int(i)]
+        setattr(element, attribute, getattr(element, attribute) + d)
+
+
+def _table_attribute(lattice, attribute_name, pass_method_names=True):
+    """Return values of a table attribute of an Accelerator or None"""
+    if (isinstance(lattice, _pyaccel.accelerator.Accelerator) and
+            attribute_name in lattice.table_attributes):
+        values = lattice._get_table().get(attribute_name)
+        if attribute_name == 'pass_method' and pass_method_names:
+            values = _numpy.array(_pyaccel.elements.pass_methods)[values]
+        return values
+    return None
+
+
 def _is_equal(a,b):
     # checks for strings
     if isinstance(a,str):
@@ -4,15 +4,36 @@ import mathphys as _mp
 import pyaccel.optics as _optics
 import pyaccel.lattice as _lattice
 from pyaccel.utils import interactive as _interactive
+from pyaccel.utils import cached as _cached
 
 
 @_interactive
-def calc_lifetimes(accelerator, n=None, coupling=None, pressure_profile=None, twiss=None, eq_parameters=None):
+@_cached(disk=True)
+def calc_lifetimes(accelerator, n=None, coupling=None, pressure_profile=None, twiss=None, eq_parameters=None, energy_acceptance=None):
+    """Calculate elastic, inelastic, quantum and Touschek lifetimes.
+
+    Keyword arguments:
+    energy_acceptance -- None to use the RF energy acceptance, a float or the
+        (accep_neg, accep_pos) arrays returned by tracking.momentum_aperture
+        with indices='open'. Local acceptances larger than the RF acceptance
+        are limited to it. (default: None)
+    """
 
     parameters, twiss = _process_args(accelerator, twiss, eq_parameters, n, coupling, pressure_profile)
 
     # Acceptances
-    energy_acceptance = parameters['rf_energy_acceptance']
+    rf_energy_acceptance = parameters['rf_energy_acceptance']
+    if energy_acceptance is None:
+        energy_acceptance = rf_energy_acceptance
+    if _np.isscalar(energy_acceptance):
+        energy_acceptance = min(energy_acceptance, rf_energy_acceptance)
+        touschek_acceptances = [-energy_acceptance, energy_acceptance]
+    else:
+        accep_neg, accep_pos = energy_acceptance
+        accep_neg = _np.maximum(accep_neg, -rf_energy_acceptance)
+        accep_pos = _np.minimum(accep_pos, rf_energy_acceptance)
+        touschek_acceptances = [accep_neg, accep_pos]
+        energy_acceptance = min(_np.min(accep_pos), -_np.max(accep_neg))
     accepx, accepy, *_ = _optics.get_transverse_acceptance(accelerator, twiss, energy_offset=0.0)
     transverse_acceptances = [min(accepx), min(accepy)]
 
@@ -25,8 +46,8 @@ def calc_lifetimes(accelerator, n=None, coupling=None, pressure_profile=None, tw
     e_rate_spos = _mp.beam_lifetime.calc_elastic_loss_rate(transverse_acceptances, avg_pressure, z=7, temperature=300, **parameters)
     e_rate      = _np.trapz(e_rate_spos,spos)/(spos[-1]-spos[0])
     i_rate      = _mp.beam_lifetime.calc_inelastic_loss_rate(energy_acceptance, avg_pressure, z=7, temperature=300)
-    q_rate      = sum(_mp.beam_lifetime.calc_quantum_loss_rates(transverse_acceptances, energy_acceptance, coupling, **parameters))
-    tous_lt     = _mp.beam_lifetime.calc_touschek_loss_rate([-energy_acceptance,energy_acceptance], twiss, coupling, n, **parameters)
+    q_rate      = sum(_mp.beam_lifetime.calc_quantum_loss_rates(transverse_acceptances, rf_energy_acceptance, coupling, **parameters))
+    tous_lt     = _mp.beam_lifetime.calc_touschek_loss_rate(touschek_acceptances, twiss, coupling, n, **parameters)
 
     # Lifetimes
     e_lifetime = float("inf") if e_rate == 0.0 else 1.0/e_rate
@@ -16,6 +16,7 @@ PCEN ordering is preserved.
 import numpy as _numpy
 import trackcpp as _trackcpp
 import pyaccel.accelerator as _accelerator
+import pyaccel.tracking as _tracking
 import pyaccel.utils as _utils
 
 
@@ -23,10 +24,204 @@ _interactive = _utils.interactive
 
 class NaffException(Exception): pass
 
+
+@_interactive
+def naff_traj(particles, use_win=1):
+    """Calculate fractional tunes from turn-by-turn tracking results.
+
+    Keyword arguments:
+    particles -- turn-by-turn positions of one particle, with shape (6,T), or
+                 of N particles, with shape (N,6,T), as returned by
+                 tracking.ring_pass_bunch. Only the first T' <= T turns with
+                 (T'-1) divisible by 6 are used.
+    use_win   -- window parameter of naff_general (default: 1)
+
+    Returns a (2,) array, for one particle, or a (2,N) array with the
+    horizontal and vertical tunes, calculated with 'naff_batch' from the
+    oscillations around the mean positions. Tunes of particles with non
+    finite positions, as lost particles, are nan.
+    """
+    particles = _numpy.asarray(particles, dtype=float)
+    single = particles.ndim == 2
+    if single:
+        particles = particles[None]
+    nr_particles = particles.shape[0]
+    nr_points = _naff_length(particles.shape[2])
+
+    # all signals are analysed together, around their mean values
+    signals = particles[:, (0, 2), :nr_points].transpose((1, 0, 2))
+    signals = signals.reshape((2*nr_particles, nr_points))
+    valid = _numpy.all(_numpy.isfinite(signals), axis=1)
+    signals = signals[valid] - _numpy.mean(signals[valid], axis=1)[:,None]
+
+    tunes = _numpy.full(2*nr_particles, float('nan'))
+    if len(signals):
+        tunes[valid], _ = naff_batch(signals, is_real=True, use_win=use_win)
+    tunes = tunes.reshape((2, nr_particles))
+    return tunes[:,0] if single else tunes
+
+
 @_interactive
-def naff_traj(particles):
-    """ Calculate tunes from tracking results."""
-    return NotImplemented
+def frequency_map(accelerator, nr_turns, x_max=0.01, y_max=0.005,
+                  nr_points=(11, 6), energy_offset=0.0, workers=None):
+    """Frequency map analysis on a grid of transverse offsets.
+
+    Particles start at the closed orbit plus offsets on a grid covering
+    [-x_max, x_max] x [y_max/ny, y_max] and are tracked for 2*nr_turns. Tunes
+    are calculated with 'naff_traj' for the first and the second nr_turns
+    turns. Particles are distributed among worker processes, which both track
+    and analyse them.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    nr_turns    -- number of turns of each half of the tracking
+    x_max, y_max -- maximum horizontal and vertical offsets [m]
+    nr_points   -- (nx, ny) size of the grid (default: (11, 6))
+    energy_offset -- relative energy deviation of the particles
+    workers     -- number of worker processes (default: None)
+
+    Returns: (x, y, tunes1, tunes2, diffusion)
+
+    x, y      -- offsets of the N particles of the grid
+    tunes1    -- (2,N) array with tunes of the first half of the tracking
+    tunes2    -- (2,N) array with tunes of the second half of the tracking
+    diffusion -- log10 of the tune variation between halves. Tunes and
+                 diffusion of particles lost during tracking are nan.
+
+    Raises TrackingException
+    """
+    nx, ny = nr_points
+    x, y = _numpy.meshgrid(_numpy.linspace(-x_max, x_max, nx),
+                           _numpy.linspace(y_max/ny, y_max, ny), indexing='ij')
+    x, y = x.ravel(), y.ravel()
+
+    orbit = _tracking._closed_orbit6(accelerator, energy_offset, [0])[:,0]
+    particles = _numpy.tile(orbit, (len(x), 1))
+    particles[:,0] += x
+    particles[:,2] += y
+
+    if _tracking._nr_workers(workers) > 1:
+        slices = _tracking._shard_slices(len(x), _tracking._nr_workers(workers))
+    else:
+        slices = [slice(0, len(x))]
+    results = _tracking._parallel_map(_frequency_map_shard,
+        [(particles[sl], nr_turns) for sl in slices], workers, accelerator)
+    tunes1 = _numpy.hstack([r[0] for r in results])
+    tunes2 = _numpy.hstack([r[1] for r in results])
+
+    with _numpy.errstate(divide='ignore', invalid='ignore'):
+        diffusion = _numpy.log10(_numpy.sqrt(_numpy.sum((tunes2 - tunes1)**2,
+                                                        axis=0)))
+    return x, y, tunes1, tunes2, diffusion
+
+
+def _frequency_map_shard(accelerator, particles, nr_turns):
+    particles_out, *_ = _tracking.ring_pass_bunch(accelerator, particles,
+        nr_turns=2*nr_turns, turn_by_turn='open')
+    return (naff_traj(particles_out[:,:,:nr_turns]),
+            naff_traj(particles_out[:,:,nr_turns:]))
+
+
+@_interactive
+def naff_batch(Z, is_real=False, use_win=1):
+    """Calculate the fundamental frequency of a batch of signals.
+
+    numpy implementation of the search of the first frequency done by
+    'naff_general', applied to all signals at once: the windowed signals are
+    integrated with Hardy's rule, a zero padded FFT gives a first estimate
+    of the frequency of largest amplitude and Newton iterations on the
+    squared amplitude refine all frequencies together.
+
+    Keyword arguments:
+    Z       -- array of signals, one per row, or a single signal. (len(Z)-1)
+               must be divisible by 6.
+    is_real -- if True only non-negative frequencies are searched
+               (default: False)
+    use_win -- order of the Hanning window, 0 for no window (default: 1)
+
+    Returns: (freq, Four)
+
+    freq -- frequencies in units of the sampling frequency, such that the
+            component of the signal is Four*exp(2*pi*1j*freq*n)
+    Four -- complex amplitudes of the components
+
+    Both are arrays with one value per signal, or scalars for a single
+    signal.
+    """
+    Z = _numpy.asarray(Z)
+    single = Z.ndim == 1
+    Z = _numpy.atleast_2d(Z).astype(complex)
+    nr_points = Z.shape[1]
+    if (nr_points-1) % 6: raise NaffException('Number of points minus 1 must be divisible by 6.')
+
+    coeffs = _hardy_weights(nr_points)
+    if use_win:
+        tau = _numpy.linspace(-1.0, 1.0, nr_points)
+        coeffs *= (1.0 + _numpy.cos(_numpy.pi*tau))**use_win
+    coeffs /= _numpy.sum(coeffs)
+    weighted = Z*coeffs
+
+    # first estimate: peak of the zero padded spectrum
+    nr_fft = 4*nr_points
+    spectrum = _numpy.abs(_numpy.fft.fft(weighted, nr_fft, axis=1))
+    if is_real:
+        spectrum[:, nr_fft//2+1:] = 0.0
+    peak = _numpy.argmax(spectrum, axis=1)
+    rows = _numpy.arange(len(Z))
+    left = spectrum[rows, (peak-1) % nr_fft]
+    center = spectrum[rows, peak]
+    right = spectrum[rows, (peak+1) % nr_fft]
+    curvature = left - 2*center + right
+    with _numpy.errstate(divide='ignore', invalid='ignore'):
+        shift = _numpy.where(curvature < 0, 0.5*(left-right)/curvature, 0.0)
+    freq = (peak + shift)/nr_fft
+    freq[freq > 0.5] -= 1.0
+
+    # refinement: Newton iterations for the maximum of |F(freq)|**2
+    k = 2*_numpy.pi*_numpy.arange(nr_points)
+    max_step = 1.0/nr_points
+    for _ in range(_NEWTON_MAX_ITERATIONS):
+        terms = weighted*_numpy.exp(-1j*_numpy.outer(freq, k))
+        F0 = _numpy.sum(terms, axis=1)
+        F1 = -1j*_numpy.dot(terms, k)
+        F2 = -_numpy.dot(terms, k*k)
+        d1 = _numpy.real(_numpy.conj(F0)*F1)
+        d2 = _numpy.abs(F1)**2 + _numpy.real(_numpy.conj(F0)*F2)
+        with _numpy.errstate(divide='ignore', invalid='ignore'):
+            step = _numpy.where(d2 < 0, -d1/d2, _numpy.sign(d1)*max_step)
+        step = _numpy.clip(step, -max_step, max_step)
+        freq += step
+        if _numpy.max(_numpy.abs(step)) < _NEWTON_TOLERANCE:
+            break
+
+    Four = _numpy.sum(weighted*_numpy.exp(-1j*_numpy.outer(freq, k)), axis=1)
+    if is_real:
+        freq = _numpy.abs(freq)
+    if single:
+        return freq[0], Four[0]
+    return freq, Four
+
+
+_NEWTON_MAX_ITERATIONS = 50
+_NEWTON_TOLERANCE = 1e-13
+_HARDY_PANEL = _numpy.array([28.0, 162.0, 0.0, 220.0, 0.0, 162.0, 28.0])
+
+
+def _hardy_weights(nr_points):
+    # weights of the composite Hardy's rule: panels of 6 intervals
+    nr_panels = (nr_points - 1)//6
+    weights = _numpy.zeros(nr_points)
+    idx = 6*_numpy.arange(nr_panels)[:,None] + _numpy.arange(7)
+    _numpy.add.at(weights, idx, _HARDY_PANEL)
+    return weights
+
+
+def _naff_length(nr_points):
+    # number of points used by NAFF: (nr_points - 1) must be divisible by 6
+    nr_points -= (nr_points - 1) % 6
+    if nr_points < 7:
+        raise NaffException('At least 7 points are needed.')
+    return nr_points
 
 @_interactive
 def naff_general(Z,is_real=False, nr_ff=2, use_win=1):
@@ -38,10 +233,7 @@ def naff_general(Z,is_real=False, nr_ff=2, use_win=1):
     Re = _trackcpp.CppDoubleVector(nr_ff,0.0)
     Im = _trackcpp.CppDoubleVector(nr_ff,0.0)
     _trackcpp.naff_general(Z.real,Z.imag,is_real,nr_ff,use_win,ff,Re,Im)
-    freq = _numpy.zeros(ff.size(),dtype=float)
-    Four = _numpy.zeros(ff.size(),dtype=complex)
-    for i in range(ff.size()):
-        freq[i] = ff[i]
-        Four[i] = Re[i] + 1j*Im[i]
+    freq = _numpy.array(tuple(ff), dtype=float)
+    Four = _numpy.array(tuple(Re)) + 1j*_numpy.array(tuple(Im))
 
     return freq, Four
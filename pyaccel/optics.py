@@ -7,6 +7,7 @@ import pyaccel.lattice as _lattice
 import pyaccel.tracking as _tracking
 import trackcpp as _trackcpp
 from pyaccel.utils import interactive as _interactive
+from pyaccel.utils import cached as _cached
 
 
 class OpticsException(Exception):
@@ -233,6 +234,7 @@ class Twiss:
 
 
 @_interactive
+@_cached(disk=True)
 def calc_twiss(accelerator=None, init_twiss=None, fixed_point=None, indices = 'open', energy_offset=None):
     """Return Twiss parameters of uncoupled dynamics.
 
@@ -275,19 +277,14 @@ def calc_twiss(accelerator=None, init_twiss=None, fixed_point=None, indices = 'o
                 'invoked for transport line without initial twiss')
 
         if fixed_point is None:
-            _closed_orbit = _trackcpp.CppDoublePosVector()
-            _fixed_point_guess = _trackcpp.CppDoublePos()
-            if energy_offset is not None: _fixed_point_guess.de = energy_offset
-
             if not accelerator.cavity_on and not accelerator.radiation_on:
-                r = _trackcpp.track_findorbit4(accelerator._accelerator, _closed_orbit, _fixed_point_guess)
+                kind = 'orbit4'
             elif not accelerator.cavity_on and accelerator.radiation_on:
                 raise OpticsException('The radiation is on but the cavity is off')
             else:
-                r = _trackcpp.track_findorbit6(accelerator._accelerator, _closed_orbit, _fixed_point_guess)
-
-            if r > 0:
-                raise _tracking.TrackingException(_trackcpp.string_error_messages[r])
+                kind = 'orbit6'
+            _closed_orbit = _tracking._find_orbit(accelerator, kind,
+                                                  energy_offset=energy_offset)
             _fixed_point = _closed_orbit[0]
 
         else:
@@ -408,11 +405,80 @@ def get_frac_tunes(accelerator=None, m66=None, closed_orbit=None, coupled=False)
 
 
 @_interactive
-def get_chromaticities(accelerator):
-    raise OpticsException('not implemented')
+def get_chromaticities(accelerator, method='numeric', order=1,
+                       energy_offset=None, twiss=None, workers=None):
+    """Return chromaticities of the accelerator.
+
+    Keyword arguments:
+    accelerator   -- Accelerator object
+    method        -- 'numeric' or 'analytic' (default: 'numeric')
+        'numeric' : total tunes are calculated with calc_twiss (4D) for each
+                    energy offset and fitted with a polynom of degree 'order'.
+                    Energy offsets are distributed among 'workers' processes.
+        'analytic': first order chromaticities from the integrals of
+                    beta*(K - 2*S*etax) over the lattice, with the Twiss
+                    parameters at the ends of the elements. Curvature and
+                    edge terms of dipoles are neglected.
+    order         -- order of the fit of the numeric method (default: 1)
+    energy_offset -- list of energy offsets of the numeric method (default:
+                     2*order+3 points between -1e-3 and 1e-3)
+    twiss         -- TwissList with indices='closed' for the analytic method
+                     (default: None, calculated)
+    workers       -- number of worker processes (default: None)
+
+    Returns (chrom_x, chrom_y). For order > 1 each is a list with the
+    coefficients of energy_offset, energy_offset**2, ... of the tune.
+    """
+    if method == 'analytic':
+        if order != 1:
+            raise OpticsException('analytic chromaticities are only of first order')
+        return _analytic_chromaticities(accelerator, twiss)
+    elif method != 'numeric':
+        raise OpticsException("invalid value for 'method' in get_chromaticities")
+
+    if energy_offset is None:
+        energy_offset = _np.linspace(-1e-3, 1e-3, 2*order+3)
+    if accelerator.cavity_on or accelerator.radiation_on:
+        accelerator = accelerator[:]
+        _tracking.set_4d_tracking(accelerator)
+
+    tunes = _tracking._parallel_map(_total_tunes,
+        [(float(de),) for de in energy_offset], workers, accelerator)
+    polynom = _np.polyfit(energy_offset, _np.array(tunes), order)
+    chrom_x, chrom_y = polynom[-2::-1].T.tolist()
+    if order == 1:
+        return chrom_x[0], chrom_y[0]
+    return chrom_x, chrom_y
+
+
+def _total_tunes(accelerator, energy_offset):
+    twiss, *_ = calc_twiss(accelerator, energy_offset=energy_offset,
+                           indices='closed')
+    return twiss.mux[-1]/2/_math.pi, twiss.muy[-1]/2/_math.pi
+
+
+def _analytic_chromaticities(accelerator, twiss):
+    if twiss is None:
+        twiss, *_ = calc_twiss(accelerator, indices='closed')
+    if len(twiss) != len(accelerator) + 1:
+        raise OpticsException("twiss must be calculated with indices='closed'")
+    length = accelerator.get_attributes('length')
+    K = accelerator.get_attributes('K')
+    S = accelerator.get_attributes('S')
+    betax, betay, etax = twiss.betax, twiss.betay, twiss.etax
+
+    # average of the values at the entrance and exit of each element
+    betax = (betax[:-1] + betax[1:])/2
+    betay = (betay[:-1] + betay[1:])/2
+    etax = (etax[:-1] + etax[1:])/2
+    strength = (K - 2*S*etax)*length
+    chrom_x = -_np.dot(betax, strength)/4/_math.pi
+    chrom_y = _np.dot(betay, strength)/4/_math.pi
+    return chrom_x, chrom_y
 
 
 @_interactive
+@_cached(disk=True)
 def get_mcf(accelerator, order=1, energy_offset=None):
     """Return momentum compaction factor of the accelerator"""
     if energy_offset is None:
@@ -462,13 +528,8 @@ def get_radiation_integrals(accelerator,
         betax = _np.resize(betax,len(accelerator)+1); betax[-1] = betax[0]
         alphax = _np.resize(alphax,len(accelerator)+1); alphax[-1] = alphax[0]
     gammax = (1+alphax**2)/betax
-    n = len(accelerator)
-    angle, angle_in, angle_out, K = _np.zeros((4,n))
-    for i in range(n):
-        angle[i] = accelerator._accelerator.lattice[i].angle
-        angle_in[i] = accelerator._accelerator.lattice[i].angle_in
-        angle_out[i] = accelerator._accelerator.lattice[i].angle_out
-        K[i] = accelerator._accelerator.lattice[i].polynom_b[1]
+    angle, angle_in, angle_out, K = [accelerator.get_attributes(name) for
+        name in ('angle', 'angle_in', 'angle_out', 'K')]
     idx, *_ = _np.nonzero(angle)
     leng = spos[idx+1]-spos[idx]
     rho  = leng/angle[idx]
@@ -561,6 +622,7 @@ def get_natural_bunch_length(accelerator):
 
 
 @_interactive
+@_cached(disk=True)
 def get_equilibrium_parameters(accelerator,
                              twiss=None,
                              m66=None,
@@ -671,8 +733,7 @@ def get_transverse_acceptance(accelerator, twiss=None, init_twiss=None, fixed_po
     betax, betay, etax, etay = twiss.betax, twiss.betay, twiss.etax, twiss.etay
 
     # physical apertures
-    lattice = accelerator._accelerator.lattice
-    hmax, vmax = _np.array([(lattice[i].hmax,lattice[i].vmax) for i in range(len(accelerator))]).transpose()
+    hmax, vmax = accelerator.get_attributes('hmax'), accelerator.get_attributes('vmax')
     if len(hmax) != n:
         hmax = _np.append(hmax, hmax[-1])
         vmax = _np.append(vmax, vmax[-1])
@@ -717,123 +778,150 @@ def get_transverse_acceptance(accelerator, twiss=None, init_twiss=None, fixed_po
 
 class TwissList(object):
 
+    # rows of the numpy block where the Twiss parameters are stored
+    _fields = ('spos', 'betax', 'alphax', 'betay', 'alphay', 'mux', 'muy',
+               'etax', 'etapx', 'etay', 'etapy',
+               'rx', 'px', 'ry', 'py', 'de', 'dl')
+    _rows = dict((name, i) for i, name in enumerate(_fields))
+    _co_rows = slice(_rows['rx'], _rows['dl']+1)
+
     def __init__(self, twiss_list=None):
-        """Read-only list of matrices.
+        """Read-only list of Twiss parameters.
+
+        Parameters are stored in a single numpy block with one row per Twiss
+        parameter and one column per lattice point, filled once at creation.
+        Properties return read-only views of its rows and slicing returns
+        TwissList objects sharing the same block. Indexing with a list of
+        indices returns a TwissList with a copy of the selected columns,
+        detached from the block. Appended points are written to spare columns
+        of the block, whose capacity is doubled when full.
 
         Keyword argument:
-        twiss_list -- trackcpp Twiss vector (default: None)
+        twiss_list -- trackcpp Twiss vector or numpy array with one row for
+                      each parameter in TwissList._fields (default: None)
         """
-        # TEST!
-        if twiss_list is not None:
-            if isinstance(twiss_list, _trackcpp.CppTwissVector):
-                self._tl = twiss_list
-            else:
-                raise TrackingException('invalid Twiss vector')
+        if twiss_list is None:
+            self._data = _np.zeros((len(self._fields), 0))
+        elif isinstance(twiss_list, _trackcpp.CppTwissVector):
+            self._data = _np.zeros((len(self._fields), len(twiss_list)))
+            for i in range(len(twiss_list)):
+                self._data[:,i] = self._twiss2column(twiss_list[i])
+        elif isinstance(twiss_list, _np.ndarray) and \
+                twiss_list.ndim == 2 and twiss_list.shape[0] == len(self._fields):
+            self._data = twiss_list
         else:
-            self._tl = _trackcpp.CppTwissVector()
-        self._ptl = [self._tl[i] for i in range(len(self._tl))]
+            raise OpticsException('invalid Twiss vector')
+        self._block = None # block with spare columns, owned by appending lists
 
     def __len__(self):
-        return len(self._tl)
+        return self._data.shape[1]
 
     def __getitem__(self, index):
-        if isinstance(index,(int, _np.int_)):
-            return Twiss(twiss=self._tl[index])
-        elif isinstance(index, (list,tuple,_np.ndarray)) and all(isinstance(x, (int, _np.int_)) for x in index):
-            tl = _trackcpp.CppTwissVector()
-            for i in index:
-                tl.append(self._tl[i])
-            return TwissList(twiss_list = tl)
+        if isinstance(index,(int, _np.integer)):
+            return self._column2twiss(self._data[:,index])
+        elif isinstance(index, (list,tuple,_np.ndarray)) and all(isinstance(x, (int, _np.integer)) for x in index):
+            return TwissList(twiss_list = self._data[:,list(index)])
         elif isinstance(index, slice):
-            return TwissList(twiss_list = self._tl[index])
+            return TwissList(twiss_list = self._data[:,index])
         else:
             raise TypeError('invalid index')
 
     def append(self, value):
         if isinstance(value, _trackcpp.Twiss):
-            self._tl.append(value)
-            self._ptl.append(value)
+            column = self._twiss2column(value)
         elif isinstance(value, Twiss):
-            self._tl.append(value._t)
-            self._ptl.append(value._t)
-        elif self._is_list_of_lists(value):
-            t = _trackcpp.Twiss()
-            for line in value:
-                t.append(line)
-            self._tl.append(t)
-            self._ptl.append(t)
+            column = self._twiss2column(value._t)
         else:
-            raise TrackingException('can only append twiss-like objects')
-
-    def _is_list_of_lists(self, value):
-        valid_types = (list, tuple)
-        if not isinstance(value, valid_types):
-            return False
-        for line in value:
-            if not isinstance(line, valid_types):
-                return False
-        return True
+            raise OpticsException('can only append twiss-like objects')
+        n = len(self)
+        if self._block is None or self._block.shape[1] == n:
+            block = _np.empty((len(self._fields), max(2*n, 16)))
+            block[:,:n] = self._data
+            self._block = block
+        self._block[:,n] = column
+        self._data = self._block[:,:n+1]
+
+    # spare columns of appended lists are not copied or pickled
+    def __getstate__(self):
+        return {'_data': self._data, '_block': None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _twiss2column(t):
+        co = _tracking._CppDoublePos2Numpy(t.co)
+        etax, etay = t.etax, t.etay
+        return (t.spos, t.betax, t.alphax, t.betay, t.alphay, t.mux, t.muy,
+                etax[0], etax[1], etay[0], etay[1],
+                co[0], co[1], co[2], co[3], co[4], co[5])
+
+    @classmethod
+    def _column2twiss(cls, column):
+        r = cls._rows
+        t = Twiss.make_new(
+            co = column[cls._co_rows],
+            mu = (column[r['mux']], column[r['muy']]),
+            beta = (column[r['betax']], column[r['betay']]),
+            alpha = (column[r['alphax']], column[r['alphay']]),
+            etax = (column[r['etax']], column[r['etapx']]),
+            etay = (column[r['etay']], column[r['etapy']]))
+        t.spos = column[r['spos']]
+        return t
+
+    def _get(self, name):
+        values = self._data[self._rows[name]]
+        values.setflags(write=False) # views must not modify the shared block
+        return values if len(values) > 1 else values[0]
 
     @property
     def spos(self):
-        spos = _np.array([float(self._ptl[i].spos) for i in range(len(self._ptl))])
-        return spos if len(spos) > 1 else spos[0]
+        return self._get('spos')
 
     @property
     def betax(self):
-        betax = _np.array([float(self._ptl[i].betax) for i in range(len(self._ptl))])
-        return betax if len(betax) > 1 else betax[0]
+        return self._get('betax')
 
     @property
     def betay(self):
-        betay = _np.array([float(self._ptl[i].betay) for i in range(len(self._ptl))])
-        return betay if len(betay) > 1 else betay[0]
+        return self._get('betay')
 
     @property
     def alphax(self):
-        alphax = _np.array([float(self._ptl[i].alphax) for i in range(len(self._ptl))])
-        return alphax if len(alphax) > 1 else alphax[0]
+        return self._get('alphax')
 
     @property
     def alphay(self):
-        alphay = _np.array([float(self._ptl[i].alphay) for i in range(len(self._ptl))])
-        return alphay if len(alphay) > 1 else alphay[0]
+        return self._get('alphay')
 
     @property
     def mux(self):
-        mux = _np.array([float(self._ptl[i].mux) for i in range(len(self._ptl))])
-        return mux if len(mux) > 1 else mux[0]
+        return self._get('mux')
 
     @property
     def muy(self):
-        muy = _np.array([float(self._ptl[i].muy) for i in range(len(self._ptl))])
-        return muy if len(muy) > 1 else muy[0]
+        return self._get('muy')
 
     @property
     def etax(self):
-        etax = _np.array([float(self._ptl[i].etax[0]) for i in range(len(self._ptl))])
-        return etax if len(etax) > 1 else etax[0]
+        return self._get('etax')
 
     @property
     def etay(self):
-        etay = _np.array([float(self._ptl[i].etay[0]) for i in range(len(self._ptl))])
-        return etay if len(etay) > 1 else etay[0]
+        return self._get('etay')
 
     @property
     def etapx(self):
-        etapx = _np.array([float(self._ptl[i].etax[1]) for i in range(len(self._ptl))])
-        return etapx if len(etapx) > 1 else etapx[0]
+        return self._get('etapx')
 
     @property
     def etapy(self):
-        etapy = _np.array([float(self._ptl[i].etay[1]) for i in range(len(self._ptl))])
-        return etapy if len(etapy) > 1 else etapy[0]
+        return self._get('etapy')
 
     @property
     def co(self):
-        co = [self._ptl[i].co for i in range(len(self._ptl))]
-        co = [[co[i].rx, co[i].px, co[i].ry, co[i].py, co[i].de, co[i].dl] for i in range(len(co))]
-        co = _np.transpose(_np.array(co))
+        co = self._data[self._co_rows]
+        co.setflags(write=False)
         return co if len(co[0,:]) > 1 else co[:,0]
 
 
@@ -857,9 +945,13 @@ def get_twiss(twiss_list, attribute_list):
     if isinstance(attribute_list, str):
         attribute_list = (attribute_list,)
     values = _np.zeros((len(attribute_list),len(twiss_list)))
-    for i in range(len(twiss_list)):
+    if isinstance(twiss_list, TwissList):
         for j in range(len(attribute_list)):
-            values[j,i] = getattr(twiss_list[i], attribute_list[j])
+            values[j,:] = getattr(twiss_list, attribute_list[j])
+    else:
+        for i in range(len(twiss_list)):
+            for j in range(len(attribute_list)):
+                values[j,i] = getattr(twiss_list[i], attribute_list[j])
     if values.shape[0] == 1:
         return values[0,:]
     else:
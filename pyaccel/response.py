@@ -0,0 +1,268 @@
+import math as _math
+import numpy as _numpy
+import pyaccel.optics as _optics
+import pyaccel.tracking as _tracking
+from pyaccel.utils import interactive as _interactive
+from pyaccel.utils import cached as _cached
+
+
+class ResponseException(Exception):
+    pass
+
+
+@_interactive
+@_cached(disk=True)
+def calc_orbit_response(accelerator, bpm_indices, hcm_indices, vcm_indices,
+                        method='analytic', delta_kick=1e-5, workers=None):
+    """Return response matrix of the closed orbit at the BPMs to the kicks of
+    the correctors.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    bpm_indices -- indices of the elements where the orbit is measured
+    hcm_indices -- indices of the elements whose hkick is varied
+    vcm_indices -- indices of the elements whose vkick is varied
+    method      -- 'analytic' or 'exact' (default: 'analytic')
+        'analytic': linear uncoupled response calculated from the betatron
+                    functions and phases of calc_twiss,
+                    sqrt(beta_i*beta_j)*cos(|mu_i - mu_j| - pi*tune)/(2*sin(pi*tune)),
+                    with the Twiss parameters of the correctors averaged over
+                    their entrance and exit.
+        'exact'   : central differences of find_orbit4 for kicks of
+                    +/-delta_kick. Correctors are distributed among 'workers'
+                    processes.
+    delta_kick  -- kick of the exact method [rad] (default: 1e-5)
+    workers     -- number of worker processes (default: None). Matrices are
+                   calculated with a 4D copy of the accelerator, so only the
+                   number of processes of a WorkerPool is used.
+
+    Returns numpy array with shape (2*nr_bpms, nr_hcms + nr_vcms). The first
+    nr_bpms rows are the horizontal orbit and the last nr_bpms the vertical.
+    The energy deviation is kept constant (4D closed orbit).
+    """
+    accelerator = _tracking_copy(accelerator)
+    bpm_indices = _numpy.array(bpm_indices, dtype=int, ndmin=1)
+    hcm_indices = _numpy.array(hcm_indices, dtype=int, ndmin=1)
+    vcm_indices = _numpy.array(vcm_indices, dtype=int, ndmin=1)
+
+    if method == 'analytic':
+        twiss, *_ = _optics.calc_twiss(accelerator, indices='closed')
+        tune_x = twiss.mux[-1]/2/_math.pi
+        tune_y = twiss.muy[-1]/2/_math.pi
+        matrix = _numpy.zeros((2*len(bpm_indices),
+                               len(hcm_indices) + len(vcm_indices)))
+        nr_bpms, nr_hcms = len(bpm_indices), len(hcm_indices)
+        matrix[:nr_bpms, :nr_hcms] = _analytic_block(
+            twiss.betax, twiss.mux, tune_x, bpm_indices, hcm_indices)
+        matrix[nr_bpms:, nr_hcms:] = _analytic_block(
+            twiss.betay, twiss.muy, tune_y, bpm_indices, vcm_indices)
+        return matrix
+    elif method != 'exact':
+        raise ResponseException(
+            "invalid value for 'method' in calc_orbit_response")
+
+    fixed_point = _tracking.find_orbit4(accelerator)[:, 0]
+    args_list = []
+    for attribute, indices in (('hkick', hcm_indices), ('vkick', vcm_indices)):
+        for s in _tracking._shard_slices(len(indices),
+                                            _tracking._nr_workers(workers)):
+            args_list.append((bpm_indices, attribute, indices[s], delta_kick,
+                              fixed_point))
+    columns = _tracking._parallel_map(_orbit_columns, args_list, workers,
+                                      accelerator)
+    columns = [c for c in columns if c.shape[1] > 0]
+    if not columns:
+        return _numpy.zeros((2*len(bpm_indices), 0))
+    return _numpy.hstack(columns)
+
+
+@_interactive
+@_cached(disk=True)
+def calc_dispersion_response(accelerator, bpm_indices, method='analytic',
+                             delta_energy=1e-5):
+    """Return response of the closed orbit at the BPMs to the energy
+    deviation, that is, the dispersion at the BPMs.
+
+    Keyword arguments:
+    accelerator  -- Accelerator object
+    bpm_indices  -- indices of the elements where the orbit is measured
+    method       -- 'analytic' (etax and etay of calc_twiss) or 'exact'
+                    (central differences of find_orbit4) (default: 'analytic')
+    delta_energy -- energy offset of the exact method (default: 1e-5)
+
+    Returns numpy array with shape (2*nr_bpms,), horizontal dispersion
+    followed by vertical dispersion, the column to append to the orbit
+    response matrix for corrections with the RF frequency.
+    """
+    accelerator = _tracking_copy(accelerator)
+    bpm_indices = _numpy.array(bpm_indices, dtype=int, ndmin=1)
+
+    if method == 'analytic':
+        twiss, *_ = _optics.calc_twiss(accelerator, indices='open')
+        return _numpy.concatenate((twiss.etax[bpm_indices],
+                                   twiss.etay[bpm_indices]))
+    elif method != 'exact':
+        raise ResponseException(
+            "invalid value for 'method' in calc_dispersion_response")
+
+    orbit_pos = _tracking.find_orbit4(accelerator, delta_energy, 'open')
+    orbit_neg = _tracking.find_orbit4(accelerator, -delta_energy, 'open')
+    difference = (orbit_pos - orbit_neg)/2/delta_energy
+    return _numpy.concatenate((difference[0, bpm_indices],
+                               difference[2, bpm_indices]))
+
+
+@_interactive
+@_cached(disk=True)
+def calc_tune_response(accelerator, knobs, method='analytic', delta=1e-4,
+                       workers=None):
+    """Return response of the betatron tunes to quadrupole knobs.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    knobs       -- list of knobs, each a list of indices of elements whose K
+                   is varied by the same amount
+    method      -- 'analytic' or 'exact' (default: 'analytic')
+        'analytic': first order tune shifts, +/-beta*L/(4*pi), with the beta
+                    functions averaged over the entrance and exit of the
+                    elements.
+        'exact'   : central differences of the tunes for K varied by
+                    +/-delta. Knobs are distributed among 'workers' processes.
+    delta       -- variation of K of the exact method [1/m^2] (default: 1e-4)
+    workers     -- number of worker processes (default: None). Matrices are
+                   calculated with a 4D copy of the accelerator, so only the
+                   number of processes of a WorkerPool is used.
+
+    Returns numpy array with shape (2, nr_knobs).
+    """
+    return _knob_response(accelerator, knobs, method, delta, workers, 'K',
+                          _analytic_tune_response, _tune_columns)
+
+
+@_interactive
+@_cached(disk=True)
+def calc_chromaticity_response(accelerator, knobs, method='analytic',
+                               delta=1e-1, workers=None):
+    """Return response of the chromaticities to sextupole knobs.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    knobs       -- list of knobs, each a list of indices of elements whose S
+                   is varied by the same amount
+    method      -- 'analytic' or 'exact' (default: 'analytic')
+        'analytic': first order variations, +/-beta*etax*L/(2*pi), with the
+                    Twiss parameters averaged over the entrance and exit of
+                    the elements, as in get_chromaticities.
+        'exact'   : central differences of the numeric chromaticities for S
+                    varied by +/-delta. Knobs are distributed among 'workers'
+                    processes.
+    delta       -- variation of S of the exact method [1/m^3] (default: 1e-1)
+    workers     -- number of worker processes (default: None). Matrices are
+                   calculated with a 4D copy of the accelerator, so only the
+                   number of processes of a WorkerPool is used.
+
+    Returns numpy array with shape (2, nr_knobs).
+    """
+    return _knob_response(accelerator, knobs, method, delta, workers, 'S',
+                          _analytic_chromaticity_response, _chromaticity_columns)
+
+
+def _tracking_copy(accelerator):
+    # perturbations are applied to a copy with 4D tracking
+    accelerator = accelerator[:]
+    _tracking.set_4d_tracking(accelerator)
+    return accelerator
+
+
+def _analytic_block(beta, mu, tune, bpm_indices, cm_indices):
+    beta_bpm = beta[bpm_indices]
+    mu_bpm = mu[bpm_indices]
+    beta_cm = (beta[cm_indices] + beta[cm_indices+1])/2
+    mu_cm = (mu[cm_indices] + mu[cm_indices+1])/2
+    phase = _numpy.abs(mu_bpm[:, None] - mu_cm[None, :]) - _math.pi*tune
+    factor = _numpy.sqrt(beta_bpm[:, None]*beta_cm[None, :])
+    return factor*_numpy.cos(phase)/(2*_math.sin(_math.pi*tune))
+
+
+def _orbit_columns(accelerator, bpm_indices, attribute, indices, delta,
+                   fixed_point):
+    columns = _numpy.zeros((2*len(bpm_indices), len(indices)))
+    for i, index in enumerate(indices):
+        value = accelerator.get_attributes(attribute, [index])[0]
+        orbits = []
+        for sign in (1, -1):
+            accelerator.set_attributes(attribute, [index], value + sign*delta)
+            orbit = _tracking.find_orbit4(accelerator, indices='open',
+                                          fixed_point_guess=fixed_point)
+            orbits.append(orbit[:, bpm_indices])
+        accelerator.set_attributes(attribute, [index], value)
+        difference = (orbits[0] - orbits[1])/2/delta
+        columns[:, i] = _numpy.concatenate((difference[0], difference[2]))
+    return columns
+
+
+def _knob_response(accelerator, knobs, method, delta, workers, attribute,
+                   analytic_function, columns_function):
+    accelerator = _tracking_copy(accelerator)
+    knobs = [_numpy.array(knob, dtype=int, ndmin=1) for knob in knobs]
+    if method == 'analytic':
+        twiss, *_ = _optics.calc_twiss(accelerator, indices='closed')
+        length = accelerator.get_attributes('length')
+        return _numpy.array([analytic_function(twiss, length, knob)
+                             for knob in knobs]).reshape(-1, 2).T
+    elif method != 'exact':
+        raise ResponseException("invalid value for 'method'")
+
+    args_list = [(knobs[s], attribute, delta)
+                 for s in _tracking._shard_slices(len(knobs),
+                                               _tracking._nr_workers(workers))]
+    columns = _tracking._parallel_map(columns_function, args_list, workers,
+                                      accelerator)
+    return _numpy.hstack([_numpy.zeros((2, 0))] + columns)
+
+
+def _averaged(values, indices):
+    return (values[indices] + values[indices+1])/2
+
+
+def _analytic_tune_response(twiss, length, knob):
+    betax = _averaged(twiss.betax, knob)
+    betay = _averaged(twiss.betay, knob)
+    dtune_x = _numpy.dot(betax, length[knob])/4/_math.pi
+    dtune_y = -_numpy.dot(betay, length[knob])/4/_math.pi
+    return dtune_x, dtune_y
+
+
+def _analytic_chromaticity_response(twiss, length, knob):
+    betax = _averaged(twiss.betax, knob)
+    betay = _averaged(twiss.betay, knob)
+    etax = _averaged(twiss.etax, knob)
+    dchrom_x = _numpy.dot(betax*etax, length[knob])/2/_math.pi
+    dchrom_y = -_numpy.dot(betay*etax, length[knob])/2/_math.pi
+    return dchrom_x, dchrom_y
+
+
+def _knob_columns(accelerator, knobs, attribute, delta, function):
+    columns = _numpy.zeros((2, len(knobs)))
+    for i, knob in enumerate(knobs):
+        values = accelerator.get_attributes(attribute, knob)
+        accelerator.set_attributes(attribute, knob, values + delta)
+        positive = _numpy.array(function(accelerator))
+        accelerator.set_attributes(attribute, knob, values - delta)
+        negative = _numpy.array(function(accelerator))
+        accelerator.set_attributes(attribute, knob, values)
+        columns[:, i] = (positive - negative)/2/delta
+    return columns
+
+
+def _tune_columns(accelerator, knobs, attribute, delta):
+    return _knob_columns(accelerator, knobs, attribute, delta, _total_tunes)
+
+
+def _chromaticity_columns(accelerator, knobs, attribute, delta):
+    return _knob_columns(accelerator, knobs, attribute, delta,
+                         _optics.get_chromaticities)
+
+
+def _total_tunes(accelerator):
+    return _optics._total_tunes(accelerator, 0.0)
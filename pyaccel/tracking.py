@@ -13,9 +13,14 @@ return particle positions structure missing one or more indices but the
 PCEN ordering is preserved.
 """
 
+import ctypes as _ctypes
+import math as _math
+import multiprocessing as _multiprocessing
+import time as _time
 import numpy as _numpy
 import trackcpp as _trackcpp
 import pyaccel.accelerator as _accelerator
+import pyaccel.elements as _elements
 import pyaccel.utils as _utils
 
 
@@ -77,15 +82,11 @@ def element_pass(element, particles, **kwargs):
     # checks whether single or multiple particles
     particles, return_ndarray, _ = _process_args(accelerator, particles)
 
-    # tracks through the list of pos
-    particles_out = _numpy.zeros(particles.shape)
-    particles_out.fill(float('nan'))
-
-    for i in range(particles.shape[0]):
-        p_in = _Numpy2CppDoublePos(particles[i,:])
-        if _trackcpp.track_elementpass_wrapper(element._e,p_in, accelerator._accelerator):
-            raise TrackingException
-        particles_out[i,:] = _CppDoublePos2Numpy(p_in)
+    # tracks the whole bunch at once
+    particles_out, lost_flag, _ = element_pass_bunch(accelerator, element,
+                                                     particles)
+    if lost_flag:
+        raise TrackingException
 
     # returns tracking data
     if particles_out.shape[0] == 1 and not return_ndarray:
@@ -95,7 +96,90 @@ def element_pass(element, particles, **kwargs):
 
 
 @_interactive
-def line_pass(accelerator, particles, indices=None, element_offset=0):
+def element_pass_bunch(accelerator, elements, particles, trajectory=False,
+                       particles_out=None):
+    """Track a bunch of particles through an element or a sequence of
+    elements.
+
+    Bunch-level version of 'element_pass': the beam parameters are taken from
+    an accelerator built once by the caller and reused between calls, and
+    particles are given as a (N,6) numpy array.
+
+    Keyword arguments:
+    accelerator   -- Accelerator object whose energy and cavity, radiation and
+                     vacuum chamber flags are used for tracking. Its lattice
+                     is not used.
+    elements      -- 'Element' object or a sequence of them
+    particles     -- initial 6D positions of the particles, a (N,6) array
+    trajectory    -- if True, positions are also returned at the entrance of
+                     each element (default: False)
+    particles_out -- optional preallocated float64 output buffer with shape
+                     (N,6) or, if 'trajectory', (N,6,len(elements)+1), which
+                     may be reused between calls
+
+    Returns: (particles_out, lost_flag, lost_element)
+
+    particles_out -- the output buffer with the positions at the exit of the
+                     last element or, if 'trajectory', at the entrance of each
+                     element followed by the exit of the last one. Positions
+                     after a particle is lost are set to nan.
+    lost_flag     -- a general flag indicating whether there has been particle
+                     loss.
+    lost_element  -- int array with the position in 'elements' of the element
+                     where each particle was lost, or -1 if it survived.
+
+    Raises TrackingException
+    """
+    if isinstance(elements, _elements.Element):
+        elements = [elements]
+    _elements_list = [e._e for e in elements]
+    particles = _numpy.ascontiguousarray(particles, dtype=float)
+    if particles.ndim != 2 or particles.shape[1] != 6:
+        raise TrackingException("'particles' must be a (N,6) array")
+    nr_particles = particles.shape[0]
+
+    # checks or allocates output buffer
+    if trajectory:
+        shape = (nr_particles, 6, len(_elements_list)+1)
+    else:
+        shape = (nr_particles, 6)
+    if particles_out is None:
+        particles_out = _numpy.empty(shape)
+    elif (not isinstance(particles_out, _numpy.ndarray) or
+            particles_out.shape != shape or
+            particles_out.dtype != _numpy.float64):
+        raise TrackingException(
+            "'particles_out' must be a float64 array with shape " + str(shape))
+    particles_out.fill(float('nan'))
+    lost_element = _numpy.full(nr_particles, -1, dtype=int)
+
+    # a single trackcpp position, read and written through a numpy view
+    p = _trackcpp.CppDoublePos()
+    view = _CppDoublePosView(p)
+    _acc = accelerator._accelerator
+    track = _trackcpp.track_elementpass_wrapper
+
+    for i in range(nr_particles):
+        _set_CppDoublePos(p, view, particles[i])
+        if trajectory:
+            particles_out[i,:,0] = particles[i]
+        for j, e in enumerate(_elements_list):
+            if track(e, p, _acc):
+                lost_element[i] = j
+                break
+            if trajectory:
+                particles_out[i,:,j+1] = _get_CppDoublePos(p, view)
+        else:
+            if not trajectory:
+                particles_out[i] = _get_CppDoublePos(p, view)
+
+    lost_flag = bool(_numpy.any(lost_element >= 0))
+    return particles_out, lost_flag, lost_element
+
+
+@_interactive
+def line_pass(accelerator, particles, indices=None, element_offset=0,
+              workers=None, recording=None):
     """Track particle(s) along a line.
 
     Accepts one or multiple particles initial positions. In the latter case,
@@ -104,7 +188,8 @@ def line_pass(accelerator, particles, indices=None, element_offset=0):
     elements are output variables, as well as information on whether particles
     have been lost along the tracking and where they were lost.
 
-    Keyword arguments: (accelerator, particles, indices, element_offset)
+    Keyword arguments: (accelerator, particles, indices, element_offset,
+                        workers, recording)
 
     accelerator -- Accelerator object
     particles   -- initial 6D particle(s) position(s).
@@ -117,6 +202,12 @@ def line_pass(accelerator, particles, indices=None, element_offset=0):
                    stored; string 'open' corresponds to selecting all elements.
     element_offset -- element offset (default 0) for tracking. tracking will
                       start at the element with index 'element_offset'
+    workers     -- number of processes among which particles are distributed
+                   (default None, tracking in the current process).
+    recording   -- RecordingPolicy selecting the elements whose entrance
+                   positions are recorded and what is recorded (default
+                   None). If given, 'indices' must be None and
+                   'particles_out' is a Recording.
 
     Returns: (particles_out, lost_flag, lost_element, lost_plane)
 
@@ -179,6 +270,22 @@ def line_pass(accelerator, particles, indices=None, element_offset=0):
 
     """
 
+    if recording is not None:
+        if indices is not None:
+            raise TrackingException(
+                "'indices' and 'recording' are mutually exclusive")
+        particles, _, _ = _process_args(accelerator, particles)
+        particles = _numpy.array(particles, dtype=float)
+        elements = _numpy.arange(len(accelerator))
+        elements = elements[recording.selected(elements)]
+        positions, lost_flag, lost_element, lost_plane = line_pass(
+            accelerator, particles, indices=elements.tolist(),
+            element_offset=element_offset, workers=workers)
+        particles_out = Recording(recording, particles)
+        particles_out._add(elements, positions)
+        particles_out._finish(_numpy.array([p is not None for p in lost_plane]))
+        return particles_out, lost_flag, lost_element, lost_plane
+
     # store only final position?
     args = _trackcpp.LinePassArgs()
     args.trajectory = False if indices is None else True
@@ -197,33 +304,46 @@ def line_pass(accelerator, particles, indices=None, element_offset=0):
     lost_flag = False
     lost_element, lost_plane = [], []
 
-    # loop over particles
-    for i in range(particles.shape[0]):
-
-        # python particle pos -> trackcpp particle pos
-        args.element_offset = element_offset
-        p_in = _Numpy2CppDoublePos(particles[i,:])
-        p_out = _trackcpp.CppDoublePosVector()
+    # distributes particles among worker processes
+    if _nr_workers(workers) > 1:
+        slices = _shard_slices(particles.shape[0], _nr_workers(workers))
+        results = _parallel_map(_line_pass_shard,
+            [(particles[sl], indices, element_offset) for sl in slices],
+            workers, accelerator)
+        for sl, (p_out, flag, l_element, l_plane) in zip(slices, results):
+            particles_out[sl] = p_out
+            lost_flag = lost_flag or flag
+            lost_element.extend(l_element)
+            lost_plane.extend(l_plane)
 
-        # tracking
-        if _trackcpp.track_linepass_wrapper(accelerator._accelerator,
-                                            p_in, p_out, args):
-            lost_flag = True
-
-        # trackcpp particle pos -> python particle pos
-        if indices is None:
-            particles_out[i,:] = _CppDoublePos2Numpy(p_out[0])
-        else:
-            for j in range(len(indices)):
-                particles_out[i,:,j] = _CppDoublePos2Numpy(p_out[indices[j]])
+    else:
+        # loop over particles
+        for i in range(particles.shape[0]):
+
+            # python particle pos -> trackcpp particle pos
+            args.element_offset = element_offset
+            p_in = _Numpy2CppDoublePos(particles[i,:])
+            p_out = _trackcpp.CppDoublePosVector()
+
+            # tracking
+            if _trackcpp.track_linepass_wrapper(accelerator._accelerator,
+                                                p_in, p_out, args):
+                lost_flag = True
+
+            # trackcpp particle pos -> python particle pos
+            if indices is None:
+                particles_out[i,:] = _CppDoublePos2Numpy(p_out[0])
+            else:
+                traj = _CppDoublePosVector2Array(p_out)
+                particles_out[i,:,:] = traj[indices].T
 
-        # fills vectors with info about particle loss
-        if args.lost_plane:
-            lost_element.append(args.element_offset)
-            lost_plane.append(lost_planes[args.lost_plane])
-        else:
-            lost_element.append(None)
-            lost_plane.append(None)
+            # fills vectors with info about particle loss
+            if args.lost_plane:
+                lost_element.append(args.element_offset)
+                lost_plane.append(lost_planes[args.lost_plane])
+            else:
+                lost_element.append(None)
+                lost_plane.append(None)
 
     # simplifies output structure in case of single particle and python list
     if len(lost_element) == 1 and not return_ndarray:
@@ -239,7 +359,8 @@ def line_pass(accelerator, particles, indices=None, element_offset=0):
 
 @_interactive
 def ring_pass(accelerator, particles, nr_turns = 1,
-             turn_by_turn = None, element_offset=0):
+             turn_by_turn = None, element_offset=0, workers=None,
+             recording=None):
     """Track particle(s) along a ring.
 
     Accepts one or multiple particles initial positions. In the latter case,
@@ -249,7 +370,7 @@ def ring_pass(accelerator, particles, nr_turns = 1,
     have been lost along the tracking and where they were lost.
 
     Keyword arguments: (accelerator, particles, nr_turns,
-                        turn_by_turn, elment_offset)
+                        turn_by_turn, elment_offset, workers, recording)
 
     accelerator    -- Accelerator object
     particles      -- initial 6D particle(s) position(s).
@@ -268,6 +389,13 @@ def ring_pass(accelerator, particles, nr_turns = 1,
 
     element_offset -- element offset (default 0) for tracking. tracking will
                       start at the element with index 'element_offset'
+    workers        -- number of processes among which particles are
+                      distributed (default None, tracking in the current
+                      process).
+    recording      -- RecordingPolicy selecting what is recorded turn by turn
+                      (default None). If given, 'turn_by_turn' must be None,
+                      turns are tracked in chunks (see 'ring_pass_chunks')
+                      and 'particles_out' is a Recording.
 
     Returns: (particles_out, lost_flag, lost_turn, lost_element, lost_plane)
 
@@ -339,27 +467,156 @@ def ring_pass(accelerator, particles, nr_turns = 1,
     particles, return_ndarray, _ = _process_args(accelerator, particles,
                                                  indices=None)
 
-    # initialize particles_out tensor according to input options
+    if recording is not None:
+        if turn_by_turn:
+            raise TrackingException(
+                "'turn_by_turn' and 'recording' are mutually exclusive")
+        particles = _numpy.array(particles, dtype=float)
+        particles_out = Recording(recording, particles)
+        nr_particles = particles.shape[0]
+        _lost_turn = _numpy.full(nr_particles, -1, dtype=int)
+        _lost_element = _numpy.full(nr_particles, -1, dtype=int)
+        _lost_plane = _numpy.zeros(nr_particles, dtype=int)
+        for first_turn, positions, _lost_turn, _lost_element, _lost_plane in \
+                ring_pass_chunks(accelerator, particles, nr_turns,
+                                 element_offset=element_offset,
+                                 workers=workers):
+            turns = first_turn + _numpy.arange(positions.shape[2])
+            particles_out._add(turns, positions)
+        particles_out._finish(_lost_plane > 0)
+        lost_flag = bool(_numpy.any(_lost_plane > 0))
+        return_ndarray = True
+    else:
+        # tracks the whole bunch at once
+        particles_out, lost_flag, _lost_turn, _lost_element, _lost_plane = \
+            ring_pass_bunch(accelerator, particles, nr_turns=nr_turns,
+                            turn_by_turn=turn_by_turn,
+                            element_offset=element_offset, workers=workers)
+
+    # fills lists with info about particle loss
+    lost_turn, lost_element, lost_plane = [], [], []
+    for i in range(particles.shape[0]):
+        if _lost_plane[i]:
+            lost_turn.append(int(_lost_turn[i]))
+            lost_element.append(int(_lost_element[i]))
+            lost_plane.append(lost_planes[_lost_plane[i]])
+        else:
+            lost_turn.append(None)
+            lost_element.append(None)
+            lost_plane.append(None)
+
+    # simplifies output structure in case of single particle and python list
+    if len(lost_element) == 1 and not return_ndarray:
+        if len(particles_out.shape) == 3:
+            particles_out = particles_out[0,:,:]
+        else:
+            particles_out = particles_out[0,:]
+        lost_turn = lost_turn[0]
+        lost_element = lost_element[0]
+        lost_plane = lost_plane[0]
+
+    return particles_out, lost_flag, lost_turn, lost_element, lost_plane
+
+
+@_interactive
+def ring_pass_bunch(accelerator, particles, nr_turns=1, turn_by_turn=None,
+                    element_offset=0, particles_out=None, workers=None):
+    """Track a bunch of particles along a ring.
+
+    Bunch-level version of 'ring_pass': particles are given as a (N,6)
+    numpy array and tracked positions are written directly into a numpy
+    buffer, which may be preallocated by the caller and reused between calls.
+    Loss information is returned as numpy integer arrays instead of lists.
+
+    Keyword arguments: (accelerator, particles, nr_turns, turn_by_turn,
+                        element_offset, particles_out, workers)
+
+    accelerator    -- Accelerator object
+    particles      -- initial 6D positions of the particles, a (N,6) array.
+                      It is converted to a C-contiguous float64 array if it is
+                      not one already.
+    nr_turns       -- number of turns around ring to track each particle.
+    turn_by_turn   -- None, 'closed' or 'open', with the same meaning as in
+                      'ring_pass'.
+    element_offset -- element offset (default 0) for tracking. tracking will
+                      start at the element with index 'element_offset'
+    particles_out  -- optional preallocated float64 output buffer with shape
+                      (N,6) if 'turn_by_turn' is None or (N,6,nr_turns)
+                      otherwise. Positions not returned by the tracking, as
+                      those of turns after a particle is lost, are set to nan.
+    workers        -- number of processes among which particles are
+                      distributed (default None, tracking in the current
+                      process). Each worker receives the accelerator once and
+                      results are merged back in the original particle order.
+                      A WorkerPool may be given to reuse its processes.
+
+    Returns: (particles_out, lost_flag, lost_turn, lost_element, lost_plane)
+
+    particles_out -- the output buffer with the tracked positions.
+    lost_flag     -- a general flag indicating whether there has been particle
+                     loss.
+    lost_turn     -- int array with the turn where each particle was lost, or
+                     -1 if the particle survived.
+    lost_element  -- int array with the element index where each particle was
+                     lost, or -1 if the particle survived.
+    lost_plane    -- int array with the plane where each particle was lost, as
+                     an index of 'lost_planes' (0 if the particle survived).
+
+    Raises TrackingException
+    """
+
+    particles = _numpy.ascontiguousarray(particles, dtype=float)
+    if particles.ndim != 2 or particles.shape[1] != 6:
+        raise TrackingException("'particles' must be a (N,6) array")
+    nr_particles = particles.shape[0]
+
+    # checks or allocates output buffer
     if turn_by_turn:
-        particles_out = _numpy.zeros((particles.shape[0],6,nr_turns))
+        shape = (nr_particles, 6, nr_turns)
     else:
-        particles_out = _numpy.zeros((particles.shape[0],6))
+        shape = (nr_particles, 6)
+    if particles_out is None:
+        particles_out = _numpy.empty(shape)
+    elif (not isinstance(particles_out, _numpy.ndarray) or
+            particles_out.shape != shape or
+            particles_out.dtype != _numpy.float64):
+        raise TrackingException(
+            "'particles_out' must be a float64 array with shape " + str(shape))
     particles_out.fill(float('nan'))
+
+    lost_turn = _numpy.full(nr_particles, -1, dtype=int)
+    lost_element = _numpy.full(nr_particles, -1, dtype=int)
+    lost_plane = _numpy.zeros(nr_particles, dtype=int)
     lost_flag = False
-    lost_turn, lost_element, lost_plane = [], [], []
 
-    # static parameters of ringpass
+    # distributes particles among worker processes
+    if _nr_workers(workers) > 1:
+        slices = _shard_slices(nr_particles, _nr_workers(workers))
+        results = _parallel_map(_ring_pass_shard,
+            [(particles[sl], nr_turns, turn_by_turn, element_offset)
+             for sl in slices], workers, accelerator)
+        for sl, (p_out, flag, l_turn, l_element, l_plane) in zip(slices, results):
+            particles_out[sl] = p_out
+            lost_turn[sl], lost_element[sl], lost_plane[sl] = \
+                l_turn, l_element, l_plane
+            lost_flag = lost_flag or flag
+        return particles_out, lost_flag, lost_turn, lost_element, lost_plane
+
+    # static parameters of ringpass, reused for all particles
     args = _trackcpp.RingPassArgs()
     args.nr_turns = nr_turns
     args.trajectory = True if turn_by_turn else False
+    p_in = _trackcpp.CppDoublePos()
+    p_out = _trackcpp.CppDoublePosVector()
 
     # loop over particles
-    for i in range(particles.shape[0]):
+    for i in range(nr_particles):
 
         # python particle pos -> trackcpp particle pos
         args.element_offset = element_offset
-        p_in = _Numpy2CppDoublePos(particles[i,:])
-        p_out = _trackcpp.CppDoublePosVector()
+        p_in.rx, p_in.px, p_in.ry, p_in.py, p_in.de, p_in.dl = \
+            particles[i].tolist()
+        p_out.clear()
 
         # tracking
         if _trackcpp.track_ringpass_wrapper(accelerator._accelerator,
@@ -369,39 +626,136 @@ def ring_pass(accelerator, particles, nr_turns = 1,
         # trackcpp particle pos -> python particle pos
         if turn_by_turn:
             if turn_by_turn == 'closed':
-                for n in range(nr_turns):
-                    particles_out[i,:,n] = _CppDoublePos2Numpy(p_out[n])
+                _CppDoublePosVector2Buffer(p_out, particles_out[i], 0)
             elif turn_by_turn == 'open':
                 particles_out[i,:,0] = particles[i,:]
-                for n in range(1,nr_turns):
-                    particles_out[i,:,n] = _CppDoublePos2Numpy(p_out[n-1])
-
+                _CppDoublePosVector2Buffer(p_out, particles_out[i], 1)
         else:
             particles_out[i,:] = _CppDoublePos2Numpy(p_out[0])
 
-        # fills vectors with info about particle loss
+        # fills arrays with info about particle loss
         if args.lost_plane:
-            lost_turn.append(args.lost_turn)
-            lost_element.append(args.lost_element)
-            lost_plane.append(lost_planes[args.lost_plane])
-        else:
-            lost_turn.append(None)
-            lost_element.append(None)
-            lost_plane.append(None)
-
-    # simplifies output structure in case of single particle and python list
-    if len(lost_element) == 1 and not return_ndarray:
-        if len(particles_out.shape) == 3:
-            particles_out = particles_out[0,:,:]
-        else:
-            particles_out = particles_out[0,:]
-        lost_turn = lost_turn[0]
-        lost_element = lost_element[0]
-        lost_plane = lost_plane[0]
+            lost_turn[i] = args.lost_turn
+            lost_element[i] = args.lost_element
+            lost_plane[i] = args.lost_plane
 
     return particles_out, lost_flag, lost_turn, lost_element, lost_plane
 
 
+@_interactive
+def ring_pass_chunks(accelerator, particles, nr_turns, chunk_size=1000,
+                     element_offset=0, workers=None):
+    """Track a bunch of particles along a ring, yielding turn-by-turn
+    positions in chunks of turns.
+
+    Tracking proceeds one chunk at a time with 'ring_pass_bunch', so that
+    only one chunk of positions is held in memory. Particles lost in a chunk
+    are not tracked in the following ones.
+
+    Keyword arguments:
+    accelerator    -- Accelerator object
+    particles      -- initial 6D positions of the particles, a (N,6) array
+    nr_turns       -- number of turns around ring to track each particle
+    chunk_size     -- maximum number of turns of each chunk (default: 1000)
+    element_offset -- index of the element where tracking starts
+    workers        -- number of processes among which particles are
+                      distributed, started once for all chunks, or a
+                      WorkerPool (default: None)
+
+    Yields: (first_turn, positions, lost_turn, lost_element, lost_plane)
+
+    first_turn -- index of the first turn of the chunk
+    positions  -- (N,6,k) array with the positions at the end of turns
+                  first_turn, ..., first_turn+k-1 (the 'closed' convention of
+                  'ring_pass'), nan after a particle is lost. The array is
+                  reused for the next chunk.
+    lost_turn, lost_element, lost_plane -- loss arrays as in
+                  'ring_pass_bunch' for all turns tracked so far, updated in
+                  place as tracking proceeds.
+    """
+    particles = _numpy.array(particles, dtype=float, ndmin=2)
+    if particles.ndim != 2 or particles.shape[1] != 6:
+        raise TrackingException("'particles' must be a (N,6) array")
+    if chunk_size < 1:
+        raise TrackingException("'chunk_size' must be positive")
+    nr_particles = particles.shape[0]
+    lost_turn = _numpy.full(nr_particles, -1, dtype=int)
+    lost_element = _numpy.full(nr_particles, -1, dtype=int)
+    lost_plane = _numpy.zeros(nr_particles, dtype=int)
+
+    alive = _numpy.arange(nr_particles)
+    buffer = _numpy.empty((nr_particles, 6, min(chunk_size, nr_turns)))
+    # workers are started once and reused for all chunks
+    workers, pool = _open_pool(accelerator, workers)
+    try:
+        for first_turn in range(0, nr_turns, chunk_size):
+            positions = buffer[:, :, :min(chunk_size, nr_turns - first_turn)]
+            positions.fill(float('nan'))
+            if len(alive) > 0:
+                out, _, l_turn, l_element, l_plane = ring_pass_bunch(
+                    accelerator, particles[alive],
+                    nr_turns=positions.shape[2], turn_by_turn='closed',
+                    element_offset=element_offset, workers=workers)
+                positions[alive] = out
+                lost = l_plane > 0
+                lost_turn[alive[lost]] = first_turn + l_turn[lost]
+                lost_element[alive[lost]] = l_element[lost]
+                lost_plane[alive[lost]] = l_plane[lost]
+                particles[alive] = out[:, :, -1]
+                alive = alive[~lost]
+            yield first_turn, positions, lost_turn, lost_element, lost_plane
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+@_interactive
+def ring_pass_to_file(accelerator, particles, nr_turns, filename,
+                      chunk_size=1000, element_offset=0, workers=None):
+    """Track a bunch of particles along a ring, streaming turn-by-turn
+    positions to a .npy file.
+
+    The file holds a (N,6,nr_turns) float64 array, as the 'particles_out' of
+    'ring_pass_bunch' with turn_by_turn 'closed', and is written chunk by
+    chunk through a memory map, see 'ring_pass_chunks'.
+
+    Keyword arguments:
+    accelerator    -- Accelerator object
+    particles      -- initial 6D positions of the particles, a (N,6) array
+    nr_turns       -- number of turns around ring to track each particle
+    filename       -- name of the .npy file, overwritten if it exists
+    chunk_size     -- number of turns tracked between writes (default: 1000)
+    element_offset -- index of the element where tracking starts
+    workers        -- number of processes among which particles are
+                      distributed (default: None)
+
+    Returns: (positions, lost_flag, lost_turn, lost_element, lost_plane)
+
+    positions -- read-write memory map of the file
+    lost_flag, lost_turn, lost_element, lost_plane -- as in 'ring_pass_bunch'
+    """
+    particles = _numpy.array(particles, dtype=float, ndmin=2)
+    shape = (particles.shape[0], 6, nr_turns)
+    positions = _numpy.lib.format.open_memmap(filename, mode='w+',
+                                              dtype=float, shape=shape)
+    for first_turn, chunk, lost_turn, lost_element, lost_plane in \
+            ring_pass_chunks(accelerator, particles, nr_turns, chunk_size,
+                             element_offset, workers):
+        positions[:, :, first_turn:first_turn+chunk.shape[2]] = chunk
+    positions.flush()
+    lost_flag = bool(_numpy.any(lost_plane > 0))
+    return positions, lost_flag, lost_turn, lost_element, lost_plane
+
+
+@_interactive
+def load_turn_chunks(filename, chunk_size=1000):
+    """Yield (first_turn, positions) chunks of turns of a .npy file written by
+    'ring_pass_to_file', reading only one chunk at a time from disk."""
+    data = _numpy.load(filename, mmap_mode='r')
+    for first_turn in range(0, data.shape[2], chunk_size):
+        yield first_turn, _numpy.array(data[:, :, first_turn:first_turn+chunk_size])
+
+
 @_interactive
 def set_4d_tracking(accelerator):
     accelerator.cavity_on = False
@@ -415,6 +769,7 @@ def set_6d_tracking(accelerator):
 
 
 @_interactive
+@_utils.cached
 def find_orbit4(accelerator, energy_offset = 0, indices=None, fixed_point_guess=None):
     """Calculate 4D closed orbit of accelerator and return it.
 
@@ -445,33 +800,24 @@ def find_orbit4(accelerator, energy_offset = 0, indices=None, fixed_point_guess=
     Raises TrackingException
     """
 
-    if fixed_point_guess is None:
-        fixed_point_guess = _trackcpp.CppDoublePos()
-    else:
+    if fixed_point_guess is not None:
         fixed_point_guess = _4Numpy2CppDoublePos(fixed_point_guess)
-    fixed_point_guess.de = energy_offset
-
-
-    _closed_orbit = _trackcpp.CppDoublePosVector()
-    r = _trackcpp.track_findorbit4(accelerator._accelerator, _closed_orbit, fixed_point_guess)
-    if r > 0:
-        raise TrackingException(_trackcpp.string_error_messages[r])
+    _closed_orbit = _find_orbit(accelerator, 'orbit4', fixed_point_guess,
+                                energy_offset)
 
     if indices is None:
         closed_orbit = _CppDoublePos24Numpy(_closed_orbit[0])
     elif indices == 'open':
-        closed_orbit = _numpy.zeros((len(accelerator),4))
-        for i in range(len(accelerator)):
-            closed_orbit[i] = _CppDoublePos24Numpy(_closed_orbit[i])
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
+        closed_orbit = orbit[:len(accelerator),:4]
     elif indices =='closed':
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
         closed_orbit = _numpy.zeros((len(accelerator)+1,4))
-        for i in range(len(accelerator)):
-            closed_orbit[i] = _CppDoublePos24Numpy(_closed_orbit[i])
+        closed_orbit[:-1] = orbit[:len(accelerator),:4]
         closed_orbit[-1] = closed_orbit[0]
     elif isinstance(indices,(list,tuple,_numpy.ndarray)):
-        closed_orbit = _numpy.zeros((len(indices),4))
-        for i,ind in enumerate(indices):
-            closed_orbit[i] = _CppDoublePos24Numpy(_closed_orbit[ind])
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
+        closed_orbit = orbit[list(indices),:4]
     else:
         raise TrackingException("invalid value for 'indices' in findorbit4")
 
@@ -479,6 +825,7 @@ def find_orbit4(accelerator, energy_offset = 0, indices=None, fixed_point_guess=
 
 
 @_interactive
+@_utils.cached
 def find_orbit6(accelerator, indices=None, fixed_point_guess=None):
     """Calculate 6D closed orbit of accelerator and return it.
 
@@ -507,59 +854,98 @@ def find_orbit6(accelerator, indices=None, fixed_point_guess=None):
 
     Raises TrackingException
     """
-    if fixed_point_guess is None:
-        fixed_point_guess = _trackcpp.CppDoublePos()
-    else:
+    if fixed_point_guess is not None:
         fixed_point_guess = _Numpy2CppDoublePos(fixed_point_guess)
-
-
-    _closed_orbit = _trackcpp.CppDoublePosVector()
-    r = _trackcpp.track_findorbit6(accelerator._accelerator, _closed_orbit, fixed_point_guess)
-    if r > 0:
-        raise TrackingException(_trackcpp.string_error_messages[r])
+    _closed_orbit = _find_orbit(accelerator, 'orbit6', fixed_point_guess)
 
     if indices is None:
         closed_orbit = _CppDoublePos2Numpy(_closed_orbit[0])[None,:]
     elif indices == 'open':
-        closed_orbit = _numpy.zeros((len(accelerator),6))
-        for i in range(len(accelerator)):
-            closed_orbit[i] = _CppDoublePos2Numpy(_closed_orbit[i])
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
+        closed_orbit = orbit[:len(accelerator)]
     elif indices =='closed':
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
         closed_orbit = _numpy.zeros((len(accelerator)+1,6))
-        for i in range(len(accelerator)):
-            closed_orbit[i] = _CppDoublePos2Numpy(_closed_orbit[i])
+        closed_orbit[:-1] = orbit[:len(accelerator)]
         closed_orbit[-1] = closed_orbit[0]
     elif isinstance(indices,(list,tuple,_numpy.ndarray)):
-        closed_orbit = _numpy.zeros((len(indices),6))
-        for i,ind in enumerate(indices):
-            closed_orbit[i] = _CppDoublePos2Numpy(_closed_orbit[ind])
+        orbit = _CppDoublePosVector2Array(_closed_orbit)
+        closed_orbit = orbit[list(indices)]
     else:
         raise TrackingException("invalid value for 'indices' in findorbit6")
 
     return closed_orbit.T
 
 
+def _find_orbit(accelerator, kind, fixed_point_guess=None, energy_offset=None):
+    """Return CppDoublePosVector with the closed orbit found by trackcpp.
+
+    'kind' is 'orbit4' or 'orbit6'. Without a fixed point guess the search
+    starts from the last fixed point of the accelerator (see
+    Accelerator.warm_start) and, if it fails, again from the zero orbit."""
+    if kind == 'orbit4':
+        function = _trackcpp.track_findorbit4
+    else:
+        function = _trackcpp.track_findorbit6
+    statistics = accelerator._warm_start_statistics
+    if kind == 'orbit4' and energy_offset is None:
+        energy_offset = 0.0 # not a variable of the 4D search
+
+    warm = False
+    if fixed_point_guess is None:
+        fixed_point = accelerator._get_fixed_point(kind)
+        warm = fixed_point is not None
+        if warm:
+            fixed_point_guess = _Numpy2CppDoublePos(fixed_point)
+        else:
+            fixed_point_guess = _trackcpp.CppDoublePos()
+    if energy_offset is not None:
+        fixed_point_guess.de = energy_offset
+    statistics['warm' if warm else 'cold'] += 1
+
+    _closed_orbit = _trackcpp.CppDoublePosVector()
+    r = function(accelerator._accelerator, _closed_orbit, fixed_point_guess)
+    if r > 0 and warm:
+        statistics['retries'] += 1
+        fixed_point_guess = _trackcpp.CppDoublePos()
+        if energy_offset is not None:
+            fixed_point_guess.de = energy_offset
+        _closed_orbit = _trackcpp.CppDoublePosVector()
+        r = function(accelerator._accelerator, _closed_orbit, fixed_point_guess)
+    if r > 0:
+        raise TrackingException(_trackcpp.string_error_messages[r])
+
+    accelerator._set_fixed_point(kind, _CppDoublePos2Numpy(_closed_orbit[0]))
+    return _closed_orbit
+
+
 @_interactive
+@_utils.cached
 def find_m66(accelerator, indices=None, closed_orbit=None):
     """Calculate 6D transfer matrices of elements in an accelerator.
 
     Keyword arguments:
     accelerator
-    indices
+    indices -- 'm66' to return only the one-turn matrix, a list of element
+               indices to return cumulative matrices only at these elements,
+               or None (or 'open' or 'closed') for all elements
     closed_orbit
 
     Return values:
     m66
-    cumul_trans_matrices -- values at the start of each lattice element
+    cumul_trans_matrices -- MatrixList with values at the start of the
+                            selected lattice elements. Matrices are kept in
+                            trackcpp storage and converted when indexed; use
+                            MatrixList.to_array for bulk export.
     """
-    if indices is None:
-        indices = list(range(len(accelerator)))
-
-    if closed_orbit is None:
-        # Closed orbit is calculated by trackcpp
-        _closed_orbit = _trackcpp.CppDoublePosVector()
-    else:
+    if closed_orbit is not None:
         _closed_orbit = _Numpy2CppDoublePosVector(closed_orbit)
+    elif accelerator._get_fixed_point('orbit6') is not None:
+        # warm start from the last 6D closed orbit (see warm_start)
+        _closed_orbit = _find_orbit(accelerator, 'orbit6')
+    else:
+        # the closed orbit is calculated by trackcpp
+        _closed_orbit = _trackcpp.CppDoublePosVector()
 
     _cumul_trans_matrices = _trackcpp.CppMatrixVector()
     _m66 = _trackcpp.Matrix()
@@ -578,36 +964,32 @@ def find_m66(accelerator, indices=None, closed_orbit=None):
     if indices == 'm66':
         return m66
 
-    cumul_trans_matrices = MatrixList(_cumul_trans_matrices)
+    cumul_trans_matrices = MatrixList(_cumul_trans_matrices,
+                                      indices=_matrix_indices(indices))
 
     return m66, cumul_trans_matrices
 
 
 @_interactive
+@_utils.cached
 def find_m44(accelerator, indices=None, energy_offset = 0.0, closed_orbit=None):
     """Calculate 4D transfer matrices of elements in an accelerator.
 
     Keyword arguments:
     accelerator
-    indices
+    indices -- 'm44', a list of element indices or None, as in find_m66
     energy_offset
     closed_orbit
 
     Return values:
     m44
-    cumul_trans_matrices -- values at the start of each lattice element
+    cumul_trans_matrices -- MatrixList with 4x4 values at the start of the
+                            selected lattice elements, see find_m66
     """
-    if indices is None:
-        indices = list(range(len(accelerator)))
-
     if closed_orbit is None:
         # calcs closed orbit if it was not passed.
-        fixed_point_guess = _trackcpp.CppDoublePos()
-        fixed_point_guess.de = energy_offset
-        _closed_orbit = _trackcpp.CppDoublePosVector()
-        r = _trackcpp.track_findorbit4(accelerator._accelerator, _closed_orbit, fixed_point_guess)
-        if r > 0:
-            raise TrackingException(_trackcpp.string_error_messages[r])
+        _closed_orbit = _find_orbit(accelerator, 'orbit4',
+                                    energy_offset=energy_offset)
     else:
         _closed_orbit = _4Numpy2CppDoublePosVector(closed_orbit,de=energy_offset)
 
@@ -628,27 +1010,442 @@ def find_m44(accelerator, indices=None, energy_offset = 0.0, closed_orbit=None):
     if indices == 'm44':
         return m44
 
-    cumul_trans_matrices = []
-    for i in range(len(_cumul_trans_matrices)):
-        cumul_trans_matrices.append(_CppMatrix24Numpy(_cumul_trans_matrices[i]))
+    cumul_trans_matrices = MatrixList(_cumul_trans_matrices,
+                                      indices=_matrix_indices(indices), size=4)
 
     return m44, cumul_trans_matrices
 
 
+def _matrix_indices(indices):
+    if indices is None or (isinstance(indices, str) and
+                           indices in ('open', 'closed')):
+        return None
+    if isinstance(indices, (list, tuple, _numpy.ndarray)):
+        return [int(i) for i in indices]
+    raise TrackingException("invalid value for 'indices'")
+
+
+@_interactive
+def dynamic_aperture(accelerator, nr_turns, x_max=0.02, y_max=0.01,
+                     method='radial', nr_lines=21, resolution=1e-5,
+                     nr_points=(11, 6), nr_refinements=3, energy_offset=0.0,
+                     element_offset=0, workers=None):
+    """Calculate the dynamic aperture of a ring in the x-y plane.
+
+    Particles start at the closed orbit plus transverse offsets (x, y) with
+    y >= 0 and are tracked with 'ring_pass_bunch'. Instead of tracking a full
+    grid, only points near the aperture boundary are tracked:
+
+    'radial' -- the boundary is searched by bisection along nr_lines radial
+                lines from the origin to the ellipse of half-axes x_max and
+                y_max, until the bracketing interval is smaller than
+                'resolution'. Islands of stability beyond the first loss
+                along a line are not detected.
+    'grid'   -- a coarse grid of nr_points[0] x nr_points[1] points covering
+                [-x_max, x_max] x [0, y_max] is tracked and cells with both
+                lost and surviving corners are subdivided 'nr_refinements'
+                times.
+
+    Each step tracks all its points in a single 'ring_pass_bunch' call, which
+    may be distributed among 'workers' processes. Lost particles stop being
+    tracked at the turn they are lost.
+
+    Keyword arguments:
+    accelerator -- Accelerator object
+    nr_turns    -- number of turns a particle must survive
+    x_max, y_max -- maximum horizontal and vertical offsets [m]
+    method      -- 'radial' or 'grid' (default: 'radial')
+    nr_lines    -- number of radial lines, from 0 to pi ('radial' method)
+    resolution  -- length of the final bisection interval [m] ('radial')
+    nr_points   -- size of the initial grid ('grid' method)
+    nr_refinements -- number of grid subdivisions ('grid' method)
+    energy_offset  -- relative energy deviation of the particles
+    element_offset -- index of the element where tracking starts
+    workers     -- number of worker processes, started once for all steps,
+                   or a WorkerPool (default: None)
+
+    Returns: (aperture, loss_map)
+
+    aperture -- (2,N) array with x and y of the aperture boundary. For the
+                'radial' method these are the largest surviving offsets along
+                each line; for the 'grid' method, the smallest lost vertical
+                offset for each tracked horizontal offset (y_max if no
+                particle was lost).
+    loss_map -- dict with arrays 'x', 'y', 'lost_turn', 'lost_element' and
+                'lost_plane' for all tracked points, with the same meaning as
+                in 'ring_pass_bunch'.
+
+    Raises TrackingException
+    """
+    if method not in ('radial', 'grid'):
+        raise TrackingException("invalid value for 'method' in dynamic_aperture")
+    closed_orbit = _closed_orbit6(accelerator, energy_offset,
+                                  [element_offset])[:,0]
+    # workers are started once and reused for all bisection or grid steps
+    workers, pool = _open_pool(accelerator, workers)
+    try:
+        loss_map = _LossMap(accelerator, closed_orbit, nr_turns,
+                            element_offset, workers)
+        if method == 'radial':
+            aperture = _radial_aperture(loss_map, x_max, y_max, nr_lines,
+                                        resolution)
+        else:
+            aperture = _grid_aperture(loss_map, x_max, y_max, nr_points,
+                                      nr_refinements)
+    finally:
+        if pool is not None:
+            pool.close()
+    return aperture, loss_map.to_dict()
+
+
+def _closed_orbit6(accelerator, energy_offset, indices):
+    # 6D closed orbit, with the energy offset, at the selected elements
+    if accelerator.cavity_on:
+        orbit = find_orbit6(accelerator, indices=indices)
+        orbit[4] += energy_offset
+    else:
+        orbit = _numpy.zeros((_NUM_COORDS, len(indices)))
+        orbit[:4] = find_orbit4(accelerator, energy_offset=energy_offset,
+                                indices=indices)
+        orbit[4] = energy_offset
+    return orbit
+
+
+@_interactive
+@_utils.cached(disk=True)
+def momentum_aperture(accelerator, nr_turns, indices='open', delta_max=0.05,
+                      resolution=1e-4, workers=None):
+    """Calculate the local momentum aperture along a ring.
+
+    At each selected element, particles start at the closed orbit with an
+    energy deviation and are tracked for nr_turns with 'ring_pass_bunch'
+    starting at that element. The largest surviving positive and negative
+    deviations are found by bisection until the bracketing interval is
+    smaller than 'resolution'. Locations are distributed among worker
+    processes. Results are kept in the result cache of the accelerator and,
+    if set, in the disk cache (see diskcache.set_disk_cache).
+
+    Keyword arguments:
+    accelerator -- Accelerator object. The aperture includes synchrotron
+                   motion only if the cavity is on.
+    nr_turns    -- number of turns a particle must survive
+    indices     -- 'open' for all elements or a list of element indices
+                   (default: 'open')
+    delta_max   -- maximum energy deviation searched (default: 0.05)
+    resolution  -- length of the final bisection interval (default: 1e-4)
+    workers     -- number of worker processes (default: None)
+
+    Returns: (accep_neg, accep_pos)
+
+    accep_neg -- numpy array with the negative momentum aperture at each
+                 location (values <= 0)
+    accep_pos -- numpy array with the positive momentum aperture at each
+                 location (values >= 0)
+
+    Deviations up to delta_max which survive are reported as delta_max, and
+    islands of stability beyond the first loss are not detected. The output
+    can be passed as 'energy_acceptance' to lifetime.calc_lifetimes.
+
+    Raises TrackingException
+    """
+    if isinstance(indices, str) and indices == 'open':
+        indices = list(range(len(accelerator)))
+    indices = [int(i) for i in indices]
+    orbit = _closed_orbit6(accelerator, 0.0, indices)
+    args_list = [(index, orbit[:,k], nr_turns, delta_max, resolution)
+                 for k, index in enumerate(indices)]
+    results = _parallel_map(_momentum_aperture_location, args_list, workers,
+                            accelerator)
+    accep_pos, accep_neg = _numpy.array(results).reshape((-1, 2)).T
+    return -accep_neg, accep_pos
+
+
+def _momentum_aperture_location(accelerator, element_offset, orbit, nr_turns,
+                                delta_max, resolution):
+    # bisection of positive and negative energy deviations at one element
+    signs = _numpy.array([1.0, -1.0])
+    particles = _numpy.tile(orbit, (2, 1))
+
+    def track(sides, deltas):
+        p = particles[sides].copy()
+        p[:,4] += signs[sides]*deltas
+        *_, lost_plane = ring_pass_bunch(accelerator, p, nr_turns=nr_turns,
+                                         element_offset=element_offset)
+        return lost_plane != 0
+
+    low = _numpy.zeros(2)
+    high = _numpy.full(2, float(delta_max))
+    sides = _numpy.arange(2)
+    lost = track(sides, high)
+    low[~lost] = delta_max
+    active = lost & (high - low > resolution)
+    while _numpy.any(active):
+        sides = _numpy.flatnonzero(active)
+        middle = (low[sides] + high[sides])/2
+        lost = track(sides, middle)
+        high[sides[lost]] = middle[lost]
+        low[sides[~lost]] = middle[~lost]
+        active[sides] = high[sides] - low[sides] > resolution
+    return low
+
+
+class _LossMap(object):
+    # tracks transverse offsets from the closed orbit and keeps the results
+
+    def __init__(self, accelerator, closed_orbit, nr_turns, element_offset,
+                 workers):
+        self.accelerator = accelerator
+        self.closed_orbit = closed_orbit
+        self.nr_turns = nr_turns
+        self.element_offset = element_offset
+        self.workers = workers
+        self.results = []
+
+    def track(self, x, y):
+        """Return boolean array which is True for lost particles"""
+        x, y = _numpy.asarray(x, dtype=float), _numpy.asarray(y, dtype=float)
+        particles = _numpy.tile(self.closed_orbit, (len(x), 1))
+        particles[:,0] += x
+        particles[:,2] += y
+        _, _, lost_turn, lost_element, lost_plane = ring_pass_bunch(
+            self.accelerator, particles, nr_turns=self.nr_turns,
+            element_offset=self.element_offset, workers=self.workers)
+        self.results.append((x, y, lost_turn, lost_element, lost_plane))
+        return lost_plane != 0
+
+    def to_dict(self):
+        names = ('x', 'y', 'lost_turn', 'lost_element', 'lost_plane')
+        if not self.results:
+            return dict((name, _numpy.zeros(0)) for name in names)
+        columns = zip(*self.results)
+        return dict((name, _numpy.concatenate(column))
+                    for name, column in zip(names, columns))
+
+
+def _radial_aperture(loss_map, x_max, y_max, nr_lines, resolution):
+    angles = _numpy.linspace(0, _math.pi, nr_lines)
+    x_end, y_end = x_max*_numpy.cos(angles), y_max*_numpy.sin(angles)
+    line_length = _numpy.sqrt(x_end**2 + y_end**2)
+
+    # amplitudes are fractions of the line length; lines whose end survives
+    # are not searched
+    low = _numpy.zeros(nr_lines)
+    high = _numpy.ones(nr_lines)
+    lost = loss_map.track(x_end, y_end)
+    low[~lost] = 1.0
+    active = lost & (line_length > resolution)
+    while _numpy.any(active):
+        idx = _numpy.flatnonzero(active)
+        middle = (low[idx] + high[idx])/2
+        lost = loss_map.track(middle*x_end[idx], middle*y_end[idx])
+        high[idx[lost]] = middle[lost]
+        low[idx[~lost]] = middle[~lost]
+        active[idx] = (high[idx] - low[idx])*line_length[idx] > resolution
+    return _numpy.array([low*x_end, low*y_end])
+
+
+def _grid_aperture(loss_map, x_max, y_max, nr_points, nr_refinements):
+    # points are kept on an integer grid with the final resolution
+    nx, ny = nr_points
+    step = 2**nr_refinements
+    dx = 2*x_max/((nx-1)*step)
+    dy = y_max/((ny-1)*step)
+    status = {}
+
+    def track(points):
+        points = [p for p in set(points) if p not in status]
+        if not points:
+            return
+        ix, iy = _numpy.array(points).T
+        lost = loss_map.track(-x_max + ix*dx, iy*dy)
+        status.update(zip(points, lost.tolist()))
+
+    cells = [(i*step, j*step) for i in range(nx-1) for j in range(ny-1)]
+    track([(i*step, j*step) for i in range(nx) for j in range(ny)])
+    for level in range(nr_refinements):
+        # subdivides cells crossed by the boundary
+        new_cells, new_points = [], []
+        for i, j in cells:
+            corners = [status[(i, j)], status[(i+step, j)],
+                       status[(i, j+step)], status[(i+step, j+step)]]
+            if all(corners) or not any(corners):
+                continue
+            half = step//2
+            new_cells.extend([(i, j), (i+half, j), (i, j+half),
+                              (i+half, j+half)])
+            new_points.extend([(i+half, j), (i, j+half), (i+half, j+half),
+                               (i+step, j+half), (i+half, j+step)])
+        track(new_points)
+        cells, step = new_cells, step//2
+
+    boundary = {}
+    for (i, j), lost in status.items():
+        if lost:
+            current = boundary.get(i)
+            boundary[i] = j if current is None else min(j, current)
+        else:
+            boundary.setdefault(i, None)
+    top = (ny-1)*2**nr_refinements
+    columns = sorted(boundary)
+    x = [-x_max + i*dx for i in columns]
+    y = [(top if boundary[i] is None else boundary[i])*dy for i in columns]
+    return _numpy.array([x, y])
+
+
+@_interactive
+def fast_ring_pass(accelerator, particles, nr_turns=1, particles_out=None):
+    """Track a bunch of particles along a ring with the fast linear-map model.
+
+    Approximate, much faster alternative to 'ring_pass_bunch' for quick
+    dynamic aperture previews and optimisation loops: see LinearMapTracker.
+    The model is built on the first call and reused until the lattice or
+    the flags of the accelerator change.
+
+    Keyword arguments:
+    accelerator   -- Accelerator object
+    particles     -- initial 6D positions of the particles, a (N,6) array
+    nr_turns      -- number of turns around ring to track each particle
+    particles_out -- optional preallocated (N,6) float64 output buffer
+
+    Returns: (particles_out, lost_flag, lost_turn, lost_element, lost_plane),
+    as 'ring_pass_bunch' with turn_by_turn None.
+    """
+    tracker = accelerator._fast_tracker
+    if tracker is None or tracker.state != accelerator._cache_state():
+        tracker = LinearMapTracker(accelerator)
+        accelerator._fast_tracker = tracker
+    return tracker.ring_pass(particles, nr_turns=nr_turns,
+                             particles_out=particles_out)
+
+
+# Conversion between trackcpp containers and numpy arrays.
+#
+# trackcpp DoublePos structs are six contiguous doubles and std::vectors store
+# their items contiguously, so the data of CppDoublePos and CppDoublePosVector
+# objects can be mapped into numpy arrays with ctypes, as is done with the
+# t_in/r_in arrays of elements, instead of being read one SWIG attribute at a
+# time. Views are only valid while the trackcpp object is alive and is not
+# resized; the per-attribute conversion is kept as a fallback for containers
+# whose items are not laid out as expected.
+
+_NUM_COORDS = 6
+_c_double_pos = _ctypes.c_double*_NUM_COORDS
+_POS_NBYTES = _ctypes.sizeof(_c_double_pos)
+_PTR_NBYTES = _ctypes.sizeof(_ctypes.c_void_p)
+
+
+def _address(obj):
+    return int(obj.this)
+
+
+def _CppDoublePosVectorView(orbit):
+    """Return a (len(orbit),6) numpy view of a CppDoublePosVector data, or None
+    if its items are not stored contiguously."""
+    nr_pos = len(orbit)
+    if nr_pos == 0:
+        return _numpy.zeros((0,_NUM_COORDS))
+    try:
+        first = orbit[0] # kept alive while the view is checked
+        address = _address(first)
+        if nr_pos > 1 and \
+                _address(orbit[nr_pos-1]) - address != (nr_pos-1)*_POS_NBYTES:
+            return None
+    except (AttributeError, TypeError):
+        return None
+    c_array = (_ctypes.c_double*(_NUM_COORDS*nr_pos)).from_address(address)
+    view = _numpy.ctypeslib.as_array(c_array).reshape((nr_pos,_NUM_COORDS))
+    # items returned as copies by SWIG do not see writes through the view
+    original = view[0,0]
+    view[0,0] = 1.0 if original != 1.0 else 2.0
+    shared = orbit[0].rx == view[0,0]
+    view[0,0] = original
+    return view if shared else None
+
+
+def _CppDoublePosView(pos):
+    """Return a numpy view of the 6 coordinates of a CppDoublePos, or None if
+    it cannot be mapped."""
+    try:
+        c_array = _c_double_pos.from_address(_address(pos))
+    except (AttributeError, TypeError):
+        return None
+    view = _numpy.ctypeslib.as_array(c_array)
+    # sanity check of the memory layout, keeping the value of pos.rx
+    original = pos.rx
+    pos.rx = 1.0 if original != 1.0 else 2.0
+    mapped = view[0] == pos.rx
+    pos.rx = original
+    return view if mapped else None
+
+
+def _set_CppDoublePos(pos, view, values):
+    if view is not None:
+        view[:] = values
+    else:
+        pos.rx, pos.px, pos.ry, pos.py, pos.de, pos.dl = \
+            [float(v) for v in values]
+
+
+def _get_CppDoublePos(pos, view):
+    if view is not None:
+        return view
+    return (pos.rx, pos.px, pos.ry, pos.py, pos.de, pos.dl)
+
+
+def _CppDoublePosVector2Array(orbit):
+    """Return a (len(orbit),6) numpy array with a copy of the positions."""
+    view = _CppDoublePosVectorView(orbit)
+    if view is not None:
+        return view.copy()
+    array = _numpy.zeros((len(orbit),_NUM_COORDS))
+    for i in range(len(orbit)):
+        p = orbit[i]
+        array[i] = (p.rx, p.px, p.ry, p.py, p.de, p.dl)
+    return array
+
+
+def _CppMatrixView(_m):
+    # a trackcpp Matrix is a std::vector of row std::vectors, each made of
+    # (begin, end, capacity) pointers, and SWIG returns its rows as tuples:
+    # row data pointers are read from the buffer of the outer vector.
+    try:
+        nr_rows = len(_m)
+        nr_cols = len(_m[0])
+        begin, end = (_ctypes.c_void_p*2).from_address(_address(_m))
+    except (AttributeError, TypeError, IndexError):
+        return None
+    if not begin or not end or end - begin != 3*_PTR_NBYTES*nr_rows:
+        return None
+    rows = (_ctypes.c_void_p*(3*nr_rows)).from_address(begin)
+    row_type = _ctypes.c_double*nr_cols
+    m = _numpy.empty((nr_rows, nr_cols))
+    for r in range(nr_rows):
+        row_begin, row_end = rows[3*r], rows[3*r+1]
+        if not row_begin or not row_end or \
+                row_end - row_begin != nr_cols*_ctypes.sizeof(_ctypes.c_double):
+            return None
+        m[r] = _numpy.ctypeslib.as_array(row_type.from_address(row_begin))
+    # sanity check of the memory layout against the SWIG accessors
+    if m[0,0] != _m[0][0] or m[-1,-1] != _m[nr_rows-1][nr_cols-1]:
+        return None
+    return m
+
+
 def _CppMatrix2Numpy(_m):
-    m = _numpy.zeros((6,6))
-    for r in range(6):
-        for c in range(6):
+    m = _CppMatrixView(_m)
+    if m is not None:
+        return m
+    nr_rows = len(_m)
+    nr_cols = len(_m[0]) if nr_rows else 0
+    m = _numpy.zeros((nr_rows,nr_cols))
+    for r in range(nr_rows):
+        for c in range(nr_cols):
             m[r,c] = _m[r][c]
     return m
 
 
 def _CppMatrix24Numpy(_m):
-    m = _numpy.zeros((4,4))
-    for r in range(4):
-        for c in range(4):
-            m[r,c] = _m[r][c]
-    return m
+    return _CppMatrix2Numpy(_m)[:4,:4].copy()
 
 
 def _Numpy2CppDoublePos(p_in):
@@ -668,28 +1465,41 @@ def _4Numpy2CppDoublePos(p_in):
 
 
 def _CppDoublePos2Numpy(p_in):
-    return _numpy.array((p_in.rx,p_in.px,p_in.ry,p_in.py,p_in.de,p_in.dl))
+    try:
+        c_array = _c_double_pos.from_address(_address(p_in))
+        return _numpy.ctypeslib.as_array(c_array).copy()
+    except (AttributeError, TypeError):
+        return _numpy.array((p_in.rx,p_in.px,p_in.ry,p_in.py,p_in.de,p_in.dl))
 
 
 def _CppDoublePos24Numpy(p_in):
-    return _numpy.array((p_in.rx,p_in.px,p_in.ry,p_in.py))
+    return _CppDoublePos2Numpy(p_in)[:4]
+
+
+def _CppDoublePosVector2Buffer(orbit, buffer, offset=0):
+    # copies positions of 'orbit' into columns of a (6,n) buffer, starting at
+    # column 'offset'; positions missing in 'orbit' are left untouched.
+    nr_pos = min(len(orbit), buffer.shape[1] - offset)
+    if nr_pos <= 0:
+        return
+    view = _CppDoublePosVectorView(orbit)
+    if view is not None:
+        buffer[:,offset:offset+nr_pos] = view[:nr_pos].T
+        return
+    for n in range(nr_pos):
+        p = orbit[n]
+        buffer[:,offset+n] = (p.rx, p.px, p.ry, p.py, p.de, p.dl)
 
 
 def _CppDoublePosVector2Numpy(orbit, indices):
     if indices == 'closed' or indices == 'open':
-        _indices = range(len(orbit))
+        _indices = slice(None)
     elif indices is None:
         _indices = [len(orbit)-1]
     elif isinstance(indices,int):
         _indices = [indices]
 
-    orbit_out = _numpy.zeros((6, len(_indices)))
-    for i in range(len(_indices)):
-        orbit_out[:,i] = [
-            orbit[_indices[i]].rx, orbit[_indices[i]].px,
-            orbit[_indices[i]].ry, orbit[_indices[i]].py,
-            orbit[_indices[i]].de, orbit[_indices[i]].dl
-        ]
+    orbit_out = _CppDoublePosVector2Array(orbit)[_indices].T
     if indices is None:
         return orbit_out[0,:]
     else:
@@ -700,12 +1510,17 @@ def _Numpy2CppDoublePosVector(orbit):
     if isinstance(orbit, _trackcpp.CppDoublePosVector):
         return orbit
     if isinstance(orbit, _numpy.ndarray):
-        orbit_out = _trackcpp.CppDoublePosVector()
-        for i in range(orbit.shape[1]):
-            orbit_out.push_back(_trackcpp.CppDoublePos(
-                orbit[0,i], orbit[1,i],
-                orbit[2,i], orbit[3,i],
-                orbit[4,i], orbit[5,i]))
+        orbit_out = _trackcpp.CppDoublePosVector(orbit.shape[1],
+                                                 _trackcpp.CppDoublePos())
+        view = _CppDoublePosVectorView(orbit_out)
+        if view is not None:
+            view[:] = orbit[:_NUM_COORDS].T
+        else:
+            for i in range(orbit.shape[1]):
+                orbit_out[i] = _trackcpp.CppDoublePos(
+                    orbit[0,i], orbit[1,i],
+                    orbit[2,i], orbit[3,i],
+                    orbit[4,i], orbit[5,i])
     elif isinstance(orbit, (list,tuple)):
         orbit_out = _trackcpp.CppDoublePosVector()
         orbit_out.push_back(_trackcpp.CppDoublePos(
@@ -721,12 +1536,10 @@ def _4Numpy2CppDoublePosVector(orbit,de=0.0):
     if isinstance(orbit, _trackcpp.CppDoublePosVector):
         return orbit
     if isinstance(orbit, _numpy.ndarray):
-        orbit_out = _trackcpp.CppDoublePosVector()
-        for i in range(orbit.shape[1]):
-            orbit_out.push_back(_trackcpp.CppDoublePos(
-                orbit[0,i], orbit[1,i],
-                orbit[2,i], orbit[3,i],
-                de        , 0.0))
+        orbit6 = _numpy.zeros((_NUM_COORDS, orbit.shape[1]))
+        orbit6[:4] = orbit[:4]
+        orbit6[4] = de
+        orbit_out = _Numpy2CppDoublePosVector(orbit6)
     elif isinstance(orbit, (list,tuple)):
         orbit_out = _trackcpp.CppDoublePosVector()
         orbit_out.push_back(_trackcpp.CppDoublePos(
@@ -759,6 +1572,120 @@ def _process_args(accelerator, pos, indices=None):
     return pos, return_ndarray, indices
 
 
+# Parallel tracking: the accelerator is sent only once to each worker process
+# of the pool and kept in a module global, so that tasks only carry particles.
+_worker_accelerator = None
+
+
+def _init_worker(accelerator):
+    global _worker_accelerator
+    _worker_accelerator = accelerator
+
+
+def _call_worker(task):
+    function, args = task
+    return function(_worker_accelerator, *args)
+
+
+class WorkerPool(object):
+
+    def __init__(self, accelerator, workers):
+        """Pool of worker processes holding a copy of an accelerator.
+
+        The accelerator is sent once to each worker when the pool is created.
+        Functions with a 'workers' argument accept a WorkerPool in place of
+        the number of workers and reuse its processes when called with the
+        same accelerator, unmodified since the pool was created. Otherwise a
+        temporary pool with the same number of processes is used.
+
+        Keyword arguments:
+        accelerator -- Accelerator object
+        workers     -- number of worker processes
+
+        The pool may be used as a context manager, which closes it on exit.
+        """
+        self.accelerator = accelerator
+        self.workers = int(workers)
+        self._state = accelerator._cache_state()
+        self._pool = _multiprocessing.Pool(processes=self.workers,
+                                           initializer=_init_worker,
+                                           initargs=(accelerator,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Terminate the worker processes"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def map(self, function, args_list):
+        """Return [function(accelerator, *args) for args in args_list]
+        computed by the workers"""
+        tasks = [(function, args) for args in args_list]
+        return self._pool.map(_call_worker, tasks, chunksize=1)
+
+    def serves(self, accelerator):
+        """Return True if the workers hold the current state of accelerator"""
+        return (self._pool is not None and accelerator is self.accelerator and
+                accelerator._cache_state() == self._state)
+
+
+def _nr_workers(workers):
+    # number of processes of a 'workers' argument, a number or a WorkerPool
+    if isinstance(workers, WorkerPool):
+        return workers.workers
+    return workers or 1
+
+
+def _open_pool(accelerator, workers):
+    # returns (workers, pool): a WorkerPool to be reused by the calls of an
+    # operation and the pool to be closed by it (None if not created here)
+    if isinstance(workers, WorkerPool) or _nr_workers(workers) <= 1:
+        return workers, None
+    pool = WorkerPool(accelerator, workers)
+    return pool, pool
+
+
+def _parallel_map(function, args_list, workers, accelerator):
+    """Return [function(accelerator, *args) for args in args_list], computed
+    in a pool of 'workers' processes, or in the processes of a WorkerPool.
+    'function' must be a module level function so that it can be sent to the
+    workers."""
+    if isinstance(workers, WorkerPool):
+        if workers.serves(accelerator) and len(args_list) > 1:
+            return workers.map(function, args_list)
+        workers = workers.workers
+    if workers is None or workers <= 1 or len(args_list) <= 1:
+        return [function(accelerator, *args) for args in args_list]
+    workers = min(workers, len(args_list))
+    with WorkerPool(accelerator, workers) as pool:
+        return pool.map(function, args_list)
+
+
+def _shard_slices(nr_particles, workers):
+    # a few shards per worker balance the load when particles get lost early
+    nr_shards = max(1, min(nr_particles, 4*workers))
+    bounds = _numpy.linspace(0, nr_particles, nr_shards+1).astype(int)
+    return [slice(bounds[i], bounds[i+1]) for i in range(nr_shards)]
+
+
+def _ring_pass_shard(accelerator, particles, nr_turns, turn_by_turn,
+                     element_offset):
+    return ring_pass_bunch(accelerator, particles, nr_turns=nr_turns,
+                           turn_by_turn=turn_by_turn,
+                           element_offset=element_offset)
+
+
+def _line_pass_shard(accelerator, particles, indices, element_offset):
+    return line_pass(accelerator, particles, indices=indices,
+                     element_offset=element_offset)
+
+
 def _print_CppDoublePos(pos):
     print('')
     print('{0:+.16f}'.format(pos.rx))
@@ -772,11 +1699,19 @@ def _print_CppDoublePos(pos):
 
 class MatrixList(object):
 
-    def __init__(self, matrix_list=None):
+    def __init__(self, matrix_list=None, indices=None, size=None):
         """Read-only list of matrices.
 
+        Matrices are kept in the trackcpp vector and converted to numpy arrays
+        only when indexed. Unpickled lists keep the selected matrices in a
+        single numpy array instead.
+
         Keyword argument:
         matrix_list -- trackcpp Matrix vector (default: None)
+        indices -- positions of the items of matrix_list in the list (default:
+                   None, all items)
+        size    -- matrices are truncated to their first size rows and columns
+                   (default: None, full matrices)
         """
         # TEST!
         if matrix_list is not None:
@@ -786,14 +1721,90 @@ class MatrixList(object):
                 raise TrackingException('invalid Matrix vector')
         else:
             self._ml = _trackcpp.CppMatrixVector()
+        self._indices = None if indices is None else list(indices)
+        self._size = size
+        self._array = None
 
     def __len__(self):
+        if self._indices is not None:
+            return len(self._indices)
+        if self._array is not None:
+            return len(self._array)
         return len(self._ml)
 
+    def __deepcopy__(self, memo):
+        if self._array is not None:
+            matrix_list = MatrixList()
+            matrix_list.__setstate__((self._array.copy(),))
+            return matrix_list
+        return MatrixList(_trackcpp.CppMatrixVector(self._ml), self._indices,
+                          self._size)
+
+    # to make the class objects picklable: the state has the selected
+    # matrices, truncated to size, in a (n,size,size) numpy array
+    def __getstate__(self):
+        return (self.to_array(),)
+
+    def __setstate__(self, state):
+        self._ml = None
+        self._array = state[0]
+        self._indices = None
+        self._size = None
+
     def __getitem__(self, index):
-        return _numpy.array(self._ml[index])
+        if isinstance(index, (int, _numpy.integer)):
+            return self._matrix(self._position(int(index)))
+        positions = range(len(self))[index]
+        return self.to_array(indices=positions)
+
+    def to_array(self, out=None, indices=None):
+        """Return matrices as a (n,size,size) numpy array.
+
+        Keyword arguments:
+        out     -- array where the matrices are written (default: None, a new
+                   array)
+        indices -- list of positions in the list (default: None, all)
+        """
+        if indices is None:
+            indices = range(len(self))
+        positions = [self._position(int(i)) for i in indices]
+        if out is None:
+            if self._array is not None:
+                shape = self._array.shape[1:]
+            elif positions:
+                shape = self._matrix(positions[0]).shape
+            else:
+                shape = (self._size or 0,)*2
+            out = _numpy.empty((len(positions),) + shape)
+        elif out.shape[0] != len(positions):
+            raise TrackingException('out has invalid shape')
+        if self._array is not None:
+            out[:] = self._array[positions]
+            return out
+        for i, position in enumerate(positions):
+            out[i] = self._matrix(position)
+        return out
+
+    def _position(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('index out of range')
+        if self._indices is not None:
+            return self._indices[index]
+        return index
+
+    def _matrix(self, position):
+        if self._array is not None:
+            return self._array[position].copy()
+        m = _CppMatrix2Numpy(self._ml[position])
+        if self._size is not None:
+            m = m[:self._size,:self._size].copy()
+        return m
 
     def append(self, value):
+        if self._array is not None:
+            self._array_to_vector()
         if isinstance(value, _trackcpp.Matrix):
             self._ml.append(value)
         elif isinstance(value, _numpy.ndarray):
@@ -809,6 +1820,15 @@ class MatrixList(object):
             self._ml.append(m)
         else:
             raise TrackingException('can only append matrix-like objects')
+        if self._indices is not None:
+            self._indices.append(len(self._ml) - 1)
+
+    def _array_to_vector(self):
+        # moves the matrices of an unpickled list to a trackcpp vector
+        array, self._array = self._array, None
+        self._ml = _trackcpp.CppMatrixVector()
+        for matrix in array:
+            self.append(matrix)
 
     def _is_list_of_lists(self, value):
         valid_types = (list, tuple)
@@ -823,6 +1843,328 @@ class MatrixList(object):
         return True
 
 
+class LinearMapTracker(object):
+
+    def __init__(self, accelerator):
+        """Fast tracking model of a ring made of linear maps and thin kicks.
+
+        Elements with polynom_a or polynom_b components of order 2 or higher
+        and thin sextupoles are split in two halves without those components
+        and their nonlinear fields are applied as a thin kick between the
+        halves, integrated over the length of the element (thin_SL for
+        thin sextupoles; zero-length multipoles do not kick, as in
+        trackcpp). The lattice between consecutive kicks is
+        represented by one 6x6 map around the closed orbit, obtained from the
+        cumulative matrices of find_m66 of the split linear lattice, so a
+        turn costs one matrix product and one kick per nonlinear element for
+        the whole bunch.
+
+        Particles are lost when their coordinates are not finite or, if
+        vchamber_on, when they are outside the vacuum chamber of a nonlinear
+        element. Dipole fringe fields of split elements are kept only at
+        their ends.
+
+        Keyword arguments:
+        accelerator -- Accelerator object
+        """
+        self.state = accelerator._cache_state()
+        self.nr_elements = len(accelerator)
+        lattice, kick_positions, kicks = [], [], []
+        for i in range(len(accelerator)):
+            element = accelerator[i]
+            coefficients = _nonlinear_coefficients(element)
+            if len(coefficients) == 0:
+                lattice.append(element)
+                continue
+            first, second = _split_element(element)
+            lattice.append(first)
+            kick_positions.append(len(lattice))
+            lattice.append(second)
+            aperture = (element.hmin, element.hmax, element.vmin, element.vmax)
+            kicks.append((coefficients, i, aperture))
+        self._kicks = kicks
+
+        linear = _accelerator.Accelerator(
+            lattice=lattice,
+            energy=accelerator.energy,
+            harmonic_number=accelerator.harmonic_number,
+            cavity_on=accelerator.cavity_on,
+            radiation_on=accelerator.radiation_on,
+            vchamber_on=accelerator.vchamber_on)
+        self._vchamber_on = accelerator.vchamber_on
+        kind = 'orbit6' if accelerator.cavity_on else 'orbit4'
+        orbit = _CppDoublePosVector2Array(_find_orbit(linear, kind))
+        m66, matrices = find_m66(linear)
+
+        # maps between the start, the kicks and the end of the ring
+        nr_linear = len(linear)
+        points = [0] + kick_positions
+        cumulative = _numpy.empty((len(points)+1, 6, 6))
+        matrices.to_array(out=cumulative[:-1], indices=points)
+        cumulative[-1] = m66
+        self._orbit = _numpy.empty((len(points)+1, 6))
+        self._orbit[:-1] = orbit[points]
+        self._orbit[-1] = orbit[nr_linear] if len(orbit) > nr_linear else orbit[0]
+        # transposed maps M_k, with cumulative[k+1] = M_k cumulative[k]
+        self._maps_t = _numpy.linalg.solve(
+            cumulative[:-1].transpose(0, 2, 1), cumulative[1:].transpose(0, 2, 1))
+
+    def ring_pass(self, particles, nr_turns=1, particles_out=None):
+        """Track a bunch of particles along the ring.
+
+        Keyword arguments:
+        particles     -- initial 6D positions of the particles, a (N,6) array
+        nr_turns      -- number of turns around ring to track each particle
+        particles_out -- optional preallocated (N,6) float64 output buffer
+
+        Returns: (particles_out, lost_flag, lost_turn, lost_element,
+        lost_plane), as 'ring_pass_bunch' with turn_by_turn None. Lost
+        particles have nan positions.
+        """
+        particles = _numpy.array(particles, dtype=float, ndmin=2)
+        if particles.shape[1] != 6:
+            raise TrackingException("'particles' must be a (N,6) array")
+        nr_particles = particles.shape[0]
+        if particles_out is None:
+            particles_out = _numpy.empty((nr_particles, 6))
+        elif particles_out.shape != (nr_particles, 6):
+            raise TrackingException("'particles_out' must have shape (N,6)")
+        particles_out.fill(float('nan'))
+        lost_turn = _numpy.full(nr_particles, -1, dtype=int)
+        lost_element = _numpy.full(nr_particles, -1, dtype=int)
+        lost_plane = _numpy.zeros(nr_particles, dtype=int)
+
+        pos = particles
+        alive = _numpy.arange(nr_particles)
+        orbit, maps_t = self._orbit, self._maps_t
+        for turn in range(nr_turns):
+            for k in range(len(maps_t)):
+                pos = _numpy.dot(pos - orbit[k], maps_t[k]) + orbit[k+1]
+                if k < len(self._kicks):
+                    coefficients, element, aperture = self._kicks[k]
+                    _thin_kick(pos, coefficients)
+                else:
+                    element, aperture = self.nr_elements - 1, None
+                lost, plane = self._lost(pos, aperture)
+                if _numpy.any(lost):
+                    lost_turn[alive[lost]] = turn
+                    lost_element[alive[lost]] = element
+                    lost_plane[alive[lost]] = plane[lost]
+                    pos, alive = pos[~lost], alive[~lost]
+        particles_out[alive] = pos
+        lost_flag = bool(len(alive) < nr_particles)
+        return particles_out, lost_flag, lost_turn, lost_element, lost_plane
+
+    def compare(self, accelerator, particles, nr_turns=1):
+        """Compare fast tracking with 'ring_pass_bunch' of an accelerator.
+
+        Returns (deviation, speedup): the maximum absolute difference of each
+        coordinate between the final positions of particles which survive
+        both trackings, and the ratio of the tracking times.
+        """
+        start = _time.perf_counter()
+        exact, *_ = ring_pass_bunch(accelerator, particles, nr_turns=nr_turns)
+        exact_time = _time.perf_counter() - start
+        start = _time.perf_counter()
+        fast, *_ = self.ring_pass(particles, nr_turns=nr_turns)
+        fast_time = _time.perf_counter() - start
+        both = _numpy.all(_numpy.isfinite(exact) & _numpy.isfinite(fast), axis=1)
+        if not _numpy.any(both):
+            deviation = _numpy.full(6, float('nan'))
+        else:
+            deviation = _numpy.max(_numpy.abs(exact[both] - fast[both]), axis=0)
+        return deviation, exact_time/max(fast_time, 1e-12)
+
+    def _lost(self, pos, aperture):
+        x, y = pos[:, 0], pos[:, 2]
+        lost_x = ~_numpy.isfinite(x) | ~_numpy.isfinite(pos[:, 1])
+        lost_y = ~_numpy.isfinite(y) | ~_numpy.isfinite(pos[:, 3])
+        if self._vchamber_on and aperture is not None:
+            hmin, hmax, vmin, vmax = aperture
+            lost_x |= (x < hmin) | (x > hmax)
+            lost_y |= (y < vmin) | (y > vmax)
+        plane = _numpy.where(lost_x, 1, 2)
+        return lost_x | lost_y, plane
+
+
+def _nonlinear_coefficients(element):
+    # integrated (b_n + i*a_n) of orders n >= 2 of the kick of an element,
+    # with the strengths used by its trackcpp pass method
+    if element.pass_method == 'thinsext_pass':
+        coefficients = _numpy.array([element.thin_SL], dtype=complex)
+    elif element.pass_method == 'thinquad_pass':
+        coefficients = _numpy.zeros(0, dtype=complex)
+    else:
+        polynom_a = _numpy.array(element.polynom_a)
+        polynom_b = _numpy.array(element.polynom_b)
+        size = max(len(polynom_a), len(polynom_b), 2)
+        coefficients = _numpy.zeros(size, dtype=complex)
+        coefficients[:len(polynom_b)] += polynom_b
+        coefficients[:len(polynom_a)] += 1j*polynom_a
+        coefficients = element.length*coefficients[2:]
+    return _numpy.trim_zeros(coefficients, 'b')
+
+
+def _split_element(element):
+    # linear halves of an element, with the edges and misalignments of the
+    # element at its ends
+    halves = []
+    for _ in range(2):
+        e = _elements.Element(element=element, copy=True)
+        e.length = element.length/2
+        e.angle = element.angle/2
+        e.hkick = element.hkick/2
+        e.vkick = element.vkick/2
+        e.thin_KL = element.thin_KL/2
+        e.thin_SL = 0.0
+        polynom_a, polynom_b = list(e.polynom_a), list(e.polynom_b)
+        e.polynom_a = polynom_a[:2] + [0.0]*len(polynom_a[2:])
+        e.polynom_b = polynom_b[:2] + [0.0]*len(polynom_b[2:])
+        halves.append(e)
+    first, second = halves
+    first.angle_out, first.fint_out = 0.0, 0.0
+    second.angle_in, second.fint_in = 0.0, 0.0
+    first.t_out = _numpy.zeros(_NUM_COORDS)
+    first.r_out = _numpy.eye(_NUM_COORDS)
+    second.t_in = _numpy.zeros(_NUM_COORDS)
+    second.r_in = _numpy.eye(_NUM_COORDS)
+    return first, second
+
+
+def _thin_kick(pos, coefficients):
+    # integrated multipole kick, sum of (b_n + i*a_n)*(x + i*y)^n for n >= 2
+    if len(coefficients) == 0:
+        return
+    z = pos[:, 0] + 1j*pos[:, 2]
+    field = _numpy.full(len(z), coefficients[-1])
+    for c in coefficients[-2::-1]:
+        field = field*z + c
+    field *= z*z
+    pos[:, 1] -= field.real
+    pos[:, 3] += field.imag
+
+
+class RecordingPolicy(object):
+
+    def __init__(self, stride=1, window=None, positions=True, moments=False,
+                 loss_snapshot=False):
+        """What 'ring_pass' records turn by turn, or 'line_pass' element by
+        element, instead of the positions at every turn or element.
+
+        Keyword arguments:
+        stride   -- only every stride-th turn (element) of the window is
+                    recorded (default: 1)
+        window   -- (start, stop) turns (element indices) recorded, stop
+                    excluded (default: None, all)
+        positions -- record the positions of all particles (default: True)
+        moments  -- record the mean and covariance matrix of the positions of
+                    the surviving particles (default: False)
+        loss_snapshot -- record the last position of each lost particle seen
+                    before it was lost: at the end of the previous turn for
+                    'ring_pass' or at the last recorded element for
+                    'line_pass' (default: False)
+        """
+        if stride < 1:
+            raise TrackingException("'stride' must be positive")
+        self.stride = int(stride)
+        self.window = window
+        self.positions = positions
+        self.moments = moments
+        self.loss_snapshot = loss_snapshot
+
+    def selected(self, steps):
+        """Return boolean array selecting the recorded turns (elements)"""
+        steps = _numpy.asarray(steps)
+        start, stop = self.window if self.window is not None else (0, None)
+        mask = (steps >= start) & ((steps - start) % self.stride == 0)
+        if stop is not None:
+            mask &= steps < stop
+        return mask
+
+
+class Recording(object):
+
+    def __init__(self, policy, particles):
+        """Data recorded by 'ring_pass' or 'line_pass' with a RecordingPolicy.
+
+        Attributes:
+        policy    -- the RecordingPolicy
+        steps     -- recorded turns ('ring_pass') or element indices
+                     ('line_pass')
+        positions -- (N,6,len(steps)) array, or None if not recorded
+        mean      -- (6,len(steps)) array, or None if not recorded
+        covariance -- (6,6,len(steps)) array, or None if not recorded
+        nr_alive  -- number of surviving particles at each step, or None
+        lost_positions -- (N,6) array with the last positions of lost
+                     particles, nan for surviving particles, or None
+        """
+        self.policy = policy
+        self.steps = None
+        self.positions = None
+        self.mean = None
+        self.covariance = None
+        self.nr_alive = None
+        self.lost_positions = None
+        self._chunks = {'steps': [], 'positions': [], 'mean': [],
+                        'covariance': [], 'nr_alive': []}
+        self._last = particles.copy() if policy.loss_snapshot else None
+
+    def _add(self, steps, positions):
+        # adds (N,6,k) positions at the given steps
+        if self._last is not None and positions.shape[2] > 0:
+            finite = _numpy.isfinite(positions[:, 0, :])
+            has_finite = _numpy.any(finite, axis=1)
+            last = positions.shape[2] - 1 - _numpy.argmax(finite[:, ::-1], axis=1)
+            self._last[has_finite] = positions[has_finite, :, last[has_finite]]
+
+        mask = self.policy.selected(steps)
+        if not _numpy.any(mask):
+            return
+        selected = positions[:, :, mask]
+        self._chunks['steps'].append(_numpy.asarray(steps)[mask])
+        if self.policy.positions:
+            self._chunks['positions'].append(selected.copy())
+        if self.policy.moments:
+            nr_steps = selected.shape[2]
+            mean = _numpy.full((6, nr_steps), float('nan'))
+            covariance = _numpy.full((6, 6, nr_steps), float('nan'))
+            nr_alive = _numpy.zeros(nr_steps, dtype=int)
+            for j in range(nr_steps):
+                p = selected[:, :, j]
+                p = p[_numpy.all(_numpy.isfinite(p), axis=1)]
+                nr_alive[j] = p.shape[0]
+                if nr_alive[j] > 0:
+                    mean[:, j] = _numpy.mean(p, axis=0)
+                    d = p - mean[:, j]
+                    covariance[:, :, j] = _numpy.dot(d.T, d)/nr_alive[j]
+            self._chunks['mean'].append(mean)
+            self._chunks['covariance'].append(covariance)
+            self._chunks['nr_alive'].append(nr_alive)
+
+    def _finish(self, lost):
+        # concatenates chunks; 'lost' is a boolean array of lost particles
+        chunks = self._chunks
+        self.steps = _numpy.concatenate(chunks['steps'] + [_numpy.zeros(0, int)])
+        nr_particles = len(lost)
+        if self.policy.positions:
+            self.positions = _numpy.concatenate(
+                chunks['positions'] + [_numpy.zeros((nr_particles, 6, 0))],
+                axis=2)
+        if self.policy.moments:
+            self.mean = _numpy.concatenate(
+                chunks['mean'] + [_numpy.zeros((6, 0))], axis=1)
+            self.covariance = _numpy.concatenate(
+                chunks['covariance'] + [_numpy.zeros((6, 6, 0))], axis=2)
+            self.nr_alive = _numpy.concatenate(
+                chunks['nr_alive'] + [_numpy.zeros(0, int)])
+        if self._last is not None:
+            self.lost_positions = _numpy.full((nr_particles, 6), float('nan'))
+            self.lost_positions[lost] = self._last[lost]
+        self._chunks = None
+        self._last = None
+        return self
+
+
 # Legacy API
 elementpass = _utils.deprecated(element_pass)
 linepass = _utils.deprecated(line_pass)
@@ -1,4 +1,7 @@
 
+import copy as _copy
+import functools as _functools
+import inspect as _inspect
 import warnings
 import numpy as _numpy
 
@@ -33,6 +36,80 @@ def deprecated(function):
     return new_function
 
 
+_disk_cache = None # see diskcache.set_disk_cache
+
+
+def cached(function=None, disk=False):
+    '''Decorator for functions of an accelerator whose results may be kept in
+    the result cache of the accelerator (see Accelerator.cache_on) and, for
+    functions decorated with cached(disk=True), in the disk cache (see
+    diskcache.set_disk_cache).
+
+    The function must have an 'accelerator' argument. Results are stored under
+    a key made of the function name, the accelerator cache state (lattice
+    fingerprint for the disk cache) and the other arguments; calls with
+    arguments which cannot be used as a key are not cached. Copies of the
+    stored results are returned.
+
+    The disk cache is meant for expensive top level computations: the
+    fingerprint of a modified lattice and the file access cost more than
+    fast functions such as closed orbit searches.'''
+    if function is None:
+        return lambda function: cached(function, disk=disk)
+    signature = _inspect.signature(function)
+
+    @_functools.wraps(function)
+    def new_function(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        accelerator = arguments.arguments.get('accelerator')
+        cache = getattr(accelerator, '_cache', None)
+        disk_cache = _disk_cache if disk else None
+        if (not hasattr(accelerator, '_cache_state') or
+                (cache is None and disk_cache is None)):
+            return function(*args, **kwargs)
+        try:
+            arguments_key = _hashable([(k, v) for k, v in
+                                       arguments.arguments.items()
+                                       if k != 'accelerator'])
+        except TypeError:
+            return function(*args, **kwargs)
+        if cache is not None:
+            key = (function.__module__, function.__name__,
+                   accelerator._cache_state(), arguments_key)
+            if key in cache:
+                return _copy.deepcopy(cache[key])
+        if disk_cache is not None:
+            disk_key = (function.__module__, function.__name__,
+                        accelerator.fingerprint, arguments_key)
+            found, value = disk_cache.get(disk_key)
+            if not found:
+                value = function(*args, **kwargs)
+                disk_cache.put(disk_key, value)
+        else:
+            value = function(*args, **kwargs)
+        if cache is None:
+            return value
+        cache[key] = value
+        return _copy.deepcopy(value)
+
+    return new_function
+
+
+def _hashable(value):
+    # returns a hashable representation of a function argument
+    if isinstance(value, _numpy.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, value.tobytes())
+    elif isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    elif isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    elif isinstance(value, (str, bytes, int, float, complex, bool, type(None),
+                            _numpy.number, _numpy.bool_)):
+        return value
+    raise TypeError('unhashable argument')
+
+
 class Polynom(_numpy.ndarray):
 
     def __new__(cls, polynom):
@@ -46,6 +123,8 @@ class Polynom(_numpy.ndarray):
         if hasattr(self, '_polynom'):
             self._polynom[index] = value
         super().__setitem__(index, value)
+        if getattr(self, '_on_change', None) is not None:
+            self._on_change()
 
     def __eq__(self,other):
         if not isinstance(other,Polynom): return NotImplemented
@@ -6,6 +6,11 @@ import test_accelerator
 import test_tracking
 import test_lattice
 import test_optics
+import test_ensemble
+import test_naff
+import test_response
+import test_correction
+import test_diskcache
 
 
 suite_list = []
@@ -14,6 +19,11 @@ suite_list.append(test_accelerator.get_suite())
 suite_list.append(test_lattice.get_suite())
 suite_list.append(test_tracking.get_suite())
 suite_list.append(test_optics.get_suite())
+suite_list.append(test_ensemble.get_suite())
+suite_list.append(test_naff.get_suite())
+suite_list.append(test_response.get_suite())
+suite_list.append(test_correction.get_suite())
+suite_list.append(test_diskcache.get_suite())
 
 tests = unittest.TestSuite(suite_list)
 unittest.TextTestRunner(verbosity=2).run(tests)
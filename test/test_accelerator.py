@@ -112,6 +112,55 @@ class TestAcceleratorAuxMethods(unittest.TestCase):
     def test_rmul_unsupported_type(self):
         self.assertRaises(TypeError, self.rmul_the_ring_and_value, (1.0))
 
+    def test_attribute_table(self):
+        idx = pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'qfa')
+        K = self.the_ring.get_attributes('K', idx)
+        self.assertEqual(K.tolist(), [self.the_ring[i].K for i in idx])
+        fam_names = self.the_ring.get_attributes('fam_name')
+        self.assertEqual(fam_names[idx[0]], 'qfa')
+        self.assertEqual(len(fam_names), len(self.the_ring))
+
+        self.the_ring.set_attributes('K', idx, 2*K)
+        self.assertEqual(self.the_ring[idx[0]].K, 2*K[0])
+        self.assertTrue(numpy.allclose(self.the_ring.get_attributes('K', idx), 2*K))
+
+        # changes through elements invalidate the table
+        self.the_ring[idx[0]].K = 0.0
+        self.assertEqual(self.the_ring.get_attributes('K', idx[0]), 0.0)
+        self.assertRaises(pyaccel.accelerator.AcceleratorException,
+            self.the_ring.get_attributes, 'polynom_b')
+        self.assertRaises(pyaccel.accelerator.AcceleratorException,
+            self.the_ring.set_attributes, 'K', idx, K[:2])
+
+    def test_item_index_range(self):
+        n = len(self.the_ring)
+        element = self.the_ring[0]
+        self.the_ring[-1] = element
+        self.assertEqual(self.the_ring[n-1].fam_name, element.fam_name)
+        with self.assertRaises(IndexError):
+            self.the_ring[n] = element
+        with self.assertRaises(IndexError):
+            del self.the_ring[-n-1]
+        self.assertEqual(len(self.the_ring), n)
+
+    def test_fingerprint(self):
+        fingerprint = self.the_ring.fingerprint
+        self.assertEqual(len(fingerprint), 40)
+        self.assertEqual(self.the_ring.fingerprint, fingerprint)
+        the_copy = self.the_ring[:]
+        self.assertEqual(the_copy.fingerprint, fingerprint)
+
+        idx = pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'qfa')
+        K = self.the_ring.get_attributes('K', idx)
+        self.the_ring.set_attributes('K', idx, 2*K)
+        self.assertNotEqual(self.the_ring.fingerprint, fingerprint)
+        self.assertNotEqual(self.the_ring, the_copy)
+        self.the_ring.set_attributes('K', idx, K)
+        self.assertEqual(self.the_ring.fingerprint, fingerprint)
+
+        the_copy.cavity_on = not the_copy.cavity_on
+        self.assertNotEqual(the_copy.fingerprint, fingerprint)
+
     def add_the_ring_and_value(self, value):
         return self.the_ring + value
 
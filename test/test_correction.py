@@ -0,0 +1,61 @@
+import unittest
+import numpy
+import pyaccel
+import models
+
+
+class TestCorrection(unittest.TestCase):
+
+    def setUp(self):
+        self.the_ring = models.create_accelerator()
+        self.hcms = ('fam_name', ['sfa', 'sfb', 'sd1'])
+        self.vcms = ('fam_name', ['sfa', 'sfb', 'sd1'])
+
+    def test_select_elements(self):
+        acc = self.the_ring
+        bpms = pyaccel.correction.select_elements(acc, 'bpm')
+        self.assertEqual(bpms,
+            pyaccel.lattice.find_indices(acc, 'fam_name', 'bpm'))
+        hcms = pyaccel.correction.select_elements(acc, self.hcms)
+        self.assertEqual(hcms, sorted(hcms))
+        self.assertEqual(len(hcms), sum(
+            len(pyaccel.lattice.find_indices(acc, 'fam_name', name))
+            for name in self.hcms[1]))
+        self.assertEqual(pyaccel.correction.select_elements(acc, [3, 1]),
+                         [3, 1])
+
+    def test_calc_correction_matrix(self):
+        response = numpy.diag([4.0, 2.0, 1e-6])
+        matrix, nr_kept = pyaccel.correction.calc_correction_matrix(response)
+        self.assertEqual(nr_kept, 2)
+        self.assertTrue(numpy.allclose(matrix, numpy.diag([0.25, 0.5, 0.0])))
+        matrix, nr_kept = pyaccel.correction.calc_correction_matrix(
+            response, nr_singular_values=1)
+        self.assertEqual(nr_kept, 1)
+
+    def test_correct_orbit(self):
+        acc = self.the_ring
+        quads = pyaccel.lattice.find_indices(acc, 'fam_name', 'qfa')
+        random = numpy.random.RandomState(1)
+        pyaccel.lattice.add_error_misalignment_x(
+            acc, quads, 20e-6*random.standard_normal(len(quads)))
+        pyaccel.lattice.add_error_misalignment_y(
+            acc, quads, 20e-6*random.standard_normal(len(quads)))
+        hkicks, vkicks, rms = pyaccel.correction.correct_orbit(
+            acc, self.hcms, self.vcms, nr_iterations=3)
+        self.assertLess(rms[-1][0], 0.1*rms[0][0])
+        self.assertLess(rms[-1][1], 0.1*rms[0][1])
+        hcms = pyaccel.correction.select_elements(acc, self.hcms)
+        self.assertEqual(acc.get_attributes('hkick', hcms).tolist(),
+                         hkicks.tolist())
+
+
+def correction_suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCorrection)
+    return suite
+
+
+def get_suite():
+    suite_list = []
+    suite_list.append(correction_suite())
+    return unittest.TestSuite(suite_list)
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+import numpy
+import pyaccel
+import models
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+
+    def tearDown(self):
+        pyaccel.diskcache.set_disk_cache(None)
+        self.tmpdir.cleanup()
+
+    def test_store(self):
+        cache = pyaccel.diskcache.DiskCache(self.directory, max_size=10**6)
+        key = ('module', 'function', 'fingerprint', (('order', 1),))
+        self.assertEqual(cache.get(key), (False, None))
+        self.assertTrue(cache.put(key, numpy.arange(5.0)))
+        self.assertIn(key, cache)
+        found, value = cache.get(key)
+        self.assertTrue(found)
+        self.assertEqual(value.tolist(), list(range(5)))
+        self.assertFalse(cache.put(('unpicklable',), lambda x: x))
+        self.assertEqual([n for n in os.listdir(self.directory)
+                          if n.endswith('.tmp')], [])
+        cache.clear()
+        self.assertEqual(cache.size(), 0)
+
+    def test_eviction(self):
+        cache = pyaccel.diskcache.DiskCache(self.directory, max_size=10**6)
+        for i in range(3):
+            cache.put(i, numpy.zeros(40000))
+            filename = cache._filename(i)
+            os.utime(filename, (i, i))
+        cache.get(0) # most recently used
+        cache.max_size = 2*os.path.getsize(filename)
+        cache.evict()
+        self.assertIn(0, cache)
+        self.assertNotIn(1, cache)
+        self.assertIn(2, cache)
+        self.assertLessEqual(cache.size(), cache.max_size)
+        cache.put(3, numpy.zeros(40000))
+        self.assertNotIn(2, cache)
+        self.assertIn(3, cache)
+
+    def test_cached_functions(self):
+        the_ring = models.create_accelerator()
+        cache = pyaccel.diskcache.set_disk_cache(self.directory)
+        self.assertIs(pyaccel.diskcache.get_disk_cache(), cache)
+        mcf = pyaccel.optics.get_mcf(the_ring)
+        # closed orbits of get_mcf are not stored on disk
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        key = ('pyaccel.optics', 'get_mcf', the_ring.fingerprint,
+               (('order', 1), ('energy_offset', None)))
+        cache.put(key, 2*mcf)
+        self.assertEqual(pyaccel.optics.get_mcf(the_ring[:]), 2*mcf)
+        pyaccel.diskcache.set_disk_cache(None)
+        self.assertEqual(pyaccel.optics.get_mcf(the_ring), mcf)
+
+
+def diskcache_suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDiskCache)
+    return suite
+
+
+def get_suite():
+    suite_list = []
+    suite_list.append(diskcache_suite())
+    return unittest.TestSuite(suite_list)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import numpy
+import pyaccel
+import models
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def setUp(self):
+        self.the_ring = models.create_accelerator()
+        qfa = pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'qfa')
+        self.errors = [
+            (pyaccel.lattice.add_error_misalignment_x, qfa, 20e-6),
+            (pyaccel.lattice.add_error_misalignment_y, qfa, 20e-6),
+        ]
+
+    def test_apply_errors(self):
+        acc1, acc2 = self.the_ring[:], self.the_ring[:]
+        pyaccel.ensemble.apply_errors(acc1, self.errors, seed=3, cutoff=1.0)
+        pyaccel.ensemble.apply_errors(acc2, self.errors, seed=3, cutoff=1.0)
+        idx = self.errors[0][1]
+        misx = numpy.array(pyaccel.lattice.get_error_misalignment_x(acc1, idx))
+        self.assertTrue(numpy.all(numpy.abs(misx) <= 20e-6))
+        self.assertEqual(misx.tolist(),
+            pyaccel.lattice.get_error_misalignment_x(acc2, idx))
+
+    def test_run_ensemble(self):
+        seeds = [1, 2, 3]
+        observables = ('tunes', 'closed_orbit')
+        r1 = pyaccel.ensemble.run_ensemble(self.the_ring, self.errors, seeds,
+            observables=observables)
+        with tempfile.TemporaryDirectory() as directory:
+            r2 = pyaccel.ensemble.run_ensemble(self.the_ring, self.errors,
+                seeds, observables=observables, directory=directory, workers=2)
+            r3 = pyaccel.ensemble.load_ensemble(directory)
+            self.assertEqual(r1['tunes'].shape, (3, 2))
+            self.assertEqual(r1['closed_orbit'].shape, (3, 4, len(self.the_ring)))
+            for name in observables:
+                self.assertTrue(numpy.array_equal(r1[name], r2[name]))
+                self.assertTrue(numpy.array_equal(r1[name], r3[name]))
+            self.assertFalse(numpy.any(r3.failed))
+            del r2, r3
+
+
+    def test_failed_observable(self):
+        seeds = [1, 2]
+        r = pyaccel.ensemble.run_ensemble(self.the_ring, self.errors, seeds,
+            observables=('tunes', ('unstable', _unstable)))
+        self.assertEqual(r['unstable'].shape, (2,))
+        self.assertTrue(numpy.all(numpy.isnan(r['unstable'])))
+        self.assertTrue(numpy.all(r.failed))
+        self.assertEqual(r['tunes'].shape, (2, 2))
+
+
+def _unstable(accelerator):
+    raise ValueError('unstable machine')
+
+
+def ensemble_suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestEnsemble)
+    return suite
+
+
+def get_suite():
+    suite_list = []
+    suite_list.append(ensemble_suite())
+    return unittest.TestSuite(suite_list)
@@ -1,5 +1,6 @@
 
 import os
+import pickle
 import unittest
 import numpy
 import pyaccel
@@ -108,6 +109,57 @@ class TestLattice(unittest.TestCase):
             for i in ind:
                 self.assertEqual(self.the_ring[i].fam_name, key)
 
+    def test_element_index(self):
+        mia = pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'mia')
+        scan = [i for i in range(len(self.the_ring))
+                if self.the_ring[i].fam_name == 'mia']
+        self.assertEqual(mia, scan)
+
+        # index is updated as the lattice changes
+        self.the_ring.append(pyaccel.elements.marker('mia'))
+        mia.append(len(self.the_ring)-1)
+        self.assertEqual(
+            pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'mia'), mia)
+        del self.the_ring[0]
+        mia = [i-1 for i in mia]
+        self.assertEqual(
+            pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'mia'), mia)
+        self.the_ring[mia[0]] = pyaccel.elements.marker('test')
+        self.assertEqual(
+            pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'mia'), mia[1:])
+        self.the_ring[mia[1]].fam_name = 'test'
+        self.assertEqual(
+            pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'test'), mia[:2])
+
+        pm_dict = pyaccel.lattice.find_dict(self.the_ring, 'pass_method')
+        for key, indices in pm_dict.items():
+            for i in indices:
+                self.assertEqual(self.the_ring[i].pass_method, key)
+
+    def test_errors(self):
+        idx = pyaccel.lattice.find_indices(self.the_ring, 'fam_name', 'qfa')
+        elements = [pyaccel.elements.Element(element=self.the_ring[i], copy=True)
+                    for i in range(len(self.the_ring))]
+        values = numpy.linspace(1e-6, 1e-5, len(idx))
+
+        # bulk write to the accelerator and element-wise write to a list
+        for lattice in (self.the_ring, elements):
+            pyaccel.lattice.set_error_misalignment_x(lattice, idx, values)
+            self.assertIs(pyaccel.lattice.add_error_misalignment_y(
+                lattice, idx, values), lattice)
+            pyaccel.lattice.add_error_rotation_roll(lattice, idx, values)
+            pyaccel.lattice.set_error_rotation_yaw(lattice, idx, values)
+        for i in idx:
+            for attribute in ('t_in', 't_out', 'r_in', 'r_out'):
+                self.assertTrue(numpy.allclose(
+                    getattr(self.the_ring[i], attribute),
+                    getattr(elements[i], attribute), rtol=0, atol=1e-15))
+
+        roll = pyaccel.lattice.get_error_rotation_roll(self.the_ring, idx)
+        self.assertTrue(numpy.allclose(roll, values, rtol=1e-10, atol=0))
+        yaw = pyaccel.lattice.get_error_rotation_yaw(self.the_ring, idx)
+        self.assertTrue(numpy.allclose(yaw, values, rtol=1e-10, atol=0))
+
 
 class TestFlatFile(unittest.TestCase):
 
@@ -151,6 +203,29 @@ class TestFlatFile(unittest.TestCase):
         self.assertTrue((a[1].t_in == t).all())
         self.assertTrue((a[1].t_out == -t).all())
 
+    def test_binary_file(self):
+        t = numpy.array([1.0e-6, 2.0e-6, 3.0e-6, 4.0e-6, 5.0e-6, 6.0e-6])
+        self.a[1].t_in = t
+        self.a[3].polynom_b = [0.0, 1.0/3.0, 2.0**0.5]
+        filename = os.path.join(self.test_dir, 'flatfile2.npz')
+        pyaccel.lattice.write_binary_file(self.a, filename)
+        a = pyaccel.lattice.read_binary_file(filename)
+        os.remove(filename)
+        self.assertEqual(a, self.a)
+        self.assertEqual(a.energy, self.a.energy)
+        self.assertTrue((a[1].t_in == t).all())
+        self.assertEqual(pyaccel.lattice.write_flat_file_to_string(a),
+                         pyaccel.lattice.write_flat_file_to_string(self.a))
+
+        # pickling uses the binary format and accepts flat file strings
+        b = pickle.loads(pickle.dumps(self.a))
+        self.assertEqual(b, self.a)
+        self.assertIsInstance(self.a.__getstate__(), bytes)
+        c = pyaccel.accelerator.Accelerator.__new__(
+            pyaccel.accelerator.Accelerator)
+        c.__setstate__(pyaccel.lattice.write_flat_file_to_string(self.a))
+        self.assertEqual(c, self.a)
+
 
 def lattice_suite():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestLattice)
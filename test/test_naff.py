@@ -0,0 +1,60 @@
+import unittest
+import numpy
+import pyaccel
+import models
+
+
+class TestNaff(unittest.TestCase):
+
+    def setUp(self):
+        self.the_ring = models.create_accelerator()
+
+    def test_naff_traj(self):
+        nr_turns = 7 + 6*20
+        n = numpy.arange(nr_turns)
+        particles = numpy.zeros((2, 6, nr_turns))
+        particles[0,0] = numpy.cos(2*numpy.pi*0.21*n)
+        particles[0,2] = numpy.cos(2*numpy.pi*0.13*n)
+        particles[1] = float('nan')
+        tunes = pyaccel.naff.naff_traj(particles)
+        self.assertAlmostEqual(tunes[0,0], 0.21, places=6)
+        self.assertAlmostEqual(tunes[1,0], 0.13, places=6)
+        self.assertTrue(numpy.all(numpy.isnan(tunes[:,1])))
+
+    def test_naff_batch(self):
+        n = numpy.arange(7 + 6*100)
+        tunes = numpy.array([0.1234567, 0.2345678, 0.3456789])
+        signals = numpy.cos(2*numpy.pi*numpy.outer(tunes, n))
+        signals += 0.1*numpy.cos(2*numpy.pi*numpy.outer(2*tunes, n) + 0.3)
+        freq, Four = pyaccel.naff.naff_batch(signals, is_real=True)
+        self.assertEqual(freq.shape, (3,))
+        for i in range(3):
+            freq_cpp, _ = pyaccel.naff.naff_general(signals[i].astype(complex),
+                is_real=True, nr_ff=1, use_win=1)
+            self.assertAlmostEqual(freq[i], freq_cpp[0], delta=1e-10)
+            self.assertAlmostEqual(freq[i], tunes[i], places=6)
+
+        z = numpy.exp(2j*numpy.pi*0.2*n)
+        freq, Four = pyaccel.naff.naff_batch(z)
+        self.assertAlmostEqual(freq, 0.2, places=10)
+        self.assertAlmostEqual(abs(Four), 1.0, places=6)
+
+    def test_frequency_map(self):
+        x, y, tunes1, tunes2, diffusion = pyaccel.naff.frequency_map(
+            self.the_ring, 61, x_max=1e-4, y_max=1e-4, nr_points=(3, 2))
+        self.assertEqual(tunes1.shape, (2, 6))
+        self.assertEqual(diffusion.shape, (6,))
+        tunex, tuney, *_ = pyaccel.optics.get_frac_tunes(self.the_ring)
+        self.assertTrue(numpy.allclose(tunes1[0], tunex, atol=1e-3))
+        self.assertTrue(numpy.allclose(tunes2[1], tuney, atol=1e-3))
+
+
+def naff_suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestNaff)
+    return suite
+
+
+def get_suite():
+    suite_list = []
+    suite_list.append(naff_suite())
+    return unittest.TestSuite(suite_list)
@@ -202,6 +202,50 @@ class TestTwiss(unittest.TestCase):
         for i, x in zip(indices, etapy):
             self.assertAlmostEqual(self.etapy[i], x, 8)
 
+    def test_twiss_list(self):
+        twiss, *_ = pyaccel.optics.calc_twiss(self.accelerator)
+        self.assertEqual(len(twiss), len(self.accelerator))
+        self.assertEqual(twiss.co.shape, (6, len(self.accelerator)))
+
+        # single Twiss objects
+        t = twiss[100]
+        self.assertEqual(t.betax, twiss.betax[100])
+        self.assertEqual(t.etapy, twiss.etapy[100])
+        self.assertEqual(t.spos, twiss.spos[100])
+        self.assertTrue((t.co == twiss.co[:,100]).all())
+
+        # slices share data with the original list
+        tl = twiss[100:200]
+        self.assertEqual(len(tl), 100)
+        self.assertTrue(numpy.shares_memory(tl.betax, twiss.betax))
+        self.assertEqual(tl.mux[0], twiss.mux[100])
+
+        # fancy indexing returns copies
+        tl = twiss[[0, 100, 200]]
+        self.assertEqual(len(tl), 3)
+        self.assertEqual(tl.betay[2], twiss.betay[200])
+        self.assertFalse(numpy.shares_memory(tl.betay, twiss.betay))
+
+        # appended points
+        tl = pyaccel.optics.TwissList()
+        for i in range(40):
+            tl.append(twiss[i])
+            if i == 9:
+                tl_begin = tl[:]
+        self.assertEqual(len(tl), 40)
+        self.assertTrue(numpy.all(tl.betax == twiss.betax[:40]))
+        self.assertTrue(numpy.all(tl.co == twiss.co[:,:40]))
+        self.assertEqual(len(tl_begin), 10)
+        self.assertTrue(numpy.all(tl_begin.mux == twiss.mux[:10]))
+
+        # parameters are read-only views of the shared block
+        betax = twiss.betax.copy()
+        with self.assertRaises(ValueError):
+            twiss.betax *= 2
+        with self.assertRaises(ValueError):
+            twiss[100:200].co[0, 0] = 1.0
+        self.assertTrue(numpy.all(twiss.betax == betax))
+
 
 class TestOptics(unittest.TestCase):
 
@@ -220,6 +264,48 @@ class TestOptics(unittest.TestCase):
         f = pyaccel.optics.get_revolution_frequency(self.accelerator)
         self.assertAlmostEqual(f, 1.0/1.7291829520280572e-06, 15)
 
+    def test_result_cache(self):
+        acc = self.accelerator
+        acc.cavity_on = True
+        acc.cache_on = True
+        twiss1, m661 = pyaccel.optics.calc_twiss(acc)
+        twiss2, m662 = pyaccel.optics.calc_twiss(acc)
+        self.assertEqual(len(acc._cache), 1)
+        self.assertTrue((m661 == m662).all())
+        self.assertTrue((twiss1.betax == twiss2.betax).all())
+
+        # returned results are copies
+        m662[0, 0] = 0.0
+        twiss3, m663 = pyaccel.optics.calc_twiss(acc)
+        self.assertIsNot(twiss3, twiss2)
+        self.assertFalse(numpy.shares_memory(twiss3.betax, twiss2.betax))
+        self.assertTrue((twiss3.betax == twiss1.betax).all())
+        self.assertEqual(m663[0, 0], m661[0, 0])
+
+        # flags are part of the cache key
+        acc.cavity_on = False
+        pyaccel.optics.calc_twiss(acc)
+        self.assertEqual(len(acc._cache), 2)
+
+        # element changes invalidate the cache
+        idx = pyaccel.lattice.find_indices(acc, 'fam_name', 'qfa')[0]
+        acc[idx].K *= 1.01
+        self.assertEqual(len(acc._cache), 0)
+        twiss4, *_ = pyaccel.optics.calc_twiss(acc)
+        self.assertNotEqual(twiss4.betax[0], twiss1.betax[0])
+        acc[idx].polynom_b[1] = acc[idx].K / 1.01
+        self.assertEqual(len(acc._cache), 0)
+
+        # nested index assignments of views invalidate the cache as well
+        pyaccel.optics.calc_twiss(acc)
+        self.assertGreater(len(acc._cache), 0)
+        acc[idx].r_in[0][1] = 1e-6
+        self.assertEqual(len(acc._cache), 0)
+        self.assertEqual(acc[idx].r_in[0, 1], 1e-6)
+        pyaccel.optics.calc_twiss(acc)
+        acc[idx].t_in[:2][0] = 1e-6
+        self.assertEqual(len(acc._cache), 0)
+
     def test_get_frac_tunes(self):
         self.accelerator.cavity_on = True
         self.accelerator.radiation_on = False
@@ -227,6 +313,26 @@ class TestOptics(unittest.TestCase):
         self.assertAlmostEqual(tunes[0], 0.130792736910679, 10)
         self.assertAlmostEqual(tunes[1], 0.116371351207661, 10)
 
+    def test_get_chromaticities(self):
+        acc = self.accelerator
+        chrom = pyaccel.optics.get_chromaticities(acc)
+        chrom3 = pyaccel.optics.get_chromaticities(acc, order=3)
+        self.assertEqual(len(chrom3[0]), 3)
+        self.assertAlmostEqual(chrom[0], chrom3[0][0], delta=1e-2)
+        self.assertAlmostEqual(chrom[1], chrom3[1][0], delta=1e-2)
+
+        # sextupole contributions: analytic and numeric changes agree
+        analytic = pyaccel.optics.get_chromaticities(acc, method='analytic')
+        idx = pyaccel.lattice.find_indices(acc, 'fam_name', 'sfa')
+        S = acc.get_attributes('S', idx)
+        acc.set_attributes('S', idx, 1.1*S)
+        chrom_new = pyaccel.optics.get_chromaticities(acc, workers=2)
+        analytic_new = pyaccel.optics.get_chromaticities(acc, method='analytic')
+        for i in range(2):
+            delta = chrom_new[i] - chrom[i]
+            self.assertAlmostEqual(analytic_new[i] - analytic[i], delta,
+                delta=0.1*abs(delta))
+
 
 def twiss_suite():
     suite = unittest.TestLoader().loadTestsFromTestCase(TestTwiss)
@@ -0,0 +1,82 @@
+import unittest
+import tempfile
+import numpy
+import pyaccel
+import models
+
+
+class TestResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.the_ring = models.create_accelerator()
+        find = pyaccel.lattice.find_indices
+        self.bpms = find(self.the_ring, 'fam_name', 'bpm')
+        self.hcms = find(self.the_ring, 'fam_name', 'sfa')[:4]
+        self.vcms = find(self.the_ring, 'fam_name', 'sfb')[:4]
+
+    def test_orbit_response(self):
+        acc = self.the_ring
+        analytic = pyaccel.response.calc_orbit_response(
+            acc, self.bpms, self.hcms, self.vcms)
+        exact = pyaccel.response.calc_orbit_response(
+            acc, self.bpms, self.hcms, self.vcms, method='exact', workers=2)
+        nr_bpms = len(self.bpms)
+        self.assertEqual(exact.shape, (2*nr_bpms, 8))
+        scale = numpy.max(numpy.abs(exact))
+        self.assertLess(numpy.max(numpy.abs(analytic - exact)), 0.05*scale)
+        self.assertLess(numpy.max(numpy.abs(exact[nr_bpms:, :4])), 1e-6*scale)
+        self.assertEqual(acc.get_attributes('hkick', self.hcms).tolist(),
+                         [0.0]*4)
+
+    def test_orbit_response_disk_cache(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        pyaccel.diskcache.set_disk_cache(tmpdir.name)
+        self.addCleanup(pyaccel.diskcache.set_disk_cache, None)
+        orbit_columns = pyaccel.response._orbit_columns
+        calls = []
+        def counted_orbit_columns(*args):
+            calls.append(args)
+            return orbit_columns(*args)
+        pyaccel.response._orbit_columns = counted_orbit_columns
+        self.addCleanup(setattr, pyaccel.response, '_orbit_columns',
+                        orbit_columns)
+        acc = self.the_ring
+        m1 = pyaccel.response.calc_orbit_response(
+            acc, self.bpms, self.hcms, self.vcms, method='exact')
+        nr_calls = len(calls)
+        self.assertGreater(nr_calls, 0)
+        m2 = pyaccel.response.calc_orbit_response(
+            acc[:], self.bpms, self.hcms, self.vcms, method='exact')
+        self.assertEqual(len(calls), nr_calls)
+        self.assertTrue(numpy.array_equal(m1, m2))
+
+    def test_dispersion_response(self):
+        acc = self.the_ring
+        analytic = pyaccel.response.calc_dispersion_response(acc, self.bpms)
+        exact = pyaccel.response.calc_dispersion_response(
+            acc, self.bpms, method='exact')
+        self.assertEqual(exact.shape, (2*len(self.bpms),))
+        scale = numpy.max(numpy.abs(analytic))
+        self.assertLess(numpy.max(numpy.abs(analytic - exact)), 1e-3*scale)
+
+    def test_tune_response(self):
+        acc = self.the_ring
+        knobs = [pyaccel.lattice.find_indices(acc, 'fam_name', name)
+                 for name in ('qfa', 'qda')]
+        analytic = pyaccel.response.calc_tune_response(acc, knobs)
+        exact = pyaccel.response.calc_tune_response(
+            acc, knobs, method='exact', workers=2)
+        self.assertEqual(exact.shape, (2, 2))
+        self.assertTrue(numpy.allclose(analytic, exact, rtol=0.05))
+
+
+def response_suite():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestResponse)
+    return suite
+
+
+def get_suite():
+    suite_list = []
+    suite_list.append(response_suite())
+    return unittest.TestSuite(suite_list)
@@ -1,4 +1,8 @@
 
+import copy
+import os
+import pickle
+import tempfile
 import unittest
 import numpy
 import pyaccel
@@ -116,6 +120,116 @@ class TestTracking(unittest.TestCase):
         p1 = particles_out[:,-1]
         self.assertAlmostEqual(sum(p1),0.0001557474602497, places=15)
 
+    def test_cpp_conversions(self):
+        orbit = numpy.arange(18, dtype=float).reshape((6,3))
+        _orbit = pyaccel.tracking._Numpy2CppDoublePosVector(orbit)
+        self.assertEqual(len(_orbit), 3)
+        self.assertEqual(_orbit[1].px, orbit[1,1])
+        self.assertEqual(_orbit[2].dl, orbit[5,2])
+        array = pyaccel.tracking._CppDoublePosVector2Array(_orbit)
+        self.assertTrue((array == orbit.T).all())
+        pos = pyaccel.tracking._CppDoublePos2Numpy(_orbit[2])
+        self.assertTrue((pos == orbit[:,2]).all())
+
+        # single positions are written to the vector storage
+        _orbit = pyaccel.tracking._Numpy2CppDoublePosVector(orbit[:,:1])
+        self.assertEqual(_orbit[0].rx, orbit[0,0])
+        self.assertEqual(_orbit[0].dl, orbit[5,0])
+
+        # the layout check of a position view keeps its data
+        _pos = trackcpp.CppDoublePos()
+        _pos.rx = 0.5
+        view = pyaccel.tracking._CppDoublePosView(_pos)
+        self.assertEqual(_pos.rx, 0.5)
+        if view is not None:
+            self.assertEqual(view[0], 0.5)
+
+        m66 = pyaccel.tracking.find_m66(self.the_ring, indices='m66')
+        _m66 = trackcpp.Matrix()
+        for line in m66:
+            _m66.append([float(x) for x in line])
+        self.assertTrue((pyaccel.tracking._CppMatrix2Numpy(_m66) == m66).all())
+        self.assertIsNotNone(pyaccel.tracking._CppMatrixView(_m66))
+
+    def test_ring_pass_bunch(self):
+        the_ring = self.the_ring
+        particles = numpy.zeros((3,6))
+        particles[0,:] = [0.001,0,0,0,0,0]
+        particles[1,:] = [0.001,0,0,0,0,0]
+        particles[2,:] = [0.020,0,0,0,0,0]
+
+        # turn by turn positions written to a preallocated buffer
+        buffer = numpy.zeros((3,6,100))
+        particles_out, lost_flag, lost_turn, lost_element, lost_plane = \
+            pyaccel.tracking.ring_pass_bunch(accelerator=the_ring,
+                                            particles=particles,
+                                            nr_turns=100,
+                                            turn_by_turn='closed',
+                                            particles_out=buffer)
+        self.assertTrue(particles_out is buffer)
+        self.assertAlmostEqual(sum(buffer[0,:,50]),-0.0009014664358281, places=15)
+        self.assertAlmostEqual(sum(buffer[1,:,10]),-0.0009459070222543, places=15)
+        self.assertTrue(lost_flag)
+        self.assertEqual(list(lost_plane[:2]), [0, 0])
+        self.assertEqual(list(lost_turn[:2]), [-1, -1])
+        self.assertEqual(pyaccel.tracking.lost_planes[lost_plane[2]], 'x')
+
+        # same loss info as ring_pass
+        *_, r_lost_turn, r_lost_element, r_lost_plane = \
+            pyaccel.tracking.ring_pass(accelerator=the_ring,
+                                      particles=particles,
+                                      nr_turns=100)
+        self.assertEqual(r_lost_turn[2], lost_turn[2])
+        self.assertEqual(r_lost_element[2], lost_element[2])
+
+        # invalid buffer shape
+        with self.assertRaises(pyaccel.tracking.TrackingException):
+            pyaccel.tracking.ring_pass_bunch(the_ring, particles, nr_turns=10,
+                turn_by_turn='closed', particles_out=numpy.zeros((3,6)))
+
+    def test_parallel_tracking(self):
+        the_ring = self.the_ring
+        particles = numpy.zeros((5,6))
+        particles[:,0] = [0.001, 0.002, 0.020, 0.003, 0.001]
+
+        serial = pyaccel.tracking.ring_pass(the_ring, particles, nr_turns=10,
+                                            turn_by_turn='closed')
+        parallel = pyaccel.tracking.ring_pass(the_ring, particles, nr_turns=10,
+                                              turn_by_turn='closed', workers=2)
+        numpy.testing.assert_array_equal(serial[0], parallel[0])
+        self.assertEqual(serial[1:], parallel[1:])
+
+        serial = pyaccel.tracking.line_pass(the_ring, particles,
+                                            indices=[100,500])
+        parallel = pyaccel.tracking.line_pass(the_ring, particles,
+                                              indices=[100,500], workers=2)
+        numpy.testing.assert_array_equal(serial[0], parallel[0])
+        self.assertEqual(serial[1:], parallel[1:])
+
+    def test_worker_pool(self):
+        the_ring = self.the_ring
+        particles = numpy.zeros((5,6))
+        particles[:,0] = [0.001, 0.002, 0.020, 0.003, 0.001]
+        serial = pyaccel.tracking.ring_pass_bunch(the_ring, particles,
+                                                  nr_turns=10)
+        with pyaccel.tracking.WorkerPool(the_ring, 2) as pool:
+            self.assertTrue(pool.serves(the_ring))
+            for _ in range(2):
+                parallel = pyaccel.tracking.ring_pass_bunch(the_ring,
+                    particles, nr_turns=10, workers=pool)
+                numpy.testing.assert_array_equal(serial[0], parallel[0])
+                numpy.testing.assert_array_equal(serial[4], parallel[4])
+            chunks = [c[1].copy() for c in pyaccel.tracking.ring_pass_chunks(
+                the_ring, particles, 10, chunk_size=4, workers=pool)]
+            self.assertEqual(sum(c.shape[2] for c in chunks), 10)
+            # a modified accelerator is not served by the pool
+            the_copy = the_ring[:]
+            self.assertFalse(pool.serves(the_copy))
+            the_ring.energy = 2*the_ring.energy
+            self.assertFalse(pool.serves(the_ring))
+            pyaccel.tracking.ring_pass_bunch(the_ring, particles, nr_turns=1,
+                                             workers=pool)
+
     def test_line_pass(self):
         #return
         # tracking of one particle through the whole line
@@ -265,6 +379,228 @@ class TestTracking(unittest.TestCase):
         except pyaccel.tracking.TrackingException:
             self.assertTrue(False)
 
+    def test_dynamic_aperture(self):
+        nr_turns = 10
+        aperture, loss_map = pyaccel.tracking.dynamic_aperture(
+            self.the_ring, nr_turns, nr_lines=5, resolution=1e-4)
+        self.assertEqual(aperture.shape, (2, 5))
+        # boundary points are the largest surviving offsets
+        co = pyaccel.tracking.find_orbit4(self.the_ring, indices=[0])[:,0]
+        inside = numpy.zeros((5,6))
+        inside[:,:4] = co
+        inside[:,(0,2)] += aperture.T
+        *_, lost_plane = pyaccel.tracking.ring_pass_bunch(
+            self.the_ring, inside, nr_turns=nr_turns)
+        self.assertFalse(numpy.any(lost_plane))
+        self.assertEqual(len(loss_map['x']), len(loss_map['lost_plane']))
+        self.assertTrue(numpy.any(loss_map['lost_plane'] != 0))
+
+        aperture, loss_map = pyaccel.tracking.dynamic_aperture(
+            self.the_ring, nr_turns, method='grid', nr_points=(5, 3),
+            nr_refinements=2)
+        self.assertTrue(numpy.all(numpy.diff(aperture[0]) > 0))
+        self.assertLess(len(loss_map['x']), 17*9)
+
+    def test_momentum_aperture(self):
+        indices = [0, 10, 20]
+        accep_neg, accep_pos = pyaccel.tracking.momentum_aperture(
+            self.the_ring, 10, indices=indices, resolution=1e-3)
+        self.assertEqual(accep_neg.shape, (3,))
+        self.assertTrue(numpy.all(accep_pos > 0))
+        self.assertTrue(numpy.all(accep_neg < 0))
+        accep_neg2, accep_pos2 = pyaccel.tracking.momentum_aperture(
+            self.the_ring, 10, indices=indices, resolution=1e-3, workers=2)
+        self.assertTrue(numpy.array_equal(accep_pos, accep_pos2))
+        self.assertTrue(numpy.array_equal(accep_neg, accep_neg2))
+
+    def test_element_pass_bunch(self):
+        context = pyaccel.accelerator.Accelerator(energy=3e9,
+            harmonic_number=864, cavity_on=False, radiation_on=False,
+            vchamber_on=False)
+        d = pyaccel.elements.drift(fam_name='d', length=1.0)
+        q = pyaccel.elements.quadrupole(fam_name='q', length=1.0, K=2.0)
+        particles = numpy.array([[0.001,0.002,0.003,0.004,0.005,0.006],
+                                 [0.002,0.001,0.000,0.001,0.000,0.000]])
+
+        r, lost_flag, lost_element = pyaccel.tracking.element_pass_bunch(
+            context, d, particles)
+        self.assertFalse(lost_flag)
+        self.assertAlmostEqual(sum(r[0]), 0.026980049998762, places=15)
+
+        buffer = numpy.empty((2, 6, 3))
+        r, *_ = pyaccel.tracking.element_pass_bunch(
+            context, [d, q], particles, trajectory=True, particles_out=buffer)
+        self.assertIs(r, buffer)
+        self.assertTrue(numpy.array_equal(r[:, :, 0], particles))
+        r_d = pyaccel.tracking.element_pass(d, particles, energy=3e9,
+            harmonic_number=864, cavity_on=False, radiation_on=False,
+            vchamber_on=False)
+        r_q = pyaccel.tracking.element_pass(q, r_d, energy=3e9,
+            harmonic_number=864, cavity_on=False, radiation_on=False,
+            vchamber_on=False)
+        self.assertTrue(numpy.array_equal(r[:, :, 1], r_d))
+        self.assertTrue(numpy.array_equal(r[:, :, 2], r_q))
+
+    def test_ring_pass_chunks(self):
+        acc = self.the_ring
+        particles = numpy.zeros((3, 6))
+        particles[:, 0] = [1e-4, 1e-3, 5e-2]
+        exact, _, lost_turn, lost_element, _ = \
+            pyaccel.tracking.ring_pass_bunch(acc, particles, nr_turns=7,
+                                             turn_by_turn='closed')
+        chunks = []
+        for first_turn, positions, l_turn, l_element, _ in \
+                pyaccel.tracking.ring_pass_chunks(acc, particles, 7,
+                                                  chunk_size=3):
+            self.assertEqual(first_turn, 3*len(chunks))
+            chunks.append(positions.copy())
+        self.assertEqual([c.shape[2] for c in chunks], [3, 3, 1])
+        streamed = numpy.concatenate(chunks, axis=2)
+        self.assertTrue(numpy.allclose(streamed, exact, rtol=0, atol=1e-12,
+                                       equal_nan=True))
+        self.assertEqual(l_turn.tolist(), lost_turn.tolist())
+        self.assertEqual(l_element.tolist(), lost_element.tolist())
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'tbt.npy')
+            positions, lost_flag, *_ = pyaccel.tracking.ring_pass_to_file(
+                acc, particles, 7, filename, chunk_size=2)
+            self.assertEqual(lost_flag, bool(numpy.any(lost_turn >= 0)))
+            self.assertTrue(numpy.allclose(numpy.load(filename), streamed,
+                                           rtol=0, atol=1e-12, equal_nan=True))
+            loaded = [c for _, c in
+                      pyaccel.tracking.load_turn_chunks(filename, 4)]
+            self.assertEqual([c.shape[2] for c in loaded], [4, 3])
+            del positions
+
+    def test_recording(self):
+        acc = self.the_ring
+        particles = numpy.zeros((3, 6))
+        particles[:, 0] = [1e-4, 1e-3, 5e-2]
+        full, _, lost_turn, *_ = pyaccel.tracking.ring_pass_bunch(
+            acc, particles, nr_turns=12, turn_by_turn='closed')
+        policy = pyaccel.tracking.RecordingPolicy(stride=3, window=(2, 10),
+            moments=True, loss_snapshot=True)
+        recording, lost_flag, l_turn, *_ = pyaccel.tracking.ring_pass(
+            acc, particles, nr_turns=12, recording=policy)
+        self.assertEqual(recording.steps.tolist(), [2, 5, 8])
+        self.assertTrue(numpy.allclose(recording.positions, full[:, :, 2:10:3],
+                                       rtol=0, atol=1e-12, equal_nan=True))
+        alive = numpy.isfinite(full[:, 0, 5])
+        self.assertEqual(recording.nr_alive[1], numpy.sum(alive))
+        self.assertTrue(numpy.allclose(recording.mean[:, 1],
+                                       numpy.mean(full[alive, :, 5], axis=0)))
+        self.assertEqual(recording.covariance.shape, (6, 6, 3))
+        for i in range(3):
+            if lost_turn[i] < 0:
+                self.assertIsNone(l_turn[i])
+                self.assertTrue(numpy.all(numpy.isnan(
+                    recording.lost_positions[i])))
+            elif lost_turn[i] > 0:
+                self.assertTrue(numpy.allclose(recording.lost_positions[i],
+                                               full[i, :, lost_turn[i]-1]))
+        with self.assertRaises(pyaccel.tracking.TrackingException):
+            pyaccel.tracking.ring_pass(acc, particles, turn_by_turn='open',
+                                       recording=policy)
+
+        # no turns
+        recording, lost_flag, l_turn, *_ = pyaccel.tracking.ring_pass(
+            acc, particles, nr_turns=0, recording=policy)
+        self.assertEqual(recording.steps.tolist(), [])
+        self.assertEqual(recording.positions.shape, (3, 6, 0))
+        self.assertFalse(lost_flag)
+        self.assertEqual(l_turn, [None, None, None])
+
+        # element by element
+        policy = pyaccel.tracking.RecordingPolicy(stride=100, moments=True)
+        recording, *_ = pyaccel.tracking.line_pass(acc, particles[:2],
+                                                   recording=policy)
+        positions, *_ = pyaccel.tracking.line_pass(acc, particles[:2],
+                                                   indices='open')
+        self.assertEqual(recording.steps.tolist(),
+                         list(range(0, len(acc), 100)))
+        self.assertTrue(numpy.allclose(recording.positions,
+                                       positions[:, :, ::100], equal_nan=True))
+
+    def test_fast_ring_pass(self):
+        acc = self.the_ring
+        pyaccel.tracking.set_4d_tracking(acc)
+        particles = numpy.zeros((3, 6))
+        particles[:, 0] = [1e-5, 1e-4, 5e-4]
+        particles[:, 2] = [1e-5, 5e-5, 1e-4]
+        exact, *_ = pyaccel.tracking.ring_pass_bunch(acc, particles, nr_turns=5)
+        fast, lost_flag, *_ = pyaccel.tracking.fast_ring_pass(
+            acc, particles, nr_turns=5)
+        self.assertFalse(lost_flag)
+        self.assertTrue(numpy.allclose(fast[:, :4], exact[:, :4],
+                                       rtol=0, atol=1e-2*5e-4))
+        tracker = acc._fast_tracker
+        pyaccel.tracking.fast_ring_pass(acc, particles)
+        self.assertIs(acc._fast_tracker, tracker)
+
+        deviation, speedup = tracker.compare(acc, particles, nr_turns=5)
+        self.assertLess(deviation[0], 1e-2*5e-4)
+        self.assertGreater(speedup, 1.0)
+
+        # far from the axis particles are lost
+        _, lost_flag, lost_turn, *_ = pyaccel.tracking.fast_ring_pass(
+            acc, [[0.1, 0, 0, 0, 0, 0]], nr_turns=100)
+        self.assertTrue(lost_flag)
+        self.assertGreaterEqual(lost_turn[0], 0)
+
+    def test_fast_tracking_kicks(self):
+        sext = pyaccel.elements.sextupole('sf', 0.2, 10.0)
+        coefficients = pyaccel.tracking._nonlinear_coefficients(sext)
+        self.assertTrue(numpy.allclose(coefficients, [0.2*10.0]))
+        thin = pyaccel.elements.sextupole('sf', 0.0, 10.0)
+        self.assertEqual(
+            len(pyaccel.tracking._nonlinear_coefficients(thin)), 0)
+        thin.pass_method = 'thinsext_pass'
+        thin.thin_SL = 3.0
+        coefficients = pyaccel.tracking._nonlinear_coefficients(thin)
+        self.assertTrue(numpy.allclose(coefficients, [3.0]))
+
+        # the thin kick matches trackcpp
+        particles = numpy.array([[1e-3, 0, -2e-3, 0, 0, 0]])
+        exact, *_ = pyaccel.tracking.element_pass_bunch(
+            self.the_ring, [thin], particles)
+        fast = particles.copy()
+        pyaccel.tracking._thin_kick(fast, coefficients)
+        self.assertTrue(numpy.allclose(fast, exact, rtol=0, atol=1e-15))
+
+    def test_warm_start(self):
+        acc = self.the_ring
+        pyaccel.tracking.set_4d_tracking(acc)
+        cold = acc[:]
+        cold.warm_start = False
+        for de in (0.0, 1e-3, 2e-3):
+            orbit = pyaccel.tracking.find_orbit4(acc, de)
+            orbit_cold = pyaccel.tracking.find_orbit4(cold, de)
+            self.assertTrue(numpy.allclose(orbit, orbit_cold, atol=1e-12))
+        self.assertEqual(acc.warm_start_statistics['cold'], 1)
+        self.assertEqual(acc.warm_start_statistics['warm'], 2)
+        self.assertEqual(cold.warm_start_statistics['warm'], 0)
+
+        # a copy of the whole ring keeps the stored fixed points
+        copy = acc[:]
+        pyaccel.tracking.find_orbit4(copy)
+        self.assertEqual(copy.warm_start_statistics['warm'], 1)
+        # but a different configuration does not use them
+        pyaccel.tracking.set_6d_tracking(copy)
+        pyaccel.tracking.find_orbit6(copy)
+        self.assertEqual(copy.warm_start_statistics['cold'], 1)
+
+    def test_find_m66_warm_start(self):
+        acc = self.the_ring
+        acc.cavity_on = True
+        cold = acc[:]
+        cold.warm_start = False
+        m66_cold, *_ = pyaccel.tracking.find_m66(cold)
+        pyaccel.tracking.find_orbit6(acc)
+        m66_warm, *_ = pyaccel.tracking.find_m66(acc)
+        self.assertEqual(acc.warm_start_statistics['warm'], 1)
+        self.assertTrue(numpy.allclose(m66_warm, m66_cold, rtol=0, atol=1e-10))
+
 
 class TestMatrixList(unittest.TestCase):
 
@@ -319,6 +655,49 @@ class TestMatrixList(unittest.TestCase):
         self.assertEqual(len(self.ml), n)
 
 
+    def test_to_array(self):
+        for i in range(3):
+            self.ml.append(numpy.array(self.matrix) + i)
+        array = self.ml.to_array()
+        self.assertEqual(array.shape, (3, 3, 3))
+        self.assertTrue(numpy.all(array[2] == numpy.array(self.matrix) + 2))
+        out = numpy.zeros((2, 3, 3))
+        self.ml.to_array(out=out, indices=[2, 0])
+        self.assertTrue(numpy.all(out[0] == array[2]))
+        self.assertTrue(numpy.all(self.ml[1:] == array[1:]))
+
+    def test_find_m66_indices(self):
+        the_ring = models.create_accelerator()
+        m66, tm = pyaccel.tracking.find_m66(the_ring)
+        m66, tm_sel = pyaccel.tracking.find_m66(the_ring, indices=[10, 5])
+        m66, tm_closed = pyaccel.tracking.find_m66(the_ring, indices='closed')
+        self.assertEqual(len(tm_closed), len(tm))
+        self.assertEqual(len(tm_sel), 2)
+        self.assertTrue(numpy.allclose(tm_sel[0], tm[10], atol=1e-14))
+        self.assertTrue(numpy.allclose(tm_sel.to_array()[1], tm[5], atol=1e-14))
+        m44, tm44 = pyaccel.tracking.find_m44(the_ring)
+        m44, tm44_sel = pyaccel.tracking.find_m44(the_ring, indices=[10])
+        self.assertEqual(tm44_sel[0].shape, (4, 4))
+        self.assertTrue(numpy.allclose(tm44_sel[-1], tm44[10], atol=1e-14))
+        tm44_copy = pickle.loads(pickle.dumps(tm44_sel))
+        self.assertEqual(len(tm44_copy), 1)
+        self.assertEqual(tm44_copy[0].shape, (4, 4))
+        self.assertTrue(numpy.all(tm44_copy[0] == tm44_sel[0]))
+        self.assertTrue(numpy.all(tm44_copy.to_array() == tm44_sel.to_array()))
+
+    def test_pickle(self):
+        for i in range(3):
+            self.ml.append(numpy.array(self.matrix) + i)
+        ml = pickle.loads(pickle.dumps(self.ml))
+        self.assertEqual(len(ml), 3)
+        self.assertTrue(numpy.all(ml.to_array() == self.ml.to_array()))
+        self.assertTrue(numpy.all(copy.deepcopy(ml)[2] == ml[2]))
+        ml.append(numpy.array(self.matrix) + 3)
+        self.assertEqual(len(ml), 4)
+        self.assertTrue(numpy.all(ml[3] == numpy.array(self.matrix) + 3))
+        self.assertTrue(numpy.all(ml[0] == self.ml[0]))
+
+
 class TestMatrixListInit(unittest.TestCase):
 
     def setUp(self):